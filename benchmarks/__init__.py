@@ -0,0 +1,19 @@
+"""
+Benchmarks, run with `python -m benchmarks.run`.
+"""
+BENCHMARKS = []
+
+
+def benchmark(name, **params):
+    """
+    Registers a benchmark function.
+
+    The function is called with `params` and returns a tuple of a callable,
+    which executes the measured code, and the number of operations the
+    callable performs. Setup should be done before returning the callable.
+    The decorator can be applied multiple times with different parameters.
+    """
+    def decorator(func):
+        BENCHMARKS.append((name, func, params))
+        return func
+    return decorator
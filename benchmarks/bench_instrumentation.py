@@ -0,0 +1,27 @@
+"""
+Overhead of `timed` methods while instrumentation is disabled, compared to
+calling the undecorated method.
+"""
+from benchmarks import benchmark
+from mvvm.instrumentation import stats, timed
+
+
+class Table(object):
+    def get_value(self, row_idx, col_idx):
+        return row_idx
+
+    timed_get_value = timed(get_value)
+
+
+@benchmark('instrumentation.call', count=1000000, decorated=False)
+@benchmark('instrumentation.call', count=1000000, decorated=True)
+def call(count, decorated):
+    stats.enabled = False
+    table = Table()
+    method = table.timed_get_value if decorated else table.get_value
+    calls = range(count)
+
+    def run():
+        for row_idx in calls:
+            method(row_idx, 0)
+    return run, count
@@ -0,0 +1,60 @@
+"""
+Throughput of parsing and formatting times as done by `grid.TimeType`.
+
+Usage: python -m benchmarks.bench_timeformat [count]
+"""
+from __future__ import print_function
+import random
+import sys
+import timeit
+
+from benchmarks import benchmark
+from mvvm.viewbinding import timeformat
+
+
+def make_texts(count, seed=0):
+    rnd = random.Random(seed)
+    formats = ['%d:%02d.%03d', '%02d%02d%03d', '%d %02d %d']
+    return [formats[idx % len(formats)] % (rnd.randint(0, 59),
+                                           rnd.randint(0, 59),
+                                           rnd.randint(0, 999))
+            for idx in range(count)]
+
+
+def bench_parse(texts):
+    text_to_time = timeformat.text_to_time
+    start = timeit.default_timer()
+    for text in texts:
+        text_to_time(text)
+    return timeit.default_timer() - start
+
+
+def bench_validate(texts):
+    is_partial_time = timeformat.is_partial_time
+    start = timeit.default_timer()
+    for text in texts:
+        is_partial_time(text)
+    return timeit.default_timer() - start
+
+
+@benchmark('timeformat.parse', count=100000)
+def parse(count):
+    texts = make_texts(count)
+    return lambda: bench_parse(texts), count
+
+
+@benchmark('timeformat.validate', count=100000)
+def validate(count):
+    texts = make_texts(count)
+    return lambda: bench_validate(texts), count
+
+
+def main(count=1000000):
+    texts = make_texts(count)
+    for name, bench in [('parse', bench_parse), ('validate', bench_validate)]:
+        elapsed = bench(texts)
+        print('%-10s %d texts in %.3fs (%.0f/s)' % (
+            name, count, elapsed, count / elapsed))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,163 @@
+"""
+Benchmarks of the viewmodel layer, using a stubbed wx and in-memory SQLite.
+"""
+from benchmarks import benchmark, wxstub
+
+app = wxstub.install()
+
+import traits.api as traits
+
+from benchmarks.models import Skater, create_session
+from mvvm.viewmodel import wrapper
+from mvvm.viewmodel.generic import List
+from mvvm.viewmodel.table import ListTable, QueryTable
+
+_sessions = {}
+
+
+def session(num_skaters):
+    """Shared session per database size; also made the app's session."""
+    if num_skaters not in _sessions:
+        _sessions[num_skaters] = create_session(num_skaters)
+    app.session = _sessions[num_skaters]
+    return app.session
+
+
+class Column(object):
+    def __init__(self, attribute, label, type_name=None):
+        self.attribute = attribute
+        self.label = label
+        self.type_name = type_name
+
+MAPPING = [
+    Column('first_name', 'First name'),
+    Column('last_name', 'Last name'),
+    Column('gender', 'Gender'),
+    Column('best_time', 'Best time'),
+]
+
+
+class Holder(traits.HasTraits):
+    objects = traits.List(traits.HasTraits)
+
+
+class QueryHolder(traits.HasTraits):
+    objects_query = traits.Any
+
+
+class SkaterList(List):
+    Model = Skater
+    mapping = MAPPING
+
+
+@benchmark('wrapper.wrap', count=10000)
+def wrap(count):
+    skaters = session(count).query(Skater).all()
+    def run():
+        for skater in skaters:
+            wrapper.wrap(skater)
+    return run, count
+
+
+@benchmark('wrapper.wrap_cls', count=100)
+def wrap_cls(count):
+    session(10)
+    def run():
+        for _ in range(count):
+            for cache in wrapper.cached_classes.values():
+                cache.clear()
+            wrapper.wrap_cls(Skater, True)
+            wrapper.wrap_cls(Skater, False)
+    return run, count
+
+
+def list_table(count):
+    holder = Holder()
+    holder.objects = [wrapper.wrap(skater)
+                      for skater in session(count).query(Skater)]
+    table = ListTable((holder, 'objects'), MAPPING)
+    table.grid = wxstub.Grid(table)
+    return table
+
+
+@benchmark('ListTable.reindex', count=10000)
+@benchmark('ListTable.reindex', count=100000)
+def list_table_reindex(count):
+    table = list_table(count)
+    return table._reindex, count
+
+
+@benchmark('ListTable.bind', count=100000, listen='all')
+@benchmark('ListTable.bind', count=100000, listen='viewport')
+def list_table_bind(count, listen):
+    objects = [wrapper.wrap(skater)
+               for skater in session(count).query(Skater)]
+    def run():
+        holder = Holder()
+        holder.objects = objects
+        ListTable((holder, 'objects'), MAPPING, listen=listen)
+    return run, count
+
+
+@benchmark('ListTable.GetValue', count=10000, visible_rows=40, repaints=100)
+def list_table_get_value(count, visible_rows, repaints):
+    table = list_table(count)
+    cols = range(table.GetNumberCols())
+    def run():
+        for repaint in range(repaints):
+            start = repaint * visible_rows % (count - visible_rows)
+            for row_idx in range(start, start + visible_rows):
+                for col_idx in cols:
+                    table.GetValue(row_idx, col_idx)
+    return run, repaints * visible_rows * len(cols)
+
+
+def query_table(count):
+    holder = QueryHolder()
+    holder.objects_query = session(count).query(Skater).order_by(Skater.id)
+    table = QueryTable((holder, 'objects'), MAPPING)
+    table.grid = wxstub.Grid(table)
+    return table
+
+
+@benchmark('QueryTable.page_fetch', count=100000, depth=0)
+@benchmark('QueryTable.page_fetch', count=100000, depth=1000)
+@benchmark('QueryTable.page_fetch', count=100000, depth=50000)
+@benchmark('QueryTable.page_fetch', count=100000, depth=99000)
+def query_table_page_fetch(count, depth):
+    table = query_table(count)
+    def run():
+        table._cache.rows = {}
+        table.GetRow(depth)
+    return run, 1
+
+
+@benchmark('wrapper.session_flush', count=1000)
+def session_flush(count):
+    db = session(count)
+    skaters = db.query(Skater).all()
+    # Keep the wrappers alive, as `session_flush` notifies live wrappers only
+    wrappers = [wrapper.wrap(skater) for skater in skaters]
+    state = {'round': 0}
+    def run():
+        state['round'] += 1
+        for skater in skaters:
+            skater.first_name = 'First %d' % state['round']
+        db.commit()
+    run.wrappers = wrappers
+    return run, count
+
+
+@benchmark('List.objects_save', count=1000)
+def objects_save(count):
+    session(count)
+    viewmodel = SkaterList()
+    objects = [wrapper.wrap(wrapper.unwrap(obj), False)
+               for obj in viewmodel.objects]
+    state = {'round': 0}
+    def run():
+        state['round'] += 1
+        for obj in objects:
+            obj.last_name = 'Last %d' % state['round']
+        viewmodel.objects_save(objects)
+    return run, count
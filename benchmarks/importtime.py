@@ -0,0 +1,98 @@
+"""
+Measures the time to import the mvvm modules in a fresh interpreter.
+
+Usage:
+    python -m benchmarks.importtime [-r repeat] [--budget ms] [--profile]
+                                    [module ...]
+
+Every module is imported in a new interpreter, the fastest of `repeat` runs
+is reported. Exits with status 1 when a module takes longer than the budget
+or imports one of the modules it should defer (see `mvvm.lazy`). With
+`--profile` the slowest imports are listed, as reported by
+`python -X importtime` (Python 3.7+).
+"""
+from __future__ import print_function
+import argparse
+import json
+import subprocess
+import sys
+
+# Modules to measure, with the modules they should not import themselves.
+MODULES = {
+    'mvvm.viewmodel.generic': ['wx', 'sqlalchemy.orm',
+                               'mvvm.viewmodel.table'],
+    'mvvm.viewmodel.choice_provider': ['wx', 'sqlalchemy'],
+    'mvvm.viewmodel.wrapper': ['wx', 'sqlalchemy.orm'],
+    'mvvm.viewbinding.grid': ['mvvm.viewbinding.interactive'],
+}
+
+DEFAULT_BUDGET = 300
+
+_measure = '''
+import json, sys, timeit
+start = timeit.default_timer()
+import %(module)s
+seconds = timeit.default_timer() - start
+print(json.dumps({'seconds': seconds,
+                  'deferred': [name for name in %(deferred)r
+                               if name in sys.modules]}))
+'''
+
+
+def measure(module, repeat):
+    """Fastest import of `module`, and the deferred modules it imported."""
+    results = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', _measure % {
+            'module': module, 'deferred': MODULES.get(module, [])}])
+        results.append(json.loads(output.decode('utf-8')))
+    return min(results, key=lambda result: result['seconds'])
+
+
+def profile(module, limit=10):
+    """(cumulative microseconds, name) of the slowest imports of `module`."""
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+        stderr=subprocess.PIPE)
+    _, stderr = process.communicate()
+    imports = []
+    for line in stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('modules', nargs='*', default=sorted(MODULES))
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help='maximum import time in milliseconds')
+    parser.add_argument('--profile', action='store_true')
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in args.modules:
+        try:
+            result = measure(module, args.repeat)
+        except subprocess.CalledProcessError:
+            print('%-40s failed to import' % module)
+            failed = True
+            continue
+        milliseconds = result['seconds'] * 1000
+        flags = []
+        if milliseconds > args.budget:
+            flags.append('OVER BUDGET')
+        if result['deferred']:
+            flags.append('imports %s' % ', '.join(result['deferred']))
+        failed = failed or bool(flags)
+        print('%-40s %8.1f ms %s' % (module, milliseconds, '; '.join(flags)))
+        if args.profile and sys.version_info >= (3, 7):
+            for cumulative, name in profile(module):
+                print('    %-36s %8.1f ms' % (name, cumulative / 1000.0))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
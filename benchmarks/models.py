@@ -0,0 +1,59 @@
+"""
+Models and an in-memory SQLite database for the benchmarks.
+"""
+from decimal import Decimal
+
+from sqlalchemy import create_engine, event, Column, ForeignKey, Integer, \
+    Numeric, String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship, sessionmaker
+
+from mvvm.viewmodel import wrapper
+
+Base = declarative_base()
+
+
+class Country(Base):
+    __tablename__ = 'country'
+    id = Column(Integer, primary_key=True)
+    code = Column(String(3))
+    name = Column(String(50))
+
+    def __unicode__(self):
+        return self.name
+
+
+class Skater(Base):
+    __tablename__ = 'skater'
+    id = Column(Integer, primary_key=True)
+    first_name = Column(String(50))
+    last_name = Column(String(50))
+    gender = Column(String(1))
+    best_time = Column(Numeric(7, 3))
+    country_id = Column(Integer, ForeignKey('country.id'))
+    country = relationship(Country)
+
+    GENDERS = {'M': u'Male', 'F': u'Female'}
+
+    def get_gender_display(self, value):
+        return self.GENDERS.get(value, value)
+
+
+def create_session(num_skaters, num_countries=50):
+    """New session on an in-memory database with `num_skaters` skaters."""
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    event.listen(session, 'after_flush', wrapper.session_flush)
+
+    countries = [Country(code='C%02d' % idx, name='Country %d' % idx)
+                 for idx in range(num_countries)]
+    session.add_all(countries)
+    session.add_all([
+        Skater(first_name='First %d' % idx, last_name='Last %d' % idx,
+               gender='MF'[idx % 2],
+               best_time=Decimal(30000 + idx % 1000).scaleb(-3),
+               country=countries[idx % num_countries])
+        for idx in range(num_skaters)])
+    session.commit()
+    return session
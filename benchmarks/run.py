@@ -0,0 +1,138 @@
+"""
+Runs the benchmarks and writes the results as JSON.
+
+Usage:
+    python -m benchmarks.run [-o results.json] [-r repeat] [-k filter]
+    python -m benchmarks.run --compare old.json new.json [--threshold 1.2]
+
+Every benchmark is repeated and the fastest run is reported, both in seconds
+and in operations per second. Benchmarks sharing a name are told apart by
+the parameters they differ in, e.g. `ListTable.bind[listen=viewport]`.
+Comparing two result files lists the ratio per benchmark and exits with
+status 1 when any benchmark got slower than the threshold allows.
+"""
+from __future__ import print_function
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import timeit
+
+from benchmarks import BENCHMARKS
+
+MODULES = [
+    'benchmarks.bench_instrumentation',
+    'benchmarks.bench_timeformat',
+    'benchmarks.bench_viewmodel',
+]
+
+
+def measure(func, params, repeat):
+    run, ops = func(**params)
+    timings = []
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        run()
+        timings.append(timeit.default_timer() - start)
+    best = min(timings)
+    return {
+        'seconds': best,
+        'median': sorted(timings)[len(timings) // 2],
+        'ops': ops,
+        'ops_per_second': ops / best if best else None,
+        'params': params,
+    }
+
+
+def result_names(benchmarks):
+    """Names of the results of `benchmarks`, (name, func, params) tuples:
+    the name, followed by the parameters which differ between benchmarks
+    of the same name."""
+    variants = {}
+    for name, _, params in benchmarks:
+        variants.setdefault(name, []).append(params)
+    names = []
+    for name, _, params in benchmarks:
+        differing = sorted(key for key in params
+                           if any(other.get(key) != params[key]
+                                  for other in variants[name]))
+        if differing:
+            name = '%s[%s]' % (name, ','.join('%s=%s' % (key, params[key])
+                                              for key in differing))
+        names.append(name)
+    return names
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       stderr=subprocess.STDOUT).strip()\
+            .decode('ascii')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(repeat=5, filter=None):
+    for module in MODULES:
+        try:
+            __import__(module)
+        except ImportError as e:
+            print('Skipping %s: %s' % (module, e), file=sys.stderr)
+    results = {}
+    for name, (_, func, params) in zip(result_names(BENCHMARKS),
+                                       BENCHMARKS):
+        if filter and filter not in name:
+            continue
+        results[name] = result = measure(func, params, repeat)
+        print('%-40s %10.6fs %12.0f ops/s' % (
+            name, result['seconds'], result['ops_per_second'] or 0),
+            file=sys.stderr)
+    return {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'date': datetime.datetime.utcnow().isoformat(),
+        'results': results,
+    }
+
+
+def compare(old, new, threshold):
+    """Prints the ratio new/old per benchmark, returns the regressions."""
+    regressions = []
+    for name in sorted(set(old['results']) & set(new['results'])):
+        ratio = new['results'][name]['seconds'] / \
+            old['results'][name]['seconds']
+        flag = ''
+        if ratio > threshold:
+            flag = ' SLOWER'
+            regressions.append(name)
+        elif ratio < 1 / threshold:
+            flag = ' faster'
+        print('%-40s %6.2fx%s' % (name, ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('-o', '--output', help='write JSON results to file')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-k', '--filter', help='only run matching benchmarks')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--threshold', type=float, default=1.2)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        old, new = [json.load(open(path)) for path in args.compare]
+        return 1 if compare(old, new, args.threshold) else 0
+
+    results = run(args.repeat, args.filter)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Minimal stand-in for the parts of wx used by the viewmodel layer.
+
+Allows running the benchmarks headless, without wxPython or a display. Only
+what the viewmodel layer touches is provided: `wx.GetApp().session`,
+`wx.CallAfter`, the grid table base class and messages, and `pub`.
+"""
+import sys
+import types
+
+
+class App(object):
+    session = None
+
+
+class PyGridTableBase(object):
+    def __init__(self):
+        self._view = None
+
+    def GetView(self):
+        return self._view
+
+
+class GridTableMessage(object):
+    def __init__(self, table, id, *args):
+        self.table, self.id, self.args = table, id, args
+
+    def GetId(self):
+        return self.id
+
+
+class Grid(object):
+    """Stands in for the grid a table is bound to; ignores all messages."""
+    def __init__(self, table=None):
+        self.table = table
+        self.messages = 0
+
+    def BeginBatch(self):
+        pass
+
+    def EndBatch(self):
+        pass
+
+    def GetNumberRows(self):
+        return self.table.GetNumberRows() if self.table else 0
+
+    def GetNumberCols(self):
+        return self.table.GetNumberCols() if self.table else 0
+
+    def ProcessTableMessage(self, message):
+        self.messages += 1
+        return True
+
+
+class Publisher(object):
+    def __init__(self):
+        self.listeners = {}
+        self.sent = []
+
+    def subscribe(self, listener, topic):
+        self.listeners.setdefault(topic, []).append(listener)
+
+    def sendMessage(self, topic, **kwargs):
+        self.sent.append((topic, kwargs))
+        for listener in self.listeners.get(topic, []):
+            listener(**kwargs)
+
+
+class CallLater(object):
+    """Never fires by itself; benchmarks call `Notify` when needed."""
+    def __init__(self, millis, callable, *args, **kwargs):
+        self.callable, self.args, self.kwargs = callable, args, kwargs
+
+    def Notify(self):
+        self.callable(*self.args, **self.kwargs)
+
+    def Stop(self):
+        pass
+
+
+def install(app=None):
+    """Register the stub as `wx` in `sys.modules`, returns the app."""
+    app = app or App()
+
+    wx = types.ModuleType('wx')
+    wx.Platform = '__WXSTUB__'
+    wx.GetApp = lambda: app
+    wx.CallAfter = lambda func, *args, **kwargs: func(*args, **kwargs)
+    wx.CallLater = CallLater
+
+    grid = types.ModuleType('wx.grid')
+    grid.PyGridTableBase = PyGridTableBase
+    grid.GridTableMessage = GridTableMessage
+    grid.Grid = Grid
+    grid.GRID_VALUE_STRING = 'string'
+    for idx, name in enumerate([
+            'GRIDTABLE_REQUEST_VIEW_GET_VALUES',
+            'GRIDTABLE_REQUEST_VIEW_SEND_VALUES',
+            'GRIDTABLE_NOTIFY_ROWS_INSERTED',
+            'GRIDTABLE_NOTIFY_ROWS_APPENDED',
+            'GRIDTABLE_NOTIFY_ROWS_DELETED',
+            'GRIDTABLE_NOTIFY_COLS_INSERTED',
+            'GRIDTABLE_NOTIFY_COLS_APPENDED',
+            'GRIDTABLE_NOTIFY_COLS_DELETED']):
+        setattr(grid, name, 2000 + idx)
+    wx.grid = grid
+
+    lib = types.ModuleType('wx.lib')
+    pubsub = types.ModuleType('wx.lib.pubsub')
+    pubsub.pub = Publisher()
+    lib.pubsub = pubsub
+    wx.lib = lib
+
+    sys.modules.update({
+        'wx': wx,
+        'wx.grid': grid,
+        'wx.lib': lib,
+        'wx.lib.pubsub': pubsub,
+    })
+
+    # Trait handlers registered with dispatch='ui' run synchronously.
+    from traits.trait_notifiers import set_ui_handler
+    set_ui_handler(wx.CallAfter)
+    return app
@@ -0,0 +1,103 @@
+"""
+Opt-in counters and timers for the hot paths of tables and bindings.
+
+Instrumentation is disabled by default; enable it with `stats.enabled = True`
+and query `stats` to find out where time is spent:
+
+    >>> stats.enabled = True
+    >>> # ... use the application ...
+    >>> stats.get('QueryTable.GetValue')
+    {'count': 1200, 'time': 0.042}
+    >>> print(stats.report())
+
+Methods decorated with `timed` are recorded as `<class name>.<method name>`,
+other events are recorded directly with `stats.add`. When disabled, a timed
+method still costs an extra function call and an attribute lookup, about
+0.2 microseconds per call on Python 2.7 (the `instrumentation.call`
+benchmark). That is negligible for the number of cells a grid draws, but
+not for tight loops, which should be timed as a whole with `stats.add`.
+"""
+import timeit
+
+
+class Stats(object):
+    def __init__(self):
+        self.enabled = False
+        self._timer = None
+        self.reset()
+
+    def reset(self):
+        self.counts = {}
+        self.times = {}
+
+    def add(self, name, elapsed=0.0, count=1):
+        """Record `count` occurrences of `name` taking `elapsed` seconds."""
+        self.counts[name] = self.counts.get(name, 0) + count
+        self.times[name] = self.times.get(name, 0.0) + elapsed
+
+    def get(self, name):
+        return {'count': self.counts.get(name, 0),
+                'time': self.times.get(name, 0.0)}
+
+    def snapshot(self):
+        return dict((name, self.get(name)) for name in self.counts)
+
+    def report(self, limit=None):
+        """Text table of the recorded names, most time consuming first."""
+        names = sorted(self.counts, key=lambda name: (-self.times[name], name))
+        lines = ['%-50s %10s %12s' % ('name', 'count', 'time (ms)')]
+        for name in names[:limit]:
+            lines.append('%-50s %10d %12.3f' % (name, self.counts[name],
+                                                self.times[name] * 1000))
+        return '\n'.join(lines)
+
+    def publish(self):
+        """Send a snapshot on the `stats.update` topic."""
+        from wx.lib.pubsub import pub
+        pub.sendMessage('stats.update', stats=self.snapshot())
+
+    def start_publishing(self, interval=1000):
+        """Publish a snapshot every `interval` milliseconds."""
+        import wx
+        self.stop_publishing()
+        self._timer = wx.PyTimer(self.publish)
+        self._timer.Start(interval)
+
+    def stop_publishing(self):
+        if self._timer is not None:
+            self._timer.Stop()
+            self._timer = None
+
+
+stats = Stats()
+
+
+_timed_template = '''
+def %(name)s(%(args)s):
+    if not stats.enabled:
+        return func(%(args)s)
+    start = timer()
+    try:
+        return func(%(args)s)
+    finally:
+        stats.add('%%s.%(name)s' %% type(%(self)s).__name__, timer() - start)
+'''
+
+
+def timed(func):
+    """
+    Records the number of calls and time spent in method `func`.
+
+    The wrapper has the same signature as `func`, as traits inspects the
+    arguments of a handler to determine how it should be notified.
+    """
+    code = func.__code__
+    args = code.co_varnames[:code.co_argcount]
+    namespace = {'func': func, 'stats': stats, 'timer': timeit.default_timer}
+    exec(_timed_template % {'name': func.__name__, 'args': ', '.join(args),
+                            'self': args[0]}, namespace)
+    wrapper = namespace[func.__name__]
+    wrapper.__defaults__ = func.__defaults__
+    wrapper.__doc__ = func.__doc__
+    wrapper.__module__ = func.__module__
+    return wrapper
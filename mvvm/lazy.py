@@ -0,0 +1,41 @@
+"""
+Deferred imports, keeping the import of the mvvm modules cheap.
+
+    wx = lazy_import('wx')
+
+binds a stand-in for `wx`, which imports the module on first attribute
+access. Modules use this for dependencies which are only needed at runtime,
+not to define their classes, so tools using the view models without a user
+interface do not pay for importing `wx` or the ORM.
+"""
+import importlib
+import sys
+
+
+class LazyModule(object):
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+
+    def _load(self):
+        try:
+            return sys.modules[self._name]
+        except KeyError:
+            return importlib.import_module(self._name)
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        # Patching the stand-in, e.g. with `mock.patch`, patches the module.
+        setattr(self._load(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._load(), name)
+
+    def __repr__(self):
+        return '<lazy module %r>' % self._name
+
+
+def lazy_import(name):
+    """Stand-in for module `name`, imported on first use."""
+    return LazyModule(name)
@@ -0,0 +1,39 @@
+"""
+Parsing of clipboard text, as copied from a spreadsheet or grid.
+
+Used by `grid.GridBinding.paste`; kept free of wx so it can be tested
+without a running application.
+"""
+import csv
+import sys
+
+TRUE_TEXTS = frozenset([u'1', u'true', u'yes', u'y', u'x', u'on'])
+FALSE_TEXTS = frozenset([u'', u'0', u'false', u'no', u'n', u'off'])
+
+
+def parse_tsv(text):
+    """
+    Rows of cells of tab separated `text`. Cells holding tabs, newlines or
+    quotes are quoted, as spreadsheets do when copying them.
+    """
+    lines = text.splitlines(True)
+    if sys.version_info[0] == 2:
+        # The csv module of Python 2 does not support unicode.
+        rows = csv.reader([line.encode('utf-8') for line in lines],
+                          dialect='excel-tab')
+        rows = [[cell.decode('utf-8') for cell in row] for row in rows]
+    else:
+        rows = list(csv.reader(lines, dialect='excel-tab'))
+    # An empty line is a single empty cell.
+    return [row or [u''] for row in rows]
+
+
+def text_to_bool(text):
+    """Parse `text` to a bool, raises ValueError if it is not one of
+    `TRUE_TEXTS` or `FALSE_TEXTS`."""
+    text = text.strip().lower()
+    if text in TRUE_TEXTS:
+        return True
+    if text in FALSE_TEXTS:
+        return False
+    raise ValueError('%r is not a boolean' % text)
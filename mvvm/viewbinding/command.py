@@ -1,6 +1,9 @@
-import wx
 from traits.api import HasTraits, Bool, Event
 
+from mvvm.lazy import lazy_import
+
+wx = lazy_import('wx')
+
 
 class Command(HasTraits):
     can_execute = Bool
@@ -1,6 +1,9 @@
 import time
 import wx
 
+from mvvm.instrumentation import timed
+from mvvm.viewbinding.layout import deferred_layout
+
 
 class ShowBinding(object):
     def __init__(self, field, trait, show_if_value=True):
@@ -8,21 +11,13 @@ class ShowBinding(object):
         trait[0].on_trait_change(self.update_view, trait[1], dispatch='ui')
         self.update_view()
 
+    @timed
     def update_view(self):
         value = getattr(*self.trait)
         if type(self.show_if_value) == bool:
             value = bool(value)
         self.field.Show(value == self.show_if_value)
-        self.field.GetParent().GetSizer().Layout()
-
-        # resize frame if Minimalistic
-        if hasattr(self.field.TopLevelParent, 'update_minimal_size'):
-            # First, invalidate all parents
-            parent = self.field.Parent
-            while parent:
-                parent.InvalidateBestSize()
-                parent = parent.Parent
-            self.field.TopLevelParent.update_minimal_size()
+        deferred_layout.invalidate(self.field)
 
 
 class EnabledBinding(object):
@@ -31,6 +26,7 @@ class EnabledBinding(object):
         trait[0].on_trait_change(self.update_view, trait[1], dispatch='ui')
         self.update_view()
 
+    @timed
     def update_view(self):
         value = getattr(*self.trait)
         # True-ish / False-ish
@@ -45,6 +41,7 @@ class FocusBinding(object):
         trait[0].on_trait_change(self.update_view, trait[1], dispatch='ui')
         self.update_view()
 
+    @timed
     def update_view(self):
         if getattr(*self.trait) == self.focus_if_value:
             self.field.SetFocus()
@@ -88,11 +85,13 @@ class ListBinding(object):
         # execution of the first listener (of the loop).
         self.__stop_updating_selection = False
 
+        field.Bind(wx.EVT_LIST_CACHE_HINT, self.on_cache_hint)
         field.Bind(wx.EVT_LIST_ITEM_SELECTED, self.on_view_selection_changed)
         field.Bind(wx.EVT_LIST_ITEM_DESELECTED, self.on_view_selection_changed)
         trait[0].on_trait_change(self.on_model_selection_changed,
                                  trait[1]+'_selection[]', dispatch='ui')
 
+    @timed
     def update_values(self):
         self.field.SetItemCount(self.table.GetNumberRows())
         if wx.Platform == '__WXMSW__':
@@ -101,6 +100,13 @@ class ListBinding(object):
     def on_get_item_text(self, row_idx, col_idx):
         return self.table.GetValue(row_idx, col_idx)
 
+    def on_cache_hint(self, event):
+        # The control announces the rows it is about to draw, so the table
+        # can fetch them at once instead of on the first `on_get_item_text`.
+        # Note that `GetCacheTo` is inclusive.
+        self.table.prefetch(event.GetCacheFrom(), event.GetCacheTo()+1)
+        event.Skip()
+
     def get_selected_indexes(self):
         indexes = set()
         row_idx = self.field.GetFirstSelected()
@@ -137,6 +143,7 @@ class LabelBinding(object):
         trait[0].on_trait_change(self.update_view, trait[1], dispatch='ui')
         self.update_view()
 
+    @timed
     def update_view(self):
         self.field.SetLabel(unicode(getattr(*self.trait)))
 
@@ -147,6 +154,7 @@ class StatusBarBinding(object):
         trait[0].on_trait_change(self.update_view, trait[1], dispatch='ui')
         self.update_view()
 
+    @timed
     def update_view(self):
         self.field.SetStatusText(getattr(*self.trait),
             self.field_number)
@@ -158,5 +166,6 @@ class TitleBinding(object):
         trait[0].on_trait_change(self.update_view, trait[1], dispatch='ui')
         self.update_view()
 
+    @timed
     def update_view(self):
         self.field.SetTitle(str(getattr(*self.trait)))
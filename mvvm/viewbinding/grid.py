@@ -1,11 +1,25 @@
-from decimal import Decimal
-import re
 import wx
 import wx.grid
+from wx.lib.pubsub import pub
 import traits.api as traits
 
+from mvvm.viewbinding import clipboard
 from mvvm.viewbinding import display
-from mvvm.viewbinding.interactive import ChoiceBinding, ComboBinding
+from mvvm.viewbinding import timeformat
+
+
+def inject_table_listener(grid, listener):
+    """
+    Call `listener` with every message processed by `grid`, after the grid
+    has processed it. Listeners injected earlier are called first.
+    """
+    process_table_message = grid.ProcessTableMessage
+
+    def process(message):
+        processed = process_table_message(message)
+        listener(message)
+        return processed
+    grid.ProcessTableMessage = process
 
 
 class GridBinding(object):
@@ -37,6 +51,11 @@ class GridBinding(object):
         self.table.commit_on = commit_on
         self.table.grid = self.field
         self.field.SetTable(self.table)
+
+        # Column attributes are created once per column and only re-applied
+        # when the number of columns or the mapping changes.
+        self._column_attrs = {}
+        self._applied_columns = None
         self.on_table_message()
 
         self.field.Bind(wx.grid.EVT_GRID_CELL_CHANGED, self.on_cell_changed)
@@ -47,20 +66,62 @@ class GridBinding(object):
             self.field.RegisterDataType(type_k, type_v.renderer, type_v.editor)
 
         # Inject our table message listener
-        process_table_message = self.field.ProcessTableMessage
-        self.field.ProcessTableMessage = lambda message:\
-            process_table_message(message) and self.on_table_message(message)
+        inject_table_listener(self.field, self.on_table_message)
 
         self.veto_next_select_cell = False
 
     def on_table_message(self, message=None):
+        # Requesting the values does not affect the columns, and is by far the
+        # most frequent message.
+        if message is not None and message.GetId() == \
+                wx.grid.GRIDTABLE_REQUEST_VIEW_GET_VALUES:
+            return
+
+        # The grid only has the columns of the table once it has processed
+        # the messages appending them.
+        columns = (self.field.GetNumberCols(),
+                   [(col.attribute, col.width, col.type_name)
+                    for col in self.mapping])
+        if columns == self._applied_columns:
+            return
+        self._applied_columns = columns
+
         # Only apply styles to the rows / cols
-        for col_idx in range(self.table.GetNumberCols()):
+        for col_idx in range(columns[0]):
             if col_idx < len(self.mapping):
                 col = self.mapping[col_idx]
+                self.field.SetColAttr(col_idx, self.get_column_attr(col_idx))
                 if col.width is not None:
                     self.field.SetColSize(col_idx, col.width)
 
+    def get_column_attr(self, col_idx):
+        """
+        Cached attribute for the column, holding its renderer and editor.
+
+        Setting the renderer and editor on the column saves the grid from
+        looking up the registered data type for every cell it draws. Columns
+        of dotted attributes, of related objects, are read-only.
+        """
+        col = self.mapping[col_idx]
+        key = (col.attribute, col.type_name)
+        if self._column_attrs.get(col_idx, (None,))[0] != key:
+            attr = wx.grid.GridCellAttr()
+            type_ = self.types.get(col.type_name)
+            if type_ is not None:
+                # The attribute takes ownership of a reference; the type keeps
+                # its own for use by other columns.
+                type_.renderer.IncRef()
+                attr.SetRenderer(type_.renderer)
+                type_.editor.IncRef()
+                attr.SetEditor(type_.editor)
+            if '.' in col.attribute:
+                attr.SetReadOnly()
+            self._column_attrs[col_idx] = (key, attr)
+        attr = self._column_attrs[col_idx][1]
+        # The grid takes ownership of a reference as well, keep ours.
+        attr.IncRef()
+        return attr
+
     def on_cell_changed(self, evt):
         if self.commit_on == 'cell':
             if not self.table.SaveCell(evt.Row, evt.Col):
@@ -115,8 +176,73 @@ class GridBinding(object):
 
         evt.Skip()
 
+    def to_value(self, col_idx, text):
+        """
+        Convert pasted `text` for column `col_idx`, using the `from_text` of
+        its type. Raises ValueError when it cannot be converted.
+        """
+        type_ = self.types.get(self.mapping[col_idx].type_name)
+        if type_ is not None and hasattr(type_, 'from_text'):
+            return type_.from_text(text)
+        return text or None
+
+    def paste(self, text=None):
+        """
+        Paste tab separated `text`, by default the text on the clipboard, at
+        the grid cursor. Rows are created when pasting past the last row.
+
+        All values are converted before any is set, every distinct text of
+        a column once, as converting may query the database; the rows are
+        then updated in a single batch, see `ListTable.paste`.
+        """
+        if text is None:
+            data = wx.TextDataObject()
+            if not wx.TheClipboard.Open():
+                return False
+            try:
+                if not wx.TheClipboard.GetData(data):
+                    return False
+            finally:
+                wx.TheClipboard.Close()
+            text = data.GetText()
+        if self.field.IsCellEditControlEnabled():
+            self.field.SaveEditControlValue()
+            self.field.DisableCellEditControl()
+
+        row_idx = self.field.GridCursorRow
+        col_idx = self.field.GridCursorCol
+        num_cols = len(self.mapping) - col_idx
+        rows = []
+        converted = {}
+        for row_offset, cells in enumerate(clipboard.parse_tsv(text)):
+            values = []
+            for col_offset, cell in enumerate(cells[:num_cols]):
+                key = (col_idx + col_offset, cell)
+                if '.' in self.mapping[key[0]].attribute:
+                    # Read-only, skipped by `ListTable.paste`.
+                    values.append(None)
+                    continue
+                try:
+                    if key not in converted:
+                        converted[key] = self.to_value(*key)
+                    values.append(converted[key])
+                except ValueError:
+                    pub.sendMessage('error.user', message=
+                                    u'Cannot paste %r into %s of row %d' % (
+                                        cell,
+                                        self.mapping[col_idx+col_offset].label,
+                                        row_idx + row_offset + 1))
+                    return False
+            rows.append(values)
+        if not rows:
+            return True
+        return self.table.paste(row_idx, col_idx, rows)
+
     def on_key_down(self, event):
-        if event.GetKeyCode() in (wx.WXK_DELETE, wx.WXK_BACK, wx.WXK_NUMPAD_DELETE):
+        if event.ControlDown() and event.GetKeyCode() == ord('V'):
+            self.paste()
+            return
+        elif event.GetKeyCode() in (wx.WXK_DELETE, wx.WXK_BACK, wx.WXK_NUMPAD_DELETE):
             if self.field.GetSelectedRows():
                 self.table.DeleteRows(self.field.GetSelectedRows())
                 self.field.ClearSelection()
@@ -154,11 +280,230 @@ class GridBinding(object):
 
 
 class Column(display.Column):
-    def __init__(self, attribute, label, width=None, type_name=None):
+    """
+    `aggregate` one of 'sum', 'count', 'avg', 'min' or 'max', to show the
+        aggregate of the column over all rows in a `FooterBinding`.
+    """
+    def __init__(self, attribute, label, width=None, type_name=None,
+                 aggregate=None):
         self.attribute = attribute
         self.label = label
         self.width = width
         self.type_name = type_name
+        self.aggregate = aggregate
+
+
+class FooterTable(wx.grid.PyGridTableBase):
+    """Single row table holding the aggregates of the columns of `table`."""
+    def __init__(self, table):
+        super(FooterTable, self).__init__()
+        self.table = table
+
+    def ResetView(self):
+        """Follow the number of columns of `table`, and update the values."""
+        grid = self.GetView()
+        grid.BeginBatch()
+        current, new = grid.GetNumberCols(), self.GetNumberCols()
+        if new < current:
+            grid.ProcessTableMessage(wx.grid.GridTableMessage(
+                self, wx.grid.GRIDTABLE_NOTIFY_COLS_DELETED, new,
+                current-new))
+        elif new > current:
+            grid.ProcessTableMessage(wx.grid.GridTableMessage(
+                self, wx.grid.GRIDTABLE_NOTIFY_COLS_APPENDED, new-current))
+        grid.ProcessTableMessage(wx.grid.GridTableMessage(
+            self, wx.grid.GRIDTABLE_REQUEST_VIEW_GET_VALUES))
+        grid.EndBatch()
+
+    def GetNumberRows(self):
+        return 1
+
+    def GetNumberCols(self):
+        return self.table.GetNumberCols()
+
+    def IsEmptyCell(self, row_idx, col_idx):
+        return self.GetValueAsObject(row_idx, col_idx) is None
+
+    def GetValueAsObject(self, row_idx, col_idx):
+        return self.table.GetAggregate(col_idx)
+
+    def GetValue(self, row_idx, col_idx):
+        value = self.GetValueAsObject(row_idx, col_idx)
+        return u'' if value is None else unicode(value)
+
+    def SetValue(self, row_idx, col_idx, value):
+        pass
+
+    def GetRowLabelValue(self, row_idx):
+        return u''
+
+
+class FooterBinding(object):
+    """
+    Shows the aggregates of the table of a `GridBinding` in a single row
+    Grid, to be placed directly below the bound grid.
+
+    Columns with an `aggregate` are selected in a single query over all rows
+    of the table, see `QueryTable.GetAggregate`. The footer uses the
+    renderers of the bound grid, and follows its column sizes and horizontal
+    scrolling.
+    """
+    def __init__(self, field, binding):
+        if not hasattr(binding.table, 'GetAggregate'):
+            raise TypeError('%s has no aggregates, a footer requires a '
+                            'QueryTable' % type(binding.table).__name__)
+        self.field = field
+        self.binding = binding
+        self.grid = binding.field
+        self.table = FooterTable(binding.table)
+        self.field.SetTable(self.table, True)
+        self.field.SetColLabelSize(0)
+        self.field.SetRowLabelSize(self.grid.GetRowLabelSize())
+        self.field.SetDefaultCellBackgroundColour(
+            self.grid.GetLabelBackgroundColour())
+        self.field.SetScrollRate(*self.grid.GetScrollPixelsPerUnit())
+        self.field.ShowScrollbars(wx.SHOW_SB_NEVER, wx.SHOW_SB_NEVER)
+        self.field.EnableEditing(False)
+        self._applied_columns = None
+        self._aggregates = None
+        self.on_table_message()
+
+        self.grid.Bind(wx.grid.EVT_GRID_COL_SIZE, self.on_col_size)
+        self.grid.Bind(wx.EVT_SCROLLWIN, self.on_scroll)
+
+        inject_table_listener(self.grid, self.on_table_message)
+
+    def on_table_message(self, message=None):
+        # Values are requested by far the most often, the footer is only
+        # updated when that changed the aggregates, e.g. by saving rows.
+        aggregates = [self.table.GetValueAsObject(0, col_idx)
+                      for col_idx in range(self.table.GetNumberCols())]
+        if message is None or message.GetId() != \
+                wx.grid.GRIDTABLE_REQUEST_VIEW_GET_VALUES or \
+                aggregates != self._aggregates:
+            self._aggregates = aggregates
+            self.table.ResetView()
+        if self.binding._applied_columns != self._applied_columns:
+            self._applied_columns = self.binding._applied_columns
+            for col_idx in range(self.table.GetNumberCols()):
+                if col_idx < len(self.binding.mapping):
+                    self.field.SetColAttr(
+                        col_idx, self.binding.get_column_attr(col_idx))
+                self.field.SetColSize(col_idx, self.grid.GetColSize(col_idx))
+
+    def on_col_size(self, evt):
+        self.field.SetColSize(evt.RowOrCol,
+                              self.grid.GetColSize(evt.RowOrCol))
+        self.field.ForceRefresh()
+        evt.Skip()
+
+    def on_scroll(self, evt):
+        # The grid has not scrolled yet while handling the event.
+        wx.CallAfter(self.sync_scroll)
+        evt.Skip()
+
+    def sync_scroll(self):
+        self.field.Scroll(self.grid.GetViewStart()[0], -1)
+
+
+class CachedTextRenderer(wx.grid.PyGridCellRenderer):
+    """
+    Renders a single line of right-aligned text, for use with large grids.
+
+    Brushes are cached per colour and text extents per (font, text), shared
+    between all renderers. The formatted text is cached per value and
+    renderer. Subclasses should implement `format`.
+    """
+    max_cache_size = 10000
+    _brushes = {}
+    _extents = {}
+
+    def __init__(self):
+        super(CachedTextRenderer, self).__init__()
+        self._texts = {}
+
+    def format(self, value):
+        raise NotImplementedError
+
+    def get_text(self, value):
+        try:
+            return self._texts[value]
+        except KeyError:
+            pass
+        except TypeError:  # unhashable
+            return self.format(value)
+        if len(self._texts) > self.max_cache_size:
+            self._texts.clear()
+        text = self._texts[value] = self.format(value)
+        return text
+
+    def get_brush(self, colour):
+        key = colour.Get()
+        try:
+            return self._brushes[key]
+        except KeyError:
+            brush = self._brushes[key] = wx.Brush(colour, wx.SOLID)
+            return brush
+
+    def get_text_extent(self, dc, font_key, text):
+        """Extent of `text`, `dc` should have the font described by
+        `font_key` selected."""
+        key = (font_key, text)
+        try:
+            return self._extents[key]
+        except KeyError:
+            pass
+        if len(self._extents) > self.max_cache_size:
+            self._extents.clear()
+        extent = self._extents[key] = dc.GetTextExtent(text)
+        return extent
+
+    def Draw(self, grid, attr, dc, rect, row, col, isSelected):
+        # Ported from https://github.com/wxWidgets/wxWidgets/blob/master/src/generic/gridctrl.cpp#L50
+        fg = grid.SelectionForeground
+        if grid.Enabled:
+            if isSelected:
+                if grid.HasFocus():
+                    bg = grid.SelectionBackground
+                else:
+                    bg = wx.SystemSettings.GetColour(wx.SYS_COLOUR_BTNSHADOW)
+            else:
+                bg = attr.BackgroundColour
+                fg = attr.TextColour
+        else:
+            bg = wx.SystemSettings.GetColour(wx.SYS_COLOUR_BTNFACE)
+
+        font = attr.GetFont()
+        font_key = font.GetNativeFontInfoDesc()
+        dc.SetClippingRect(rect)
+        dc.SetFont(font)
+        dc.SetTextBackground(bg)
+        dc.SetTextForeground(fg)
+        dc.SetBrush(self.get_brush(bg))
+        dc.SetPen(wx.TRANSPARENT_PEN)
+        dc.DrawRectangleRect(rect)
+
+        text = self.get_text(grid.Table.GetValueAsObject(row, col))
+
+        width, height = self.get_text_extent(dc, font_key, text)
+        x = rect.x + max(rect.width - width, 4) - 2
+        dc.DrawText(text, x, rect.y+1)
+
+        if width > rect.width-2:
+            width, height = self.get_text_extent(dc, font_key, u'\u2026')
+            x = rect.x+1 + rect.width-2 - width
+            dc.DrawRectangle(x, rect.y+1, width+1, height)
+            dc.DrawText(u'\u2026', x, rect.y+1)
+
+        dc.DestroyClippingRegion()
+
+    def GetBestSize(self, grid, attr, dc, row, col):
+        font = attr.GetFont()
+        dc.SetFont(font)
+        text = self.get_text(grid.Table.GetValueAsObject(row, col))
+        width, height = self.get_text_extent(
+            dc, font.GetNativeFontInfoDesc(), text)
+        return wx.Size(width+4, height+2)
 
 
 class ChoiceType(object):
@@ -173,6 +518,9 @@ class ChoiceType(object):
             self.provider = provider
 
         def Create(self, parent, id, evtHandler):
+            # Imported on first use, most grids have no choice columns.
+            from mvvm.viewbinding.interactive import ChoiceBinding, \
+                ComboBinding
             if self.provider:
                 self.SetControl(wx.ComboBox(parent, id))
                 self.binding = ComboBinding(self.GetControl(),
@@ -259,6 +607,27 @@ class ChoiceType(object):
         self.editor = self.Editor(choices=choices, provider=provider)
         self.renderer = wx.grid.GridCellStringRenderer()
 
+    def from_text(self, text):
+        """The choice displayed as `text`, ignoring case."""
+        text = text.strip()
+        if not text:
+            return None
+        if self.provider:
+            choices = self.provider.get_choices(text)
+        else:
+            choices = self.choices
+            # See `ChoiceBinding` for the forms of choices.
+            if hasattr(choices, 'get_choices'):
+                choices = choices.get_choices()
+            elif isinstance(choices, (list, tuple)) and len(choices) == 2:
+                choices = getattr(*choices)
+            if hasattr(choices, 'items'):
+                choices = choices.items()
+        for value, label in choices:
+            if unicode(label).lower() == text.lower():
+                return value
+        raise ValueError('%r is not a choice' % text)
+
 
 class BoolType(object):
     class Editor(wx.grid.PyGridCellEditor):
@@ -286,11 +655,12 @@ class BoolType(object):
         self.editor = self.Editor()
         self.renderer = wx.grid.GridCellBoolRenderer()
 
+    from_text = staticmethod(clipboard.text_to_bool)
+
 
 class TimeType(object):
-    @staticmethod
-    def time_to_text(time):
-        return '%02d:%06.3f' % divmod(time, 60) if time is not None else ''
+    time_to_text = staticmethod(timeformat.time_to_text)
+    text_to_time = staticmethod(timeformat.text_to_time)
 
     class Editor(wx.grid.PyGridCellEditor):
         # Partly ported from wxGridCellTextEditor
@@ -299,7 +669,18 @@ class TimeType(object):
             if wx.Platform == '__WXMSW__':
                 style |= wx.TE_RICH2
             self.Control = wx.TextCtrl(parent, id, style=style)
+            self.Control.Bind(wx.EVT_TEXT, self.on_text)
             self.Control.PushEventHandler(evtHandler)
+            self.valid_colour = self.Control.ForegroundColour
+
+        def on_text(self, evt):
+            # Show right away whether the input can still become a valid time,
+            # instead of only rejecting it when the edit ends.
+            if timeformat.is_partial_time(self.Control.Value):
+                self.Control.SetForegroundColour(self.valid_colour)
+            else:
+                self.Control.SetForegroundColour(wx.RED)
+            evt.Skip()
 
         def SetSize(self, rect):
             if wx.Platform == '__WXMSW__':
@@ -321,15 +702,8 @@ class TimeType(object):
             self.Control.SetInsertionPointEnd()
 
         def EndEdit(self, row, col, grid, prev):
-            text = self.Control.Value
-            m = re.match(r'([0-9]{0,2})[ .:]?([0-9]{2})(([0-9]{3})|[. ]([0-9]{1,3}))', text)
-            if not m:
-                return False
-
-            value = Decimal('%s.%s' % (m.group(2), m.group(4) or m.group(5)))
-            value += int(m.group(1) or 0) * 60
-
-            if value == self.start_value:
+            value = TimeType.text_to_time(self.Control.Value)
+            if value is None or value == self.start_value:
                 return False
 
             grid.Table.SetValueAsObject(row, col, value)
@@ -341,48 +715,23 @@ class TimeType(object):
             elif key == wx.WXK_BACK:
                 pos = self.Control.GetLastPosition()
                 self.Control.Remove(pos-1, pos)
-            else:
+            elif timeformat.is_partial_time(unichr(key)):
+                # The starting key replaces the selected text, so the key by
+                # itself should be the start of a valid time.
                 self.Control.WriteText(unichr(key))
 
-    class Renderer(wx.grid.PyGridCellRenderer):
-        def Draw(self, grid, attr, dc, rect, row, col, isSelected):
-            # Ported from https://github.com/wxWidgets/wxWidgets/blob/master/src/generic/gridctrl.cpp#L50
-            fg = grid.SelectionForeground
-            if grid.Enabled:
-                if isSelected:
-                    if grid.HasFocus():
-                        bg = grid.SelectionBackground
-                    else:
-                        bg = wx.SystemSettings.GetColour(wx.SYS_COLOUR_BTNSHADOW)
-                else:
-                    bg = attr.BackgroundColour
-                    fg = attr.TextColour
-            else:
-                bg = wx.SystemSettings.GetColour(wx.SYS_COLOUR_BTNFACE)
-
-            dc.SetClippingRect(rect)
-            dc.SetFont(attr.GetFont())
-            dc.SetTextBackground(bg)
-            dc.SetTextForeground(fg)
-            dc.SetBrush(wx.Brush(bg, wx.SOLID))
-            dc.SetPen(wx.TRANSPARENT_PEN)
-            dc.DrawRectangleRect(rect)
-
-            value = grid.Table.GetValueAsObject(row, col)
-            text = '%02d:%06.3f' % divmod(value, 60) if value is not None else ''
-
-            width, height = dc.GetTextExtent(text)
-            x = rect.x + max(rect.width - width, 4) - 2
-            dc.DrawText(text, x, rect.y+1)
-
-            if width > rect.width-2:
-                width, height = dc.GetTextExtent(u'\u2026')
-                x = rect.x+1 + rect.width-2 - width
-                dc.DrawRectangle(x, rect.y+1, width+1, height)
-                dc.DrawText(u'\u2026', x, rect.y+1)
-
-            dc.DestroyClippingRegion()
+    class Renderer(CachedTextRenderer):
+        def format(self, value):
+            return TimeType.time_to_text(value)
 
     def __init__(self):
         self.editor = self.Editor()
         self.renderer = self.Renderer()
+
+    def from_text(self, text):
+        if not text.strip():
+            return None
+        value = TimeType.text_to_time(text.strip())
+        if value is None:
+            raise ValueError('%r is not a time' % text)
+        return value
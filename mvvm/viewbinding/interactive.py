@@ -4,6 +4,9 @@ import datetime, time, re
 
 import wx
 
+from mvvm.instrumentation import timed
+from mvvm.viewbinding.layout import deferred_layout
+
 
 class CheckBinding(object):
     def __init__(self, field, trait, readonly=False, values=(False, True)):
@@ -14,9 +17,11 @@ class CheckBinding(object):
         if not readonly:
             field.Bind(wx.EVT_CHECKBOX, self.update_model)
 
+    @timed
     def update_view(self, new):
         self.field.SetValue(new == self.values[1])
 
+    @timed
     def update_model(self, event):
         value = self.values[self.field.GetValue()]
         if getattr(*self.trait) != value:
@@ -62,22 +67,16 @@ class ChoiceBinding(object):
         else:
             field.SetItems(self.choices.values())
         self.update_view(new=getattr(*self.trait))
+        deferred_layout.invalidate(self.field, layout=False)
 
-        # resize frame if Minimalistic
-        if hasattr(self.field.TopLevelParent, 'update_minimal_size'):
-            # First, invalidate all parents
-            parent = self.field.Parent
-            while parent:
-                parent.InvalidateBestSize()
-                parent = parent.Parent
-            self.field.TopLevelParent.update_minimal_size()
-
+    @timed
     def update_view(self, new):
         if len(self.choices) == 0: return
         try:
             self.field.SetSelection(self.choices.keys().index(new))
         except ValueError: pass
 
+    @timed
     def update_model(self, event):
         if 0 <= self.field.GetSelection() < len(self.choices.keys()):
             value = self.choices.keys() [self.field.GetSelection()]
@@ -95,6 +94,7 @@ class ComboBinding(object):
         field.Bind(wx.EVT_COMBOBOX, self._on_combobox)
         self._update_view(getattr(*trait))
 
+    @timed
     def _update_view(self, data):
         text = self.choice_provider.get_display_text(data)
         self.field.SetValue(text)
@@ -135,6 +135,7 @@ class ComboBinding(object):
             self._update_model(event.Selection)
         event.Skip()
 
+    @timed
     def _update_model(self, idx):
         value = self.field.GetClientData(idx)
         if getattr(*self.trait) != value:
@@ -178,10 +179,12 @@ class TextBinding(object):
         if not readonly:
             field.Bind(wx.EVT_TEXT, self.update_model)
 
+    @timed
     def update_view(self, new):
         if self.field.GetValue() != new:
             self.field.SetValue(new and unicode(new) or '')
 
+    @timed
     def update_model(self, event):
         value = self.field.GetValue()
         if getattr(*self.trait) != value:
@@ -198,10 +201,12 @@ class SliderBinding(object):
         if not readonly:
             field.Bind(wx.EVT_SLIDER, self.update_model)
 
+    @timed
     def update_view(self, new):
         if self.field.GetValue() != new:
             self.field.SetValue(new)
 
+    @timed
     def update_model(self, event):
         value = self.field.GetValue()
         if getattr(*self.trait) != value:
@@ -218,12 +223,14 @@ class DateTimeBinding(object):
         if not readonly:
             field.Bind(wx.EVT_TEXT, self.update_model)
 
+    @timed
     def update_view(self, new):
         if new:
             value = new.strftime(self.field._datetime_format)
             if self.field.GetValue() != new:
                 self.field.SetValue(value)
 
+    @timed
     def update_model(self, event):
         value = self.field.GetDateTimeValue()
         if self.field.IsValid() and getattr(*self.trait) != value:
@@ -244,11 +251,13 @@ class DateBinding(object):
         if not readonly:
             field.Bind(wx.EVT_DATE_CHANGED, self.update_model)
 
+    @timed
     def update_view(self, new):
         new = wx.DateTimeFromTimeT(time.mktime(new.timetuple()))
         if self.field.GetValue() != new:
             self.field.SetValue(new)
 
+    @timed
     def update_model(self, event):
         value = self.field.GetValue()
         value = datetime.datetime.fromtimestamp(value.GetTicks())
@@ -264,10 +273,12 @@ class FileBinding(object):
         self.update_view(getattr(*trait))
         self.field.Bind(wx.EVT_FILEPICKER_CHANGED, self.update_model)
 
+    @timed
     def update_view(self, new):
         if self.field.GetPath() != new:
             self.field.SetPath(new)
 
+    @timed
     def update_model(self, event):
         new = event.GetPath()
         if new != getattr(*self.trait):
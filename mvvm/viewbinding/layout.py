@@ -0,0 +1,67 @@
+import wx
+
+
+class DeferredLayout(object):
+    """Batches layout updates caused by bindings.
+
+    Bindings that show, hide or replace controls register the changed control
+    with `invalidate`. The actual work is postponed using `wx.CallAfter`, so
+    all changes made within the same event-loop turn result in a single
+    `Layout` per dirty container and a single `update_minimal_size` per top
+    level window.
+    """
+    def __init__(self):
+        self._layout = []
+        self._resize = []
+        self._pending = False
+
+    def invalidate(self, field, layout=True):
+        """Mark the container of `field` as dirty.
+
+        `layout` whether the sizer of the container should be laid out, if
+            not, only the minimal size of the top level window is updated.
+        """
+        parent = field.GetParent()
+        if layout and parent not in self._layout:
+            self._layout.append(parent)
+        if parent not in self._resize:
+            self._resize.append(parent)
+        if not self._pending:
+            self._pending = True
+            wx.CallAfter(self.flush)
+
+    def flush(self):
+        layout, self._layout = self._layout, []
+        resize, self._resize = self._resize, []
+        self._pending = False
+
+        # Containers might have been destroyed in the meantime, in which case
+        # the wx object evaluates to False.
+        for container in layout:
+            if container and container.GetSizer():
+                container.GetSizer().Layout()
+
+        # resize frames if Minimalistic
+        invalidated = set()
+        top_levels = []
+        for container in resize:
+            if not container:
+                continue
+            top_level = container.TopLevelParent
+            if not hasattr(top_level, 'update_minimal_size'):
+                continue
+            # Invalidate all parents, up to where a sibling container has
+            # already invalidated the chain.
+            parent = container
+            while parent and id(parent) not in invalidated:
+                parent.InvalidateBestSize()
+                invalidated.add(id(parent))
+                parent = parent.Parent
+            if top_level not in top_levels:
+                top_levels.append(top_level)
+
+        for top_level in top_levels:
+            top_level.update_minimal_size()
+
+
+deferred_layout = DeferredLayout()
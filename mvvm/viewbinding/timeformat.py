@@ -0,0 +1,44 @@
+"""
+Conversion between times in seconds and their `mm:ss.fff` text form.
+
+Shared by the editor and renderer of `grid.TimeType`; kept free of wx so it
+can be used (and benchmarked) without a running application.
+"""
+from decimal import Decimal
+import re
+
+
+# Accepts `mm:ss.fff`, `ss.f`, `mmssfff` and the like. Minutes are optional,
+# and the fraction consists of either exactly three digits, or one to three
+# digits following a separator.
+TIME_RE = re.compile(
+    r'([0-9]{0,2})[ .:]?([0-9]{2})(([0-9]{3})|[. ]([0-9]{1,3}))')
+
+# Matches every text that can still be completed into a valid time.
+PARTIAL_TIME_RE = re.compile(
+    r'[0-9]{0,2}(?:[ .:]?[0-9]{0,2}(?:[. ]?[0-9]{0,3})?)?$')
+
+
+def time_to_text(time):
+    return '%02d:%06.3f' % divmod(time, 60) if time is not None else ''
+
+
+def text_to_time(text):
+    """
+    Parse `text` to a `Decimal` number of seconds, or None if invalid.
+
+    The precision of the result equals the number of fractional digits that
+    were entered.
+    """
+    m = TIME_RE.match(text)
+    if not m:
+        return None
+    minutes, seconds, _, fraction, short_fraction = m.groups()
+    fraction = fraction or short_fraction
+    value = (int(minutes or 0) * 60 + int(seconds)) * 10 ** len(fraction)
+    return Decimal(value + int(fraction)).scaleb(-len(fraction))
+
+
+def is_partial_time(text):
+    """Whether `text` is (the start of) a valid time."""
+    return PARTIAL_TIME_RE.match(text) is not None
@@ -1,6 +1,11 @@
 from __future__ import absolute_import
 
-import wx
+from mvvm.lazy import lazy_import
+from mvvm.viewmodel.snapshot import query_fingerprint
+from mvvm.viewmodel.tracing import tracer
+
+sa = lazy_import('sqlalchemy')
+wx = lazy_import('wx')
 
 
 class Base(object):
@@ -12,7 +17,19 @@ class Base(object):
 
 
 class Model(Base):
-    def __init__(self, model=None, field=None, query=None, limit=None):
+    """
+    Choices from the objects of `query`, or of `model`, matching the text
+    entered in `field`.
+
+    With a `SnapshotCache` as `snapshots`, and a fixed query, the primary
+    keys and `field` of the objects are snapshotted and the matching is done
+    on the snapshot; only the matching objects are queried.
+
+    `owner` the ViewModel using the choices, to which the queries are
+    attributed by the tracer; defaults to the name of `model`.
+    """
+    def __init__(self, model=None, field=None, query=None, limit=None,
+                 snapshots=None, owner=None):
         if model is None and field is not None and hasattr(field, 'class_'):
             model = field.class_
         if not query:
@@ -20,21 +37,97 @@ class Model(Base):
                 raise Exception('No query provided and could not derive on as '
                                 'the model was missing.')
             query = wx.GetApp().session.query(model)
+        self.model = model
         self.field = field
         self.query = query
         self.limit = limit
+        self.snapshots = snapshots
+        self.owner = owner
+        self._snapshot = None
+        self._snapshot_opened = False
+
+    def _snapshot_query(self):
+        primary_key = list(sa.inspect(self.model).primary_key)
+        return self.query.with_entities(*(primary_key + [self.field]))
+
+    def _open_snapshot(self):
+        """The snapshot to match against, None to query the database."""
+        if self.snapshots is None or self.model is None or \
+                self.field is None or callable(self.query) or \
+                self._snapshot_opened:
+            return self._snapshot
+        self._snapshot_opened = True
+        query = self._snapshot_query()
+        self._snapshot = self.snapshots.load(query_fingerprint(query))
+        if self._snapshot is None:
+            self.snapshots.build(query, len(query.column_descriptions),
+                                 self.query)
+        else:
+            self.snapshots.validate(self._snapshot, self.query,
+                                    self._snapshot_validated)
+        return self._snapshot
+
+    def _snapshot_validated(self, snapshot, valid):
+        if valid or snapshot is not self._snapshot:
+            return
+        self._snapshot = None
+        snapshot.close()
+        self.snapshots.discard(snapshot.fingerprint)
+        # Queried from the database until it is rebuilt.
+        query = self._snapshot_query()
+        self.snapshots.build(query, len(query.column_descriptions),
+                             self.query)
+
+    def _snapshot_choices(self, snapshot, partial_text):
+        primary_key = list(sa.inspect(self.model).primary_key)
+        num_keys = len(primary_key)
+        text = partial_text.lower() if partial_text else None
+        keys = []
+        for row_idx in range(len(snapshot)):
+            value = snapshot.get(row_idx, num_keys)
+            if text is None or \
+                    (value is not None and text in unicode(value).lower()):
+                keys.append(snapshot.row(row_idx)[:num_keys])
+                if self.limit and len(keys) >= self.limit:
+                    break
+        if not keys:
+            return []
+        if num_keys == 1:
+            objects = dict((sa.inspect(obj).identity, obj) for obj in
+                           self.query.filter(primary_key[0].in_(
+                               [key[0] for key in keys])))
+            objects = [objects.get(key) for key in keys]
+        else:
+            objects = [self.query.get(key) for key in keys]
+        return [(data, self.get_display_text(data))
+                for data in objects if data is not None]
+
+    def _owner(self):
+        if self.owner is not None:
+            return self.owner
+        return self.model.__name__ if self.model else 'choice_provider'
 
     def get_choices(self, partial_text=None):
         if partial_text is not None and not partial_text:
             return []
+        snapshot = self._open_snapshot()
+        if snapshot is not None:
+            with tracer.scope(self._owner(), 'get_choices'):
+                choices = self._snapshot_choices(snapshot, partial_text)
+                tracer.add_rows(len(choices))
+            return choices
         query = self.query
         if callable(query):
             query = query(partial_text)
         if self.field is not None:
             query = query.filter(self.field.like('%%%s%%' % partial_text))
-        if self.limit:
-            query = query[0:self.limit]
-        return [(data, self.get_display_text(data)) for data in query]
+        with tracer.scope(self._owner(), 'get_choices'):
+            if self.limit:
+                # Slicing executes the query
+                query = query[0:self.limit]
+            choices = [(data, self.get_display_text(data)) for data in query]
+            tracer.add_rows(len(choices))
+        return choices
 
     def get_display_text(self, data):
         return unicode(data or '')
@@ -0,0 +1,234 @@
+"""
+Commits the changes of existing objects on a writer thread.
+
+Saving an object applies its changes optimistically: they are made the
+committed state of the object, so the session of the UI thread does not
+write them, and all wrappers of the object are notified. The changes are
+then queued for a writer thread with its own session. Changes to an object
+which is still waiting in the queue are coalesced into a single commit.
+When a commit fails, the previous values are restored on the UI thread and
+the error is sent on the `error.database` topic. Attributes which had not
+been loaded before they were changed have their previous value loaded by
+the writer.
+
+    >>> pipeline = CommitPipeline(sessionmaker(bind=engine))
+    >>> class SkaterList(List):
+    ...     commit_pipeline = pipeline
+
+New objects, and changes referring to new objects, cannot be committed by
+another session and are committed synchronously instead.
+
+The changes still queued when the application exits are committed before
+the interpreter exits, as `stop` is registered with `atexit`. Errors can no
+longer be shown by then, so call `stop` when the application closes, e.g.
+from `wx.App.OnExit`, to report them.
+"""
+import atexit
+import sys
+import threading
+import timeit
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+import wx
+from wx.lib.pubsub import pub
+from sqlalchemy import inspect
+from sqlalchemy.inspection import NoInspectionAvailable
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.state import InstanceState
+
+from mvvm.instrumentation import stats
+from mvvm.viewmodel.wrapper import notify_wrappers, unwrap
+
+
+# Previous value of an attribute which was not loaded before it was changed
+_unloaded = object()
+
+
+class _Ref(object):
+    """Reference to a persistent object, to be loaded by another session."""
+    __slots__ = ('cls', 'identity')
+
+    def __init__(self, cls, identity):
+        self.cls = cls
+        self.identity = identity
+
+
+def _unwrap(value):
+    if isinstance(value, (list, tuple)):
+        return [unwrap(item) for item in value]
+    return unwrap(value)
+
+
+def _portable(value):
+    """`value` with persistent objects replaced by a `_Ref`, raises
+    ValueError for objects that have not been committed."""
+    if isinstance(value, list):
+        return [_portable(item) for item in value]
+    try:
+        state = inspect(value)
+    except NoInspectionAvailable:
+        return value
+    if not isinstance(state, InstanceState):
+        return value
+    if not state.has_identity:
+        raise ValueError('%r has not been committed' % value)
+    return _Ref(type(value), state.identity)
+
+
+def _resolve(session, value):
+    if isinstance(value, list):
+        return [_resolve(session, item) for item in value]
+    if isinstance(value, _Ref):
+        return session.query(value.cls).get(value.identity)
+    return value
+
+
+def _has_refs(value):
+    if isinstance(value, list):
+        return any(_has_refs(item) for item in value)
+    return isinstance(value, _Ref)
+
+
+class CommitPipeline(object):
+    def __init__(self, session_factory):
+        """
+        `session_factory` callable returning the session of the writer
+            thread, usually a `sessionmaker` bound to the engine of the
+            application's session.
+        """
+        self.session_factory = session_factory
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        # The writer is a daemon thread, which does not keep the
+        # interpreter alive by itself.
+        atexit.register(self.stop)
+
+    def submit(self, obj, owner=None):
+        """
+        Commit the changes made to `obj` on the writer thread.
+
+        Returns False when `obj` cannot be committed by the writer, in which
+        case nothing has been changed and it should be committed directly.
+        """
+        state = inspect(obj)
+        if not state.has_identity or state.was_deleted:
+            return False
+        relationships = state.mapper.relationships
+        changes, previous = {}, {}
+        for attr in state.attrs:
+            history = attr.history
+            if not history.has_changes():
+                continue
+            changes[attr.key] = _unwrap(attr.value)
+            if attr.key in relationships and relationships[attr.key].uselist:
+                previous[attr.key] = list(history.unchanged) + \
+                    list(history.deleted)
+            elif history.deleted:
+                previous[attr.key] = history.deleted[0]
+            else:
+                # Loaded by the writer, before it writes the change.
+                previous[attr.key] = _unloaded
+        if not changes:
+            return True
+        try:
+            portable = dict((name, _portable(value))
+                            for name, value in changes.items())
+        except ValueError:
+            return False
+
+        for name, value in changes.items():
+            set_committed_value(obj, name, value)
+        notify_wrappers(obj, changes)
+
+        key = (type(obj), state.identity)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = {
+                    'obj': obj, 'owner': owner, 'changes': {},
+                    'previous': {}}
+                self._queue.put(key)
+            entry['changes'].update(portable)
+            # Coalesced changes are undone up to the first save.
+            for name, value in previous.items():
+                entry['previous'].setdefault(name, value)
+        self._start()
+        return True
+
+    def wait(self):
+        """Block until all submitted changes have been committed."""
+        self._queue.join()
+
+    def stop(self):
+        """Commit the submitted changes and stop the writer thread, which
+        is started again by the next `submit`."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name='CommitPipeline')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        session = self.session_factory()
+        while True:
+            key = self._queue.get()
+            try:
+                if key is None:
+                    return
+                with self._lock:
+                    entry = self._pending.pop(key)
+                self._write(session, key, entry)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, session, key, entry):
+        cls, identity = key
+        start = stats.enabled and timeit.default_timer()
+        try:
+            obj = session.query(cls).get(identity)
+            if obj is None:
+                raise AssertionError('%s %r no longer exists' %
+                                     (cls.__name__, identity))
+            for name, value in list(entry['previous'].items()):
+                if value is _unloaded:
+                    entry['previous'][name] = _portable(getattr(obj, name))
+            for name, value in entry['changes'].items():
+                setattr(obj, name, _resolve(session, value))
+            session.commit()
+        except Exception as e:
+            # The writer should keep running, whatever the error. Once the
+            # application has exited, the error can no longer be reported.
+            session.rollback()
+            if wx.GetApp() is not None:
+                wx.CallAfter(self._failed, entry, e, sys.exc_info())
+        finally:
+            session.close()
+        if stats.enabled:
+            stats.add('CommitPipeline.commit', timeit.default_timer() - start)
+
+    def _failed(self, entry, e, exc_info):
+        obj = entry['obj']
+        session = object_session(obj)
+        unloaded = []
+        for name, value in entry['previous'].items():
+            if value is _unloaded or session is None and _has_refs(value):
+                unloaded.append(name)
+            else:
+                set_committed_value(obj, name, _resolve(session, value))
+        if unloaded and session is not None:
+            # The committed value is unknown, it is loaded again instead.
+            session.expire(obj, unloaded)
+        notify_wrappers(obj, entry['previous'])
+        pub.sendMessage('error.database', message=e.message, exc_info=exc_info)
@@ -0,0 +1,162 @@
+"""
+Exports the rows of a table to CSV or XLSX files, on a worker thread.
+
+Rows are formatted like the grid formats them, with the `get_<attr>_display`
+methods of the model, and written as they are produced, so the memory used
+does not depend on the number of rows.
+"""
+import csv
+import io
+import os
+import sys
+import threading
+
+from mvvm.lazy import lazy_import
+from mvvm.viewmodel.query import display_value
+
+wx = lazy_import('wx')
+xlsxwriter = lazy_import('xlsxwriter')
+
+try:
+    text_type = unicode
+except NameError:  # Python 3
+    text_type = str
+
+
+class CsvWriter(object):
+    """Writes rows as UTF-8 encoded CSV."""
+    def __init__(self, path):
+        if sys.version_info[0] == 2:
+            self._file = open(path, 'wb')
+        else:
+            self._file = io.open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+
+    def writerow(self, values):
+        values = [u'' if value is None else text_type(value)
+                  for value in values]
+        if sys.version_info[0] == 2:
+            values = [value.encode('utf-8') for value in values]
+        self._writer.writerow(values)
+
+    def close(self):
+        self._file.close()
+
+
+class XlsxWriter(object):
+    """
+    Writes rows to the first sheet of an XLSX workbook, requires the
+    `xlsxwriter` package. Rows are flushed to disk as they are written.
+    """
+    def __init__(self, path):
+        self._workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        self._sheet = self._workbook.add_worksheet()
+        self._row_idx = 0
+
+    def writerow(self, values):
+        for col_idx, value in enumerate(values):
+            if value is not None:
+                self._sheet.write(self._row_idx, col_idx, value)
+        self._row_idx += 1
+
+    def close(self):
+        self._workbook.close()
+
+
+WRITERS = {
+    '.csv': CsvWriter,
+    '.xlsx': XlsxWriter,
+}
+
+
+class Export(object):
+    """
+    Writes objects to a CSV or XLSX file on a worker thread.
+
+    `rows` callable returning the objects to export; it is called on the
+        worker thread, so a query should use a session of its own.
+
+    `mapping` columns to export, their labels are written as the header.
+
+    `path` of the file, its extension selects the format from `WRITERS`.
+
+    `total` number of rows, if known, passed to `progress`.
+
+    `progress` callable receiving the number of rows written and `total`,
+        called on the UI thread every `chunk_size` rows.
+
+    `done` callable receiving the export when it has finished; `error` is
+        then the exception that stopped it, if any. The file is removed when
+        the export failed or was cancelled.
+
+    `formatted` whether `rows` returns lists of the values to write instead,
+        e.g. as the objects can only be read on the UI thread.
+    """
+    def __init__(self, rows, mapping, path, total=None, progress=None,
+                 done=None, chunk_size=1000, formatted=False):
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in WRITERS:
+            raise ValueError('Cannot export to %r files' % extension)
+        self.rows = rows
+        self.mapping = mapping
+        self.path = path
+        self.total = total
+        self.progress = progress
+        self.done = done
+        self.chunk_size = chunk_size
+        self.formatted = formatted
+        self.count = 0
+        self.error = None
+        self._writer_cls = WRITERS[extension]
+        self._cancelled = threading.Event()
+        self._thread = None
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='Export')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Stop the export after the current row."""
+        self._cancelled.set()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        attributes = [column.attribute for column in self.mapping]
+        writer = None
+        try:
+            writer = self._writer_cls(self.path)
+            writer.writerow([column.label for column in self.mapping])
+            for row in self.rows():
+                if self.cancelled:
+                    break
+                if not self.formatted:
+                    row = [display_value(row, attribute)
+                           for attribute in attributes]
+                writer.writerow(row)
+                self.count += 1
+                if self.progress and self.count % self.chunk_size == 0:
+                    wx.CallAfter(self.progress, self.count, self.total)
+        except Exception as e:
+            # Reported through `done`, the worker has no one to raise to.
+            self.error = e
+        finally:
+            if writer is not None:
+                writer.close()
+        if self.error is not None or self.cancelled:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        elif self.progress:
+            wx.CallAfter(self.progress, self.count, self.total)
+        if self.done:
+            wx.CallAfter(self.done, self)
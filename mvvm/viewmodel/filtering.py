@@ -0,0 +1,162 @@
+"""
+Client-side filtering and sorting of lists of objects.
+"""
+from bisect import bisect_left
+from itertools import count
+from operator import itemgetter
+
+
+def attribute_key(attribute, getter=getattr):
+    """Sort key on `attribute`, placing None values first."""
+    def key(obj):
+        value = getter(obj, attribute)
+        return value is not None, value
+    return key
+
+
+class FilteredSortedView(object):
+    """
+    Filtered and sorted view on a list of objects, updated incrementally.
+
+    `key` callable returning the sort key of an object, or None to keep the
+        order of the source list.
+
+    `predicate` callable deciding whether an object is shown, or None to
+        show all objects.
+
+    Sorted objects are kept in a list ordered by key, which is built in a
+    single sort; added and changed objects are inserted using bisection.
+    Only the predicate of added or changed objects is evaluated, except when
+    the filter itself changes.
+    """
+    def __init__(self, source=(), key=None, predicate=None, reverse=False):
+        self.key = key
+        self.predicate = predicate
+        self.reverse = reverse
+        self._seq = count()
+        self.reset(source)
+
+    def reset(self, source):
+        """Rebuild the view for a (new) source list."""
+        self._source = source
+        shown = [obj for obj in source if self._accepts(obj)]
+        self._shown = set(id(obj) for obj in shown)
+        self._rows = None
+        if self.key is None:
+            self._keys, self._sorted, self._entries = [], [], {}
+            return
+        entries = sorted([((self.key(obj), next(self._seq)), obj)
+                          for obj in shown], key=itemgetter(0))
+        self._keys = [entry for entry, _ in entries]
+        self._sorted = [obj for _, obj in entries]
+        self._entries = dict((id(obj), entry) for entry, obj in entries)
+
+    def _accepts(self, obj):
+        return self.predicate is None or self.predicate(obj)
+
+    def _add(self, obj):
+        self._shown.add(id(obj))
+        if self.key is not None:
+            entry = (self.key(obj), next(self._seq))
+            self._entries[id(obj)] = entry
+            idx = bisect_left(self._keys, entry)
+            self._keys.insert(idx, entry)
+            self._sorted.insert(idx, obj)
+        self._rows = None
+
+    def _remove(self, obj):
+        self._shown.discard(id(obj))
+        if self.key is not None:
+            entry = self._entries.pop(id(obj))
+            idx = bisect_left(self._keys, entry)
+            del self._keys[idx]
+            del self._sorted[idx]
+        self._rows = None
+
+    @property
+    def rows(self):
+        """The shown objects, in order."""
+        if self._rows is None:
+            if self.key is not None:
+                rows = list(self._sorted)
+            else:
+                rows = [obj for obj in self._source if id(obj) in self._shown]
+            if self.reverse:
+                rows.reverse()
+            self._rows = rows
+        return self._rows
+
+    def __len__(self):
+        return len(self._shown)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, idx):
+        return self.rows[idx]
+
+    def __contains__(self, obj):
+        return id(obj) in self._shown
+
+    def added(self, objects):
+        """Objects were added to the source list."""
+        for obj in objects:
+            if id(obj) not in self._shown and self._accepts(obj):
+                self._add(obj)
+
+    def removed(self, objects):
+        """Objects were removed from the source list."""
+        for obj in objects:
+            if id(obj) in self._shown:
+                self._remove(obj)
+
+    def changed(self, obj):
+        """
+        An object in the source list was modified; re-evaluates its predicate
+        and key. Returns whether the rows changed.
+        """
+        shown = id(obj) in self._shown
+        accepted = self._accepts(obj)
+        if shown and accepted and self.key is not None:
+            if self._entries[id(obj)][0] == self.key(obj):
+                return False
+            self._remove(obj)
+            self._add(obj)
+            return True
+        if shown and not accepted:
+            self._remove(obj)
+            return True
+        if accepted and not shown:
+            self._add(obj)
+            return True
+        return False
+
+    def set_filter(self, predicate, narrowing=False):
+        """
+        Replace the predicate.
+
+        `narrowing` whether the new predicate only accepts objects accepted
+            by the current predicate (e.g. when text was appended to a search
+            term), so only the shown objects need to be checked.
+        """
+        self.predicate = predicate
+        if not narrowing:
+            return self.reset(self._source)
+        removed = set(id(obj) for obj in self.rows if not self._accepts(obj))
+        if not removed:
+            return
+        self._shown -= removed
+        if self.key is not None:
+            kept = [(entry, obj)
+                    for entry, obj in zip(self._keys, self._sorted)
+                    if id(obj) not in removed]
+            self._keys = [entry for entry, _ in kept]
+            self._sorted = [obj for _, obj in kept]
+            for key in removed:
+                del self._entries[key]
+        self._rows = None
+
+    def set_sort(self, key, reverse=False):
+        self.key = key
+        self.reverse = reverse
+        self.reset(self._source)
@@ -1,19 +1,25 @@
 from __future__ import absolute_import
 import sys
 
-import wx
-from wx.lib.pubsub import pub
-from sqlalchemy.exc import IntegrityError, DatabaseError
-from sqlalchemy.orm import Query
 from traits.has_traits import HasTraits, on_trait_change
 from traits.trait_types import List as TList, Instance, Str, Any
 from traits.traits import Property
 
-from mvvm.viewmodel.table import ListTable, QueryTable
+from mvvm.lazy import lazy_import
+from mvvm.viewmodel.filtering import FilteredSortedView, attribute_key
+from mvvm.viewmodel.query import eager_options, get_attribute, \
+    mapping_attributes
+from mvvm.viewmodel.tracing import tracer
 from mvvm.viewmodel.util import CloseMixin
 from mvvm.viewbinding.command import Command
 from mvvm.viewmodel.wrapper import wrap, unwrap
 
+# Only needed once the view models are used, see `mvvm.lazy`.
+wx = lazy_import('wx')
+pub = lazy_import('wx.lib.pubsub.pub')
+exc = lazy_import('sqlalchemy.exc')
+orm = lazy_import('sqlalchemy.orm')
+
 
 class List(CloseMixin, HasTraits):
     """
@@ -30,28 +36,50 @@ class List(CloseMixin, HasTraits):
 
     `title` name of the window title, used in Generic Views, defaults to the
         class name of the Model + 's'
+
+    `related` relationships to load together with the objects, in addition
+        to those in `mapping`, e.g. those used by `get_<attr>_display`.
+
+    `columnar` whether the table reads the values from a column store, which
+        supports fast sorting, filtering and aggregation.
+
+    `commit_pipeline` optional `CommitPipeline` committing changes of
+        existing objects on a writer thread, see `mvvm.viewmodel.commit`.
+
+    `listen` 'viewport' to only listen to changes of the displayed objects,
+        instead of 'all' objects, see `ListTable`. Saves attaching a
+        listener to every object of a long list.
     """
     Model = None
     mapping = None
+    related = ()
+    columnar = False
+    commit_pipeline = None
+    listen = 'all'
 
     autocommit = True
     pending_commit = TList(HasTraits)
 
     objects = TList(HasTraits)
     objects_selection = TList(HasTraits)
-    objects_table = Instance(ListTable)
+    objects_table = Instance('mvvm.viewmodel.table.ListTable')
 
     del_cmd = Instance(Command)
 
     title = Str
 
     def create_query(self):
-        return Query(self.Model)
+        attributes = mapping_attributes(self.mapping) + list(self.related)
+        return orm.Query(self.Model).options(
+            *eager_options(self.Model, attributes))
 
     def _objects_default(self):
         query = self.create_query()
         query.session = wx.GetApp().session
-        return [wrap(obj) for obj in query]
+        with tracer.scope(self, 'objects'):
+            objects = [wrap(obj) for obj in query]
+            tracer.add_rows(len(objects))
+        return objects
 
     @on_trait_change('objects_selection')
     def _on_selection_changed(self, sel):
@@ -75,9 +103,10 @@ class List(CloseMixin, HasTraits):
         for object in objects:
             session.delete(unwrap(object))
         try:
-            session.commit()
+            with tracer.scope(self, 'objects_delete'):
+                session.commit()
             return True
-        except (AssertionError, IntegrityError) as e:
+        except (AssertionError, exc.IntegrityError) as e:
             session.rollback()
             # @todo error.user, not a database error
             pub.sendMessage('error.database', message=e.message,
@@ -100,7 +129,7 @@ class List(CloseMixin, HasTraits):
             else:
                 for obj in objects:
                     self.pending_commit.append(obj)
-        except (AttributeError, IntegrityError, AssertionError) as e:
+        except (AttributeError, exc.IntegrityError, AssertionError) as e:
             wx.GetApp().session.rollback()
             # @todo error.user, not a database error
             pub.sendMessage('error.database', message=e.message,
@@ -109,16 +138,34 @@ class List(CloseMixin, HasTraits):
         return True
 
     def objects_commit(self, objects):
-        for obj in objects:
-            wx.GetApp().session.add(unwrap(obj))
-        wx.GetApp().session.commit()
+        remaining = objects
+        if self.commit_pipeline is not None:
+            remaining = [obj for obj in objects
+                         if not self.commit_pipeline.submit(unwrap(obj), self)]
+        if remaining:
+            with tracer.scope(self, 'objects_commit'):
+                for obj in remaining:
+                    wx.GetApp().session.add(unwrap(obj))
+                wx.GetApp().session.commit()
         for obj in objects:
             obj.changes.clear()
 
-    def _objects_table_default(self):
-        return ListTable((self, 'objects'), self.mapping)
+    def create_view(self):
+        """`FilteredSortedView` for the table, or None to show all objects
+        in the order of the list."""
+        return None
 
-    @on_trait_change('objects.+,objects_items')
+    def _objects_table_default(self):
+        from mvvm.viewmodel.table import ColumnarListTable, ListTable
+        if self.columnar:
+            return ColumnarListTable((self, 'objects'), self.mapping,
+                                     view=self.create_view(),
+                                     listen=self.listen)
+        return ListTable((self, 'objects'), self.mapping,
+                         view=self.create_view(), listen=self.listen)
+
+    # Changes of the objects themselves are handled by the table.
+    @on_trait_change('objects,objects_items')
     def on_table_update(self):
         wx.CallAfter(self.objects_table.ResetView)
 
@@ -139,8 +186,63 @@ class ListSearchMixin(HasTraits):
         raise NotImplementedError
 
 
+class ListFilterMixin(HasTraits):
+    """
+    Filters and sorts `objects` client-side, without querying the database.
+
+    `filter` text the shown objects should contain, in any of the
+        `filter_attributes` (defaults to the mapped attributes).
+    """
+    filter = Str
+    filter_attributes = ()
+
+    def create_view(self):
+        return FilteredSortedView()
+
+    def _filter_changed(self, old, new):
+        text = new.lower()
+        attributes = self.filter_attributes or \
+            mapping_attributes(self.mapping)
+
+        def predicate(obj):
+            for attribute in attributes:
+                value = get_attribute(obj, attribute)
+                if value is not None and text in unicode(value).lower():
+                    return True
+            return False
+
+        # Objects containing the new text, also contain the old text.
+        self.objects_table.view.set_filter(predicate if text else None,
+                                           narrowing=old.lower() in text)
+        self.objects_table.reindex()
+
+    def sort(self, attribute, reverse=False):
+        """Order the shown objects by `attribute`, None for list order."""
+        key = attribute and attribute_key(attribute, get_attribute)
+        self.objects_table.view.set_sort(key, reverse)
+        self.objects_table.reindex()
+
+
 class QueryList(List):
-    objects_query = Instance(Query)
+    """
+    ViewModel for binding to a List View, fetching the objects page by page.
+
+    `projection` whether to fetch only the mapped attributes, instead of
+        complete objects. Objects are then only loaded when requested from
+        the table, e.g. when opened or edited.
+
+    `watermark` name of a version or modification time column of `Model`,
+        allowing `objects_table.refresh` to fetch only the changed rows.
+
+    `snapshots` optional `SnapshotCache`, to serve the rows of a projected
+        list from an on-disk snapshot when it is reopened. Only worthwhile
+        for reference data which rarely changes.
+    """
+    projection = False
+    watermark = None
+    snapshots = None
+
+    objects_query = Instance('sqlalchemy.orm.Query')
 
     def __init__(self, **kwargs):
         super(QueryList, self).__init__(**kwargs)
@@ -149,15 +251,35 @@ class QueryList(List):
     def _objects_default(self):
         return []
 
+    def create_query(self):
+        if self.projection:
+            # Loader options cannot be applied to a query selecting columns
+            # only; related attributes are joined by the table instead.
+            return orm.Query(self.Model)
+        return super(QueryList, self).create_query()
+
     def _objects_query_default(self):
         return self.create_query()
 
     def _objects_table_default(self):
-        return QueryTable((self, 'objects'))
+        from mvvm.viewmodel.table import ProjectedQueryTable, QueryTable
+        if self.projection:
+            return ProjectedQueryTable((self, 'objects'), self.mapping,
+                                       watermark=self.watermark,
+                                       snapshots=self.snapshots)
+        return QueryTable((self, 'objects'), watermark=self.watermark)
 
     def objects_delete(self, objects):
+        try:
+            offsets = [self.objects_table.row_offset(obj) for obj in objects]
+        except IndexError:
+            offsets = None
         if self._objects_do_delete(objects):
-            self.objects_table.reload()
+            if offsets is None:
+                self.objects_table.reload()
+            else:
+                self.objects_table.forget_rows(offsets)
+            return True
 
 
 class Detail(CloseMixin, HasTraits):
@@ -184,7 +306,12 @@ class Detail(CloseMixin, HasTraits):
 
     `title` name of the window title, used in Generic Views, defaults to the
         class name of the unwrapped object.
+
+    `commit_pipeline` optional `CommitPipeline` committing changes to an
+        existing object on a writer thread, see `mvvm.viewmodel.commit`.
     """
+    commit_pipeline = None
+
     object = Property(depends_on='[_object_proxy,_object_original]')
     _object_original = Any
     _object_unwrapped = Any
@@ -196,11 +323,20 @@ class Detail(CloseMixin, HasTraits):
     title = Str
 
     def commit(self):
-        try:
+        if self.commit_pipeline is not None:
             self._object_proxy.flush()
-            wx.GetApp().session.add(self._object_unwrapped)
-            wx.GetApp().session.commit()
-        except (AssertionError, DatabaseError) as e:
+            # The wrappers of the object, including the proxy and original
+            # object, are notified of the changes by the pipeline. Changes
+            # to the value the object already had are not among them.
+            if self.commit_pipeline.submit(self._object_unwrapped, self):
+                self._object_proxy.changes.clear()
+                return True
+        try:
+            with tracer.scope(self, 'commit'):
+                self._object_proxy.flush()
+                wx.GetApp().session.add(self._object_unwrapped)
+                wx.GetApp().session.commit()
+        except (AssertionError, exc.DatabaseError) as e:
             wx.GetApp().session.rollback()
             pub.sendMessage('error.database', message=e.message,
                 exc_info=sys.exc_info())
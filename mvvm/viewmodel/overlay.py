@@ -0,0 +1,168 @@
+"""
+Local edits on top of a paged query result.
+"""
+from bisect import bisect_left, bisect_right, insort
+
+
+class EditOverlay(object):
+    """
+    Rows inserted and deleted locally, on top of a result of `num_rows` rows.
+
+    Rows of the result are addressed by their offset in the result, rows of
+    the grid by their index. Deleted rows are kept as sorted offsets. Every
+    inserted row is anchored to the offset of the result row it is displayed
+    before; the anchors are kept sorted as well. Translating between offsets
+    and indexes bisects both lists, so does not depend on the number of
+    rows in the result.
+    """
+    def __init__(self, num_rows=0):
+        self.clear(num_rows)
+
+    def clear(self, num_rows=None):
+        if num_rows is not None:
+            self.num_rows = num_rows
+        self._deleted = []
+        self._deleted_objects = {}
+        self._anchors = []
+        self._inserted = []
+
+    def __len__(self):
+        return self.num_rows - len(self._deleted) + len(self._inserted)
+
+    @property
+    def changed(self):
+        return bool(self._deleted or self._inserted)
+
+    @property
+    def inserted(self):
+        """Inserted objects, in the order they are displayed."""
+        return list(self._inserted)
+
+    @property
+    def deleted(self):
+        """Objects of the deleted rows, in the order of the result."""
+        return [self._deleted_objects[offset] for offset in self._deleted]
+
+    @property
+    def deleted_offsets(self):
+        """Offsets of the deleted rows, sorted."""
+        return list(self._deleted)
+
+    def _position(self, k):
+        """Index of the `k`th inserted row."""
+        anchor = self._anchors[k]
+        return anchor - bisect_left(self._deleted, anchor) + k
+
+    def _inserted_before(self, row_idx):
+        """Number of inserted rows displayed before index `row_idx`."""
+        lo, hi = 0, len(self._anchors)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._position(mid) < row_idx:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _offset(self, n):
+        """Offset of the `n`th result row which has not been deleted."""
+        # The first deleted offset beyond it is the first for which the
+        # offset minus the number of deleted offsets before it exceeds `n`.
+        lo, hi = 0, len(self._deleted)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._deleted[mid] - mid <= n:
+                lo = mid + 1
+            else:
+                hi = mid
+        return n + lo
+
+    def source(self, row_idx):
+        """(offset, None) for a result row, (None, object) for an inserted
+        row at index `row_idx`."""
+        k = self._inserted_before(row_idx)
+        if k < len(self._anchors) and self._position(k) == row_idx:
+            return None, self._inserted[k]
+        return self._offset(row_idx - k), None
+
+    def offset_at(self, row_idx):
+        """Offset of the first result row displayed at or after `row_idx`."""
+        return self._offset(row_idx - self._inserted_before(row_idx))
+
+    def index(self, offset):
+        """Index of the result row at `offset`, None if it was deleted."""
+        deleted_before = bisect_left(self._deleted, offset)
+        if deleted_before < len(self._deleted) and \
+                self._deleted[deleted_before] == offset:
+            return None
+        return offset - deleted_before + bisect_right(self._anchors, offset)
+
+    def index_of(self, obj):
+        """Index of inserted row `obj`, None if it was not inserted."""
+        for k, inserted in enumerate(self._inserted):
+            if inserted is obj:
+                return self._position(k)
+        return None
+
+    def insert(self, row_idx, obj):
+        """Display `obj` at index `row_idx`, moving the rows below down."""
+        if row_idx >= len(self):
+            anchor, k = self.num_rows, len(self._anchors)
+        else:
+            k = self._inserted_before(row_idx)
+            if k < len(self._anchors) and self._position(k) == row_idx:
+                anchor = self._anchors[k]
+            else:
+                anchor = self._offset(row_idx - k)
+                k = bisect_right(self._anchors, anchor)
+        self._anchors.insert(k, anchor)
+        self._inserted.insert(k, obj)
+
+    def delete(self, row_idx, obj=None):
+        """
+        Hide the row at index `row_idx`, moving the rows below up. `obj` is
+        the object of a result row, returned by `deleted`. Returns the
+        object of an inserted row, which is forgotten.
+        """
+        k = self._inserted_before(row_idx)
+        if k < len(self._anchors) and self._position(k) == row_idx:
+            del self._anchors[k]
+            return self._inserted.pop(k)
+        offset = self._offset(row_idx - k)
+        insort(self._deleted, offset)
+        self._deleted_objects[offset] = obj
+        return obj
+
+    def merge(self, row_idx):
+        """
+        The inserted row at index `row_idx` has been added to the result;
+        it is forgotten and the result grows by a row. As its offset is
+        unknown, it is taken to be after the last row, so the other edits
+        keep their offsets. Returns the object of the row.
+        """
+        k = self._inserted_before(row_idx)
+        if k == len(self._anchors) or self._position(k) != row_idx:
+            raise IndexError('row %d was not inserted' % row_idx)
+        del self._anchors[k]
+        obj = self._inserted.pop(k)
+        self._anchors = [self.num_rows + 1 if anchor == self.num_rows
+                         else anchor for anchor in self._anchors]
+        self.num_rows += 1
+        return obj
+
+    def remove_offsets(self, offsets):
+        """Result rows at `offsets` no longer exist, e.g. as they have been
+        deleted from the database; the result rows after them move up."""
+        removed = sorted(set(offsets))
+        if not removed:
+            return
+        shift = lambda offset: offset - bisect_left(removed, offset)
+        removed_set = set(removed)
+        deleted = [offset for offset in self._deleted
+                   if offset not in removed_set]
+        self._deleted_objects = dict((shift(offset),
+                                      self._deleted_objects[offset])
+                                     for offset in deleted)
+        self._deleted = [shift(offset) for offset in deleted]
+        self._anchors = [shift(anchor) for anchor in self._anchors]
+        self.num_rows -= len(removed)
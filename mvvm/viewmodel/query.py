@@ -0,0 +1,157 @@
+"""
+Helpers for deriving queries from a column mapping.
+
+Attributes in a mapping may be dotted, e.g. `country.name`, to display an
+attribute of a related object. Dotted attributes are read-only.
+"""
+from mvvm.lazy import lazy_import
+
+sa = lazy_import('sqlalchemy')
+orm = lazy_import('sqlalchemy.orm')
+
+
+def mapping_attributes(mapping):
+    """Attribute names of `mapping`, which holds columns or tuples."""
+    return [col.attribute if hasattr(col, 'attribute') else col[0]
+            for col in mapping or []]
+
+
+def query_model(query):
+    """Model class of the first entity selected by `query`."""
+    return query.column_descriptions[0]['type']
+
+
+def get_attribute(obj, attribute):
+    """`getattr` supporting dotted attributes, None if a link is missing."""
+    if '.' not in attribute:
+        return getattr(obj, attribute)
+    for name in attribute.split('.'):
+        if obj is None:
+            return None
+        obj = getattr(obj, name)
+    return obj
+
+
+def display_value(obj, attribute):
+    """Value of `attribute` of `obj`, formatted by its `get_<attr>_display`
+    method if `obj` has one."""
+    value = get_attribute(obj, attribute)
+    display = getattr(obj, 'get_%s_display' % attribute.replace('.', '_'),
+                      None)
+    if callable(display):
+        value = display(value)
+    return value
+
+
+def set_attribute(obj, attribute, value):
+    """
+    `setattr` raising ValueError for dotted attributes.
+
+    The value of a dotted attribute would be set on the related object,
+    bypassing the changes of a caching wrapper of `obj`, so the edit would
+    not be saved, journaled or undone.
+    """
+    if '.' in attribute:
+        raise ValueError('Cannot set %r, it is an attribute of a related '
+                         'object' % attribute)
+    setattr(obj, attribute, value)
+
+
+def eager_options(model, attributes, collections=True):
+    """
+    Loader options for the relationships traversed by `attributes`.
+
+    Both `country` and `country.name` load the `country` relationship of
+    `model` together with the model itself. Many-to-one relationships are
+    joined, collections are loaded in a separate query, or lazily when
+    `collections` is False, e.g. for a query streamed with `yield_per`.
+    """
+    options = []
+    seen = set()
+    for attribute in attributes:
+        cls, loader, path = model, None, ()
+        for name in attribute.split('.'):
+            relationships = sa.inspect(cls).relationships
+            if name not in relationships.keys():
+                break
+            relationship = relationships[name]
+            if relationship.uselist and not collections:
+                strategy = orm.lazyload
+            elif relationship.uselist:
+                # SQLAlchemy < 1.2 has no selectinload
+                strategy = getattr(orm, 'selectinload', orm.subqueryload)
+            else:
+                strategy = orm.joinedload
+            if loader is None:
+                loader = strategy(getattr(cls, name))
+            else:
+                loader = getattr(loader, strategy.__name__)(getattr(cls, name))
+            path += (name,)
+            cls = relationship.mapper.class_
+            if strategy is orm.lazyload:
+                break
+        if path and path not in seen:
+            seen.add(path)
+            options.append(loader)
+    return options
+
+
+def projected_columns(query, attributes):
+    """
+    Columns selecting `attributes` of the model of `query`.
+
+    Returns the query, outer joined with the relationships traversed by
+    dotted attributes, and the columns to pass to `with_entities`.
+    """
+    model = query_model(query)
+    joins = {}
+    columns = []
+    for attribute in attributes:
+        path = attribute.split('.')
+        entity = model
+        for depth, name in enumerate(path[:-1]):
+            key = tuple(path[:depth+1])
+            if key not in joins:
+                relationship = getattr(entity, name)
+                joins[key] = orm.aliased(relationship.property.mapper.class_)
+                query = query.outerjoin(joins[key], relationship)
+            entity = joins[key]
+        columns.append(getattr(entity, path[-1]))
+    return query, columns
+
+
+def membership_columns(model):
+    """
+    Aggregates over rows of `model` which change when rows enter or leave
+    a result: the number of rows and, for an integer primary key, the
+    maximum and sum of the keys.
+    """
+    primary_key = sa.inspect(model).primary_key
+    columns = [sa.func.count(primary_key[0])]
+    if len(primary_key) == 1 and isinstance(primary_key[0].type, sa.Integer):
+        columns += [sa.func.max(primary_key[0]), sa.func.sum(primary_key[0])]
+    return columns
+
+
+AGGREGATES = ('sum', 'count', 'avg', 'min', 'max')
+
+
+def aggregate_query(query, aggregates):
+    """
+    Query selecting `aggregates`, (attribute, function) pairs with a function
+    from `AGGREGATES`, over all rows of `query` as a single row.
+
+    Averages are selected as their sum and count, so they can be updated
+    incrementally; all other functions select a single column.
+    """
+    query, columns = projected_columns(
+        query.order_by(None), [attribute for attribute, _ in aggregates])
+    selected = []
+    for column, (_, function) in zip(columns, aggregates):
+        if function == 'avg':
+            selected.extend([sa.func.sum(column), sa.func.count(column)])
+        elif function in AGGREGATES:
+            selected.append(getattr(sa.func, function)(column))
+        else:
+            raise ValueError('Unknown aggregate %r' % function)
+    return query.with_entities(*selected)
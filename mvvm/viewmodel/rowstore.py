@@ -0,0 +1,444 @@
+"""
+Compact storage of table rows, without an object per row.
+"""
+from __future__ import division
+from array import array
+from decimal import Decimal, ROUND_FLOOR
+import operator
+import types
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class RowStore(object):
+    """
+    Rows of a (partially fetched) result, stored column-wise.
+
+    Rows are addressed by their index in the result and map to a slot in the
+    columns. Columns holding only ints or only floats are `array`s, which
+    take a machine word per value instead of an object; a column falls back
+    to a list as soon as it receives another value, e.g. None.
+    """
+    TYPECODES = {int: 'l', float: 'd'}
+    TYPES = {'l': int, 'd': float}
+
+    def __init__(self, num_cols):
+        self.columns = [[] for _ in range(num_cols)]
+        self.slots = {}
+
+    def __contains__(self, row_idx):
+        return row_idx in self.slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _column(self, col_idx, value):
+        """Column `col_idx`, as a list if it cannot hold `value`."""
+        column = self.columns[col_idx]
+        if isinstance(column, list):
+            if not column and type(value) in self.TYPECODES:
+                column = self.columns[col_idx] = \
+                    array(self.TYPECODES[type(value)])
+        elif type(value) is not self.TYPES[column.typecode]:
+            column = self.columns[col_idx] = column.tolist()
+        return column
+
+    def _store(self, col_idx, slot, value):
+        column = self._column(col_idx, value)
+        try:
+            if slot == len(column):
+                column.append(value)
+            else:
+                column[slot] = value
+        except OverflowError:
+            column = self.columns[col_idx] = column.tolist()
+            self._store(col_idx, slot, value)
+
+    def add(self, row_idx, values):
+        slot = self.slots.get(row_idx)
+        if slot is None:
+            slot = self.slots[row_idx] = \
+                len(self.columns[0]) if self.columns else 0
+        for col_idx, value in enumerate(values):
+            self._store(col_idx, slot, value)
+
+    def get(self, row_idx, col_idx):
+        return self.columns[col_idx][self.slots[row_idx]]
+
+    def set(self, row_idx, col_idx, value):
+        self._store(col_idx, self.slots[row_idx], value)
+
+    def row(self, row_idx):
+        slot = self.slots[row_idx]
+        return tuple(column[slot] for column in self.columns)
+
+    def find(self, values):
+        """Index of the row starting with `values`, or None."""
+        count = len(values)
+        for row_idx, slot in self.slots.items():
+            if all(self.columns[col_idx][slot] == values[col_idx]
+                   for col_idx in range(count)):
+                return row_idx
+        return None
+
+    def remap(self, remap):
+        """
+        Move the rows to index `remap(row_idx)`, dropping those for which it
+        returns None. The columns are compacted, so the values of dropped
+        rows are freed.
+        """
+        kept = sorted((slot, new_idx) for new_idx, slot in
+                      ((remap(row_idx), slot)
+                       for row_idx, slot in self.slots.items())
+                      if new_idx is not None)
+        columns = []
+        for column in self.columns:
+            values = [column[slot] for slot, _ in kept]
+            columns.append(values if isinstance(column, list)
+                           else array(column.typecode, values))
+        self.columns = columns
+        self.slots = dict((new_idx, slot)
+                          for slot, (_, new_idx) in enumerate(kept))
+
+    def clear(self):
+        self.columns = [[] for _ in self.columns]
+        self.slots.clear()
+
+
+class RowView(object):
+    """
+    Read-only view on a row of a `RowStore`, giving attribute access to the
+    columns by name. Used as `self` when calling display methods of a model
+    for rows which have not been loaded as model instances.
+
+    Other names are looked up on `model`: its methods and properties are
+    bound to the view and class attributes are returned as is, so display
+    methods can use constants and helpers of the model. Attributes of the
+    instances which were not stored, e.g. unmapped columns, raise an
+    AttributeError.
+    """
+    __slots__ = ('_store', '_row_idx', '_names', '_model')
+
+    def __init__(self, store, row_idx, names, model=None):
+        self._store = store
+        self._row_idx = row_idx
+        self._names = names
+        self._model = model
+
+    def __getattr__(self, name):
+        try:
+            col_idx = self._names[name]
+        except KeyError:
+            return self._model_attribute(name)
+        return self._store.get(self._row_idx, col_idx)
+
+    def _model_attribute(self, name):
+        for cls in getattr(self._model, '__mro__', ()):
+            if name not in vars(cls):
+                continue
+            value = vars(cls)[name]
+            if isinstance(value, (types.FunctionType, property)):
+                return value.__get__(self, self._model)
+            if isinstance(value, (classmethod, staticmethod)) or \
+                    not hasattr(value, '__get__'):
+                return getattr(self._model, name)
+            break
+        raise AttributeError(name)
+
+
+class ColumnStore(object):
+    """
+    Values of `attributes` of a list of objects, with a column per attribute.
+
+    Columns holding only ints or only floats are NumPy arrays, or `array`s
+    when NumPy is not available; NumPy is optional, it is not a requirement
+    of this package. Ints which do not fit a 64 bit NumPy array, or a C long
+    `array` (32 bits on Windows), are kept in a list. Columns of Decimals
+    which all have the same exponent, as selected from a NUMERIC column, are
+    stored the same way as integers scaled by that exponent. Other columns
+    are lists. Sorting and filtering do not reorder the store but return row
+    indexes, which can be fed into the next operation. Objects can be added
+    and removed without re-reading the values of the others.
+    """
+    OPERATORS = {
+        '==': operator.eq,
+        '!=': operator.ne,
+        '<': operator.lt,
+        '<=': operator.le,
+        '>': operator.gt,
+        '>=': operator.ge,
+    }
+
+    def __init__(self, objects, attributes, getter=getattr):
+        self.objects = []
+        self.attributes = list(attributes)
+        self.getter = getter
+        self.rows = {}
+        self.columns = [[] for _ in self.attributes]
+        # Exponent of the Decimals of scaled columns, None for other columns
+        self.exponents = [None for _ in self.attributes]
+        self.append(objects)
+
+    @staticmethod
+    def _column(values):
+        types = set(type(value) for value in values)
+        try:
+            if types == set([int]):
+                return numpy.array(values, dtype=numpy.int64) if numpy \
+                    else array('l', values)
+            if types == set([float]):
+                return numpy.array(values, dtype=numpy.float64) if numpy \
+                    else array('d', values)
+        except OverflowError:
+            pass
+        return values
+
+    @staticmethod
+    def _exponent(values):
+        """Common exponent of Decimal `values`, None if there is none."""
+        if not values or set(type(value) for value in values) != \
+                set([Decimal]):
+            return None
+        exponents = set(value.as_tuple()[2] for value in values)
+        if len(exponents) != 1:
+            return None
+        exponent = exponents.pop()
+        # NaN and infinity have a string as exponent
+        return exponent if isinstance(exponent, int) else None
+
+    @staticmethod
+    def _scale(value, exponent):
+        """`value` as integer scaled by `exponent`, None if it does not
+        have that exponent."""
+        if type(value) is not Decimal:
+            return None
+        sign, digits, value_exponent = value.as_tuple()
+        if value_exponent != exponent:
+            return None
+        scaled = int(''.join(str(digit) for digit in digits))
+        return -scaled if sign else scaled
+
+    @staticmethod
+    def _unscale(scaled, exponent):
+        return Decimal((int(scaled < 0), tuple(int(digit) for digit in
+                                               str(abs(int(scaled)))),
+                        exponent))
+
+    def _typed(self, values):
+        """(column, exponent) storing `values`."""
+        exponent = self._exponent(values)
+        if exponent is not None:
+            column = self._column([self._scale(value, exponent)
+                                   for value in values])
+            if not isinstance(column, list):
+                return column, exponent
+        return self._column(values), None
+
+    def _list(self, col_idx):
+        """Turn column `col_idx` into a list, e.g. for a value which does
+        not fit the typed column."""
+        column = self.columns[col_idx] = [self.get(idx, col_idx) for idx
+                                          in range(len(self.columns[col_idx]))]
+        self.exponents[col_idx] = None
+        return column
+
+    def __len__(self):
+        return len(self.objects)
+
+    def get(self, row_idx, col_idx):
+        value = self.columns[col_idx][row_idx]
+        # NumPy returns its own scalar types
+        value = value.item() if hasattr(value, 'item') else value
+        exponent = self.exponents[col_idx]
+        return value if exponent is None else self._unscale(value, exponent)
+
+    def set(self, row_idx, col_idx, value):
+        column = self.columns[col_idx]
+        if not isinstance(column, list):
+            exponent = self.exponents[col_idx]
+            stored = value if exponent is None \
+                else self._scale(value, exponent)
+            if exponent is not None and stored is not None or \
+                    exponent is None and type(value) in (int, float):
+                try:
+                    column[row_idx] = stored
+                    if column[row_idx] == stored:
+                        return
+                except (TypeError, ValueError, OverflowError):
+                    pass
+            # The value does not fit the typed column, fall back to a list.
+            column = self._list(col_idx)
+        column[row_idx] = value
+
+    def append(self, objects):
+        """Add `objects` after the stored objects."""
+        objects = [obj for obj in objects if id(obj) not in self.rows]
+        if not objects:
+            return
+        for row_idx, obj in enumerate(objects, len(self.objects)):
+            self.rows[id(obj)] = row_idx
+        for col_idx, attribute in enumerate(self.attributes):
+            values = [self.getter(obj, attribute) for obj in objects]
+            column = self.columns[col_idx]
+            if not self.objects:
+                self.columns[col_idx], self.exponents[col_idx] = \
+                    self._typed(values)
+                continue
+            if not isinstance(column, list):
+                typed, exponent = self._typed(values)
+                if not isinstance(typed, list) and \
+                        exponent == self.exponents[col_idx] and \
+                        _typecode(typed) == _typecode(column):
+                    self.columns[col_idx] = numpy.concatenate(
+                        (column, typed)) if numpy else column + typed
+                    continue
+                column = self._list(col_idx)
+            column.extend(values)
+        self.objects.extend(objects)
+
+    def remove(self, rows):
+        """Remove the rows at indexes `rows`; the rows after them move up."""
+        removed = set(rows)
+        keep = [row_idx for row_idx in range(len(self))
+                if row_idx not in removed]
+        self.objects = [self.objects[row_idx] for row_idx in keep]
+        self.rows = dict((id(obj), row_idx)
+                         for row_idx, obj in enumerate(self.objects))
+        for col_idx, column in enumerate(self.columns):
+            if numpy is not None and isinstance(column, numpy.ndarray):
+                column = column[numpy.asarray(keep, dtype=numpy.intp)]
+            elif isinstance(column, list):
+                column = [column[row_idx] for row_idx in keep]
+            else:
+                column = array(column.typecode,
+                               (column[row_idx] for row_idx in keep))
+            self.columns[col_idx] = column
+
+    def sync(self, objects):
+        """Remove the stored objects which are not in `objects` and append
+        the new ones, keeping the values of the others."""
+        ids = set(id(obj) for obj in objects)
+        removed = [row_idx for row_idx, obj in enumerate(self.objects)
+                   if id(obj) not in ids]
+        if removed:
+            self.remove(removed)
+        self.append(objects)
+
+    def update(self, obj):
+        """Re-read the values of `obj`, returns False if it is not stored."""
+        row_idx = self.rows.get(id(obj))
+        if row_idx is None:
+            return False
+        for col_idx, attribute in enumerate(self.attributes):
+            self.set(row_idx, col_idx, self.getter(obj, attribute))
+        return True
+
+    def _values(self, col_idx, rows):
+        """Stored values of column `col_idx`, scaled for Decimals."""
+        column = self.columns[col_idx]
+        if rows is None:
+            return column
+        if numpy is not None and isinstance(column, numpy.ndarray):
+            return column[numpy.asarray(rows, dtype=numpy.intp)]
+        return [column[row_idx] for row_idx in rows]
+
+    def sort(self, col_idx, reverse=False, rows=None):
+        """Row indexes ordered by column `col_idx`, None values first."""
+        if rows is None:
+            rows = range(len(self))
+        rows = list(rows)
+        values = self._values(col_idx, rows)
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            order = numpy.argsort(values, kind='mergesort').tolist()
+        else:
+            order = sorted(range(len(rows)), key=lambda idx: (
+                values[idx] is not None, values[idx]))
+        if reverse:
+            order.reverse()
+        return [rows[idx] for idx in order]
+
+    def where(self, col_idx, op, value, rows=None):
+        """
+        Row indexes for which `<column value> <op> value` holds.
+
+        `op` is one of `OPERATORS`, 'contains' for a case-insensitive
+            substring match or a callable taking the column value.
+        """
+        values = self._values(col_idx, rows)
+        if rows is None:
+            rows = range(len(self))
+        exponent = self.exponents[col_idx]
+        if exponent is not None:
+            if op in self.OPERATORS and value is not None:
+                op, value = self._scaled_operand(op, value, exponent)
+            else:
+                values = [self._unscale(v, exponent) for v in values]
+        if op in self.OPERATORS and numpy is not None and \
+                isinstance(values, numpy.ndarray):
+            mask = self.OPERATORS[op](values, value)
+            return numpy.asarray(rows)[mask].tolist()
+        if op == 'contains':
+            value = value.lower()
+            test = lambda v: v is not None and value in unicode(v).lower()
+        elif callable(op):
+            test = op
+        else:
+            compare = self.OPERATORS[op]
+            test = lambda v: v is not None and compare(v, value)
+        return [row_idx for row_idx, v in zip(rows, values) if test(v)]
+
+    @staticmethod
+    def _scaled_operand(op, value, exponent):
+        """(op, value) comparing integers scaled by `exponent` like `op`
+        compares their Decimals with `value`."""
+        scaled = Decimal(value).scaleb(-exponent)
+        integral = scaled.to_integral_value(rounding=ROUND_FLOOR)
+        if scaled == integral:
+            return op, int(integral)
+        # No stored value equals `value`; compare with the integers around
+        # it instead.
+        if op in ('<', '<='):
+            return '<=', int(integral)
+        if op in ('>', '>='):
+            return '>', int(integral)
+        return ('<', '>=')[op == '!='], -2**63
+
+    def aggregate(self, col_idx, func, rows=None):
+        """`func` ('sum', 'min', 'max', 'mean' or 'count') of the column,
+        ignoring None values."""
+        values = self._values(col_idx, rows)
+        exponent = self.exponents[col_idx]
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            if func == 'count':
+                return len(values)
+            if not len(values):
+                return None
+            if exponent is None:
+                return getattr(values, func)().item()
+            count = len(values)
+            values = [getattr(values, 'sum' if func == 'mean' else func)()
+                      .item()]
+        else:
+            values = [value for value in values if value is not None]
+            if func == 'count':
+                return len(values)
+            if not values:
+                return None
+            count = len(values)
+            if exponent is None:
+                if func == 'mean':
+                    return sum(values) / count
+                return {'sum': sum, 'min': min, 'max': max}[func](values)
+            values = [{'sum': sum, 'mean': sum, 'min': min,
+                       'max': max}[func](values)]
+        value = self._unscale(values[0], exponent)
+        return value / count if func == 'mean' else value
+
+
+def _typecode(column):
+    """Type of the values of a typed column."""
+    dtype = getattr(column, 'dtype', None)
+    return column.typecode if dtype is None else dtype.str
@@ -0,0 +1,393 @@
+"""
+On-disk snapshots of the rows of a query, for reference data which rarely
+changes.
+
+A snapshot is a columnar file, which is memory-mapped and decoded a value at
+a time, so opening a list of any size only reads the header:
+
+    >>> snapshots = SnapshotCache(os.path.join(appdir, 'snapshots'))
+    >>> class CountryList(QueryList):
+    ...     projection = True
+    ...     snapshots = snapshots
+
+Snapshots are keyed by a fingerprint of the SQL of the query and by the
+`schema_version` of the cache; raise it when the schema changes. Every
+snapshot records a change marker, the number of rows and the maximum primary
+key, which is checked against the database on a background thread.
+
+Columns are stored with a fixed width per value, except text. Integers,
+booleans, floats, text, dates, naive datetimes and times, and Decimals of a
+single scale can be stored; queries selecting other values are not
+snapshotted.
+"""
+import datetime
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from decimal import Decimal
+
+from mvvm.lazy import lazy_import
+from mvvm.viewmodel.query import query_model
+
+sa = lazy_import('sqlalchemy')
+wx = lazy_import('wx')
+pub = lazy_import('wx.lib.pubsub.pub')
+
+try:
+    text_type, integer_types = unicode, (int, long)
+except NameError:  # Python 3
+    text_type, integer_types = str, (int,)
+
+MAGIC = b'MVVMSNAP'
+FORMAT = 2
+_header_size = struct.Struct('<I')
+_int64 = struct.Struct('<q')
+_float64 = struct.Struct('<d')
+_span = struct.Struct('<qq')
+
+_epoch = datetime.datetime(1, 1, 1)
+_midnight = datetime.datetime.combine(datetime.date(1, 1, 1),
+                                      datetime.time())
+
+
+def _microseconds(delta):
+    return (delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds
+
+
+def _fits(values):
+    return all(-2**63 <= value < 2**63 for value in values)
+
+
+def _exponent(values):
+    """Common exponent of finite Decimal `values`, None if there is none."""
+    exponents = set(value.as_tuple()[2] for value in values)
+    if len(exponents) != 1:
+        return None
+    exponent = exponents.pop()
+    # NaN and infinity have a string as exponent
+    return exponent if isinstance(exponent, int) else None
+
+
+def _scale(value):
+    """Digits of Decimal `value` as a signed integer."""
+    sign, digits, _ = value.as_tuple()
+    scaled = int(''.join(str(digit) for digit in digits))
+    return -scaled if sign else scaled
+
+
+def _unscale(scaled, exponent):
+    return Decimal((int(scaled < 0),
+                    tuple(int(digit) for digit in str(abs(scaled))),
+                    exponent))
+
+
+def _kind(values):
+    """(storage kind, exponent) of a column holding `values`, the exponent
+    of a Decimal column only. Raises ValueError when the values cannot be
+    stored."""
+    present = [value for value in values if value is not None]
+    types = set(type(value) for value in present)
+    if not types:
+        return 'i', None
+    if types == set([bool]):
+        return 'b', None
+    if all(issubclass(cls, integer_types) and cls is not bool
+           for cls in types):
+        if _fits(present):
+            return 'i', None
+    elif types == set([float]):
+        return 'f', None
+    elif types == set([text_type]):
+        return 's', None
+    elif types == set([datetime.date]):
+        return 'd', None
+    elif types == set([datetime.datetime]):
+        if all(value.tzinfo is None for value in present):
+            return 't', None
+    elif types == set([datetime.time]):
+        if all(value.tzinfo is None for value in present):
+            return 'h', None
+    elif types == set([Decimal]):
+        exponent = _exponent(present)
+        if exponent is not None and \
+                _fits([_scale(value) for value in present]):
+            return 'n', exponent
+    raise ValueError('Cannot store %s values in a snapshot' %
+                     ', '.join(sorted(cls.__name__ for cls in types)))
+
+
+def _integers(kind, values):
+    """Values of a column of fixed width `kind` as integers, 0 for None."""
+    if kind == 'd':
+        return [value.toordinal() if value is not None else 0
+                for value in values]
+    if kind == 't':
+        return [_microseconds(value - _epoch) if value is not None else 0
+                for value in values]
+    if kind == 'h':
+        return [_microseconds(datetime.datetime.combine(_epoch, value) -
+                              _midnight) if value is not None else 0
+                for value in values]
+    if kind == 'n':
+        return [_scale(value) if value is not None else 0
+                for value in values]
+    return [value or 0 for value in values]
+
+
+def _decode(kind, integer, exponent):
+    """Value of fixed width `kind` stored as `integer`."""
+    if kind == 'i':
+        return integer
+    if kind == 'b':
+        return bool(integer)
+    if kind == 'd':
+        return datetime.date.fromordinal(integer)
+    if kind == 't':
+        return _epoch + datetime.timedelta(microseconds=integer)
+    if kind == 'h':
+        return (_midnight + datetime.timedelta(microseconds=integer)).time()
+    return _unscale(integer, exponent)
+
+
+def _encode(values):
+    """(kind, exponent, bytes) of a column."""
+    kind, exponent = _kind(values)
+    nulls = bytearray(value is None for value in values)
+    if kind in 'ibdthn':
+        data = b''.join(_int64.pack(value)
+                        for value in _integers(kind, values))
+    elif kind == 'f':
+        data = b''.join(_float64.pack(value or 0.0) for value in values)
+    elif kind == 's':
+        encoded = [(value or u'').encode('utf-8') for value in values]
+        spans, start = [], 0
+        for text in encoded:
+            spans.append(_span.pack(start, start + len(text)))
+            start += len(text)
+        data = b''.join(spans) + b''.join(encoded)
+    return kind, exponent, bytes(nulls) + data
+
+
+def _json_value(value):
+    if value is None or isinstance(value, integer_types + (float, text_type)):
+        return value
+    return text_type(value)
+
+
+def normalize_marker(marker):
+    """`marker` as it is stored in a snapshot, so it can be compared."""
+    return [_json_value(value) for value in marker]
+
+
+def write_snapshot(path, rows, num_cols, fingerprint, schema_version,
+                   marker):
+    """
+    Write `rows`, tuples of `num_cols` values, to a snapshot at `path`.
+    Raises ValueError when a column holds values which cannot be stored.
+    """
+    columns = [[row[col_idx] for row in rows] for col_idx in range(num_cols)]
+    sections, offset = [], 0
+    header = {'format': FORMAT, 'fingerprint': fingerprint,
+              'schema_version': schema_version,
+              'marker': normalize_marker(marker), 'num_rows': len(rows),
+              'columns': []}
+    for values in columns:
+        kind, exponent, data = _encode(values)
+        header['columns'].append({'kind': kind, 'exponent': exponent,
+                                  'offset': offset, 'length': len(data)})
+        sections.append(data)
+        offset += len(data)
+    encoded = json.dumps(header).encode('utf-8')
+    directory = os.path.dirname(path) or '.'
+    # Written next to the snapshot and renamed, so readers never see a
+    # partial file.
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(_header_size.pack(len(encoded)))
+            f.write(encoded)
+            for data in sections:
+                f.write(data)
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        os.rename(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+
+class Snapshot(object):
+    """Rows of a snapshot file, decoded from a memory map when accessed."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self._map[:len(MAGIC)] != MAGIC:
+                raise ValueError('%s is not a snapshot' % path)
+            start = len(MAGIC) + _header_size.size
+            size, = _header_size.unpack_from(self._map, len(MAGIC))
+            header = json.loads(self._map[start:start+size].decode('utf-8'))
+        except Exception:
+            self.close()
+            raise
+        self.format = header['format']
+        self.fingerprint = header['fingerprint']
+        self.schema_version = header['schema_version']
+        self.marker = header['marker']
+        self.num_rows = header['num_rows']
+        self._columns = header['columns']
+        self._data = start + size
+
+    def __len__(self):
+        return self.num_rows
+
+    def get(self, row_idx, col_idx):
+        if not 0 <= row_idx < self.num_rows:
+            raise IndexError(row_idx)
+        column = self._columns[col_idx]
+        nulls = self._data + column['offset']
+        if self._map[nulls+row_idx:nulls+row_idx+1] == b'\x01':
+            return None
+        kind, data = column['kind'], nulls + self.num_rows
+        if kind == 'f':
+            return _float64.unpack_from(self._map, data + 8*row_idx)[0]
+        if kind == 's':
+            start, stop = _span.unpack_from(self._map, data + 16*row_idx)
+            text = data + 16*self.num_rows
+            return self._map[text+start:text+stop].decode('utf-8')
+        return _decode(kind,
+                       _int64.unpack_from(self._map, data + 8*row_idx)[0],
+                       column['exponent'])
+
+    def row(self, row_idx):
+        return tuple(self.get(row_idx, col_idx)
+                     for col_idx in range(len(self._columns)))
+
+    def rows(self, start, stop):
+        return [self.row(row_idx)
+                for row_idx in range(start, min(stop, self.num_rows))]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+def query_fingerprint(query):
+    """Fingerprint of the SQL and parameters of `query`."""
+    compiled = query.statement.compile()
+    text = u'%s\n%r' % (compiled, sorted(compiled.params.items()))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def marker_query(query):
+    """Query selecting the change marker of the rows of `query`: their
+    number and the maximum primary key."""
+    primary_key = sa.inspect(query_model(query)).primary_key[0]
+    return query.order_by(None).with_entities(sa.func.count(),
+                                              sa.func.max(primary_key))
+
+
+class SnapshotCache(object):
+    def __init__(self, directory, schema_version=1):
+        """
+        `directory` where the snapshots are stored, created when missing.
+
+        `schema_version` version of the database schema; snapshots of
+            other versions are ignored.
+        """
+        self.directory = directory
+        self.schema_version = schema_version
+        self._building = set()
+        self._lock = threading.Lock()
+
+    def path(self, fingerprint):
+        return os.path.join(self.directory, '%s.snapshot' % fingerprint)
+
+    def load(self, fingerprint):
+        """The snapshot with `fingerprint`, or None."""
+        try:
+            snapshot = Snapshot(self.path(fingerprint))
+        except (IOError, OSError, ValueError, KeyError, struct.error):
+            return None
+        if snapshot.format != FORMAT or \
+                snapshot.schema_version != self.schema_version or \
+                snapshot.fingerprint != fingerprint:
+            snapshot.close()
+            return None
+        return snapshot
+
+    def save(self, fingerprint, rows, num_cols, marker):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        write_snapshot(self.path(fingerprint), rows, num_cols, fingerprint,
+                       self.schema_version, marker)
+
+    def discard(self, fingerprint):
+        try:
+            os.remove(self.path(fingerprint))
+        except OSError:
+            pass
+
+    def _run(self, target, *args):
+        thread = threading.Thread(target=target, args=args,
+                                  name='SnapshotCache')
+        thread.daemon = True
+        thread.start()
+
+    def validate(self, snapshot, query, callback):
+        """
+        Check the marker of `snapshot` against `query` on a background
+        thread, then call `callback(snapshot, valid)` on the UI thread.
+        """
+        statement = marker_query(query).statement
+        bind = query.session.get_bind()
+        self._run(self._validate, snapshot, statement, bind, callback)
+
+    def _validate(self, snapshot, statement, bind, callback):
+        try:
+            with bind.connect() as connection:
+                marker = list(connection.execute(statement).first())
+        except Exception:
+            # Keep serving the snapshot; it is checked again when reopened.
+            return
+        valid = normalize_marker(marker) == snapshot.marker
+        wx.CallAfter(callback, snapshot, valid)
+
+    def build(self, query, num_cols, marker_source=None):
+        """
+        Snapshot the rows of `query`, which selects `num_cols` columns, on a
+        background thread. The marker is selected from `marker_source`, a
+        query of complete objects, defaulting to `query`.
+        """
+        fingerprint = query_fingerprint(query)
+        with self._lock:
+            if fingerprint in self._building:
+                return
+            self._building.add(fingerprint)
+        statement = query.statement
+        marker = marker_query(marker_source or query).statement
+        bind = query.session.get_bind()
+        self._run(self._build, fingerprint, statement, marker, bind,
+                  num_cols)
+
+    def _build(self, fingerprint, statement, marker, bind, num_cols):
+        try:
+            with bind.connect() as connection:
+                values = list(connection.execute(marker).first())
+                rows = [tuple(row) for row in connection.execute(statement)]
+            self.save(fingerprint, rows, num_cols, values)
+        except Exception as e:
+            # Without a snapshot the rows are simply queried.
+            wx.CallAfter(pub.sendMessage, 'error.snapshot', message=str(e),
+                         exc_info=sys.exc_info())
+        finally:
+            with self._lock:
+                self._building.discard(fingerprint)
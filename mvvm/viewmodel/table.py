@@ -1,12 +1,43 @@
+from __future__ import division
+from bisect import bisect_left
+from collections import OrderedDict
+import operator
+import timeit
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
 import traits.api as traits
 import wx
 from wx.grid import PyGridTableBase
-from mvvm.viewmodel.wrapper import wrap
+from mvvm.instrumentation import stats, timed
+from mvvm.lazy import lazy_import
+from mvvm.viewmodel.export import Export
+from mvvm.viewmodel.overlay import EditOverlay
+from mvvm.viewmodel.query import aggregate_query, display_value, \
+    eager_options, get_attribute, mapping_attributes, membership_columns, \
+    projected_columns, query_model, set_attribute
+from mvvm.viewmodel.rowstore import ColumnStore, RowStore, RowView
+from mvvm.viewmodel.snapshot import query_fingerprint
+from mvvm.viewmodel.tracing import tracer
+from mvvm.viewmodel.wrapper import ChangeJournal, wrap, unwrap
+
+sa = lazy_import('sqlalchemy')
+orm = lazy_import('sqlalchemy.orm')
+orm_exc = lazy_import('sqlalchemy.orm.exc')
 
 
 class TableHelperMixin(object):
+    # Set while many values change at once, e.g. by `paste`; the view is
+    # updated afterwards.
+    _batching = False
+
+    @timed
     def ResetView(self):
         """Trim/extend the control's rows and update all values"""
+        if self._batching:
+            return
         # @fixme self.grid should always be available for bound tables
         grid = getattr(self, 'grid', self.GetView())
         grid.BeginBatch()
@@ -28,8 +59,11 @@ class TableHelperMixin(object):
         self.UpdateValues()
         grid.EndBatch()
 
+    @timed
     def UpdateValues( self ):
         """Update all displayed values"""
+        if self._batching:
+            return
         msg = wx.grid.GridTableMessage(self, wx.grid.GRIDTABLE_REQUEST_VIEW_GET_VALUES)
         # @fixme self.grid should always be available for bound tables
         grid = getattr(self, 'grid', self.GetView())
@@ -37,51 +71,178 @@ class TableHelperMixin(object):
 
 
 class ListTable(PyGridTableBase, TableHelperMixin):
-    def __init__(self, trait, mapping=None, commit_on='grid'):
+    """
+    Table showing the objects of a list trait.
+
+    `view` optional `FilteredSortedView`, filtering and sorting the objects
+        client-side. It is kept up to date with the list by the table.
+
+    `listen` 'all' to listen to changes of every object in the list, or
+        'viewport' to only listen to the objects requested by the grid,
+        i.e. the visible rows, up to `max_listened` objects. An object
+        which was not listened to is checked against the view when it is
+        requested again, as it may have changed unnoticed. Objects hidden
+        by the filter of the view are never requested, so they are checked
+        whenever objects are added to or removed from the list, which
+        evaluates the filter of the view for every hidden object.
+    """
+    max_listened = 1000
+
+    def __init__(self, trait, mapping=None, commit_on='grid', view=None,
+                 listen='all'):
         super(ListTable, self).__init__()
         self._trait = trait
         self.mapping = mapping
         self.commit_on = commit_on
+        self.view = view
+        self.listen = listen
         self.creator = getattr(self._trait[0], '%s_create' % self._trait[1], None)
         self.saver = getattr(self._trait[0], '%s_save' % self._trait[1], None)
         self.deleter = getattr(self._trait[0], '%s_delete' % self._trait[1], None)
         self._setup()
 
     def _setup(self):
-        self._trait[0].on_trait_change(self._trait_listener,
-                                       '{0}.+'.format(self._trait[1]),
-                                       dispatch='ui')
+        if self.listen == 'all':
+            self._trait[0].on_trait_change(self._trait_listener,
+                                           '{0}.+'.format(self._trait[1]),
+                                           dispatch='ui')
+            self._listened = None
+        else:
+            self._listened = OrderedDict()
         self._trait[0].on_trait_change(self._items_listener,
                                        '{0}, {0}_items'.format(self._trait[1]),
                                        dispatch='ui')
         self._deleted = []
         self._created = []
         self._modified = []
+        if self.view is not None:
+            self.view.reset(getattr(*self._trait))
         self._reindex()
 
     def _reindex(self):
         self._objects = getattr(*self._trait)
-        self._index = [obj for obj in self._objects
+        source = self._objects if self.view is None else self.view.rows
+        self._index = [obj for obj in source
                        if obj not in self._deleted] + self._created
-        for row in self._deleted:
-            if row not in self._objects:
-                self._deleted.remove(row)
-        for row in self._modified:
-            if row not in self._objects:
-                self._modified.remove(row)
+        self._deleted = [row for row in self._deleted
+                         if row in self._objects]
+        self._modified = [row for row in self._modified
+                          if row in self._objects]
 
     def _trait_listener(self, tl_instance, tl_trait, tl_value):
+        if self._batching:
+            return
         if tl_instance == self._trait[0]:
             return self._items_listener()
+        if self.view is not None and self.view.changed(tl_instance):
+            return self.reindex()
         self.UpdateValues()
 
-    def _items_listener(self):
+    def _items_listener(self, tl_instance=None, tl_name=None, tl_value=None):
+        if self._listened:
+            if tl_name == '%s_items' % self._trait[1]:
+                self._unwatch(tl_value.removed)
+            else:
+                self._unwatch(list(self._listened.values()))
+        if self._batching:
+            return
+        if self.view is not None:
+            if tl_name == '%s_items' % self._trait[1]:
+                self.view.removed(tl_value.removed)
+                self.view.added(tl_value.added)
+                if self._listened is not None:
+                    self._revalidate(tl_value.added)
+            else:
+                self.view.reset(getattr(*self._trait))
+        self.reindex()
+
+    def reindex(self):
+        """Rebuild the rows, e.g. after changing the filter of the view."""
         self._reindex()
         self.ResetView()
 
+    def _watch(self, row):
+        """Listen to `row` as it is requested, when listening to the
+        viewport only."""
+        listened = self._listened
+        if listened is None or id(row) in listened:
+            return
+        listened[id(row)] = row
+        row.on_trait_change(self._trait_listener, dispatch='ui')
+        if len(listened) > self.max_listened:
+            _, oldest = listened.popitem(last=False)
+            oldest.on_trait_change(self._trait_listener, remove=True)
+        self._validate(row)
+
+    def _unwatch(self, rows):
+        for row in rows:
+            if self._listened.pop(id(row), None) is not None:
+                row.on_trait_change(self._trait_listener, remove=True)
+
+    def _changed(self, row):
+        """Re-evaluate `row`, which may have changed while it was not
+        listened to; returns whether the rows changed."""
+        return self.view is not None and self.view.changed(row)
+
+    def _validate(self, row):
+        """`row` may have changed while it was not listened to."""
+        if self._changed(row):
+            # Rows are requested while the grid is drawn.
+            wx.CallAfter(self.reindex)
+
+    def _revalidate(self, added):
+        """Re-evaluate the objects hidden by the view, other than the just
+        `added` ones, before reindexing. Shown objects are validated when
+        they are requested."""
+        skipped = set(id(row) for row in added)
+        skipped.update(self._listened)
+        for row in getattr(*self._trait):
+            if id(row) not in skipped and row not in self.view:
+                self._changed(row)
+
     def GetNumberRows(self):
         return len(self._index)
 
+    def prefetch(self, start, stop):
+        """Hint that rows `start` up to `stop` are about to be displayed.
+
+        All rows of a ListTable are in memory, so there is nothing to fetch.
+        """
+
+    def export(self, path, progress=None, done=None, chunk_size=1000):
+        """
+        Export the rows to CSV or XLSX file `path`, see `Export`.
+
+        The values are read on the UI thread, as reading them may load
+        attributes through the session of the UI thread, `chunk_size` rows
+        at a time in between other events. The file is written on a worker
+        thread.
+        """
+        rows = list(self._index)
+        attributes = mapping_attributes(self.mapping)
+        chunks = queue.Queue()
+
+        def read(start):
+            if export.cancelled or export.error is not None:
+                return chunks.put(None)
+            chunks.put([[display_value(row, attribute)
+                         for attribute in attributes]
+                        for row in rows[start:start+chunk_size]])
+            if start + chunk_size < len(rows):
+                wx.CallAfter(read, start + chunk_size)
+            else:
+                chunks.put(None)
+
+        def values():
+            for chunk in iter(chunks.get, None):
+                for row in chunk:
+                    yield row
+        export = Export(values, self.mapping, path, total=len(rows),
+                        progress=progress, done=done, chunk_size=chunk_size,
+                        formatted=True)
+        read(0)
+        return export.start()
+
     def GetRowLabelValue(self, row_idx):
         return ''
 
@@ -91,6 +252,7 @@ class ListTable(PyGridTableBase, TableHelperMixin):
     def GetColLabelValue(self, col_idx):
         return self.mapping[col_idx].label
 
+    @timed
     def GetValue(self, row_idx, col_idx):
         """
         Value to be shown in the associated grid.
@@ -98,12 +260,16 @@ class ListTable(PyGridTableBase, TableHelperMixin):
         Should not be used to populate the editor, use `GetValueAsObject`
         instead.
         """
+        if tracer.enabled:
+            # Lazy loads triggered by displaying a row are likely N+1 queries
+            with tracer.scope(self._trait[0], '%s_table.GetValue' %
+                              self._trait[1], per_row=True):
+                return self._get_value(row_idx, col_idx)
+        return self._get_value(row_idx, col_idx)
+
+    def _get_value(self, row_idx, col_idx):
         attribute = self.mapping[col_idx].attribute
-        row = self.GetRow(row_idx)
-        value = getattr(row, attribute)
-        disp_attr = 'get_%s_display' % attribute
-        if hasattr(row, disp_attr) and callable(getattr(row, disp_attr)):
-            value = getattr(row, disp_attr)(value)
+        value = display_value(self.GetRow(row_idx), attribute)
         if value is None:
             return u''
         return unicode(value)
@@ -114,13 +280,16 @@ class ListTable(PyGridTableBase, TableHelperMixin):
         """
         attribute = self.mapping[col_idx].attribute
         row = self.GetRow(row_idx)
-        return getattr(row, attribute)
+        return get_attribute(row, attribute)
 
     def GetTypeName(self, row_idx, col_idx):
         return self.mapping[col_idx].type_name or wx.grid.GRID_VALUE_STRING
 
+    @timed
     def GetRow(self, row_idx):
-        return self._index[row_idx]
+        row = self._index[row_idx]
+        self._watch(row)
+        return row
 
     def GetRowIndex(self, object):
         return self._index.index(object)
@@ -131,7 +300,7 @@ class ListTable(PyGridTableBase, TableHelperMixin):
     def SetValueAsObject(self, row_idx, col_idx, value):
         attribute = self.mapping[col_idx].attribute
         row = self.GetRow(row_idx)
-        setattr(row, attribute, value)
+        set_attribute(row, attribute, value)
 
     def SaveCell(self, row_idx, col_idx):
         return self.SaveRow(row_idx)
@@ -140,7 +309,8 @@ class ListTable(PyGridTableBase, TableHelperMixin):
         row = self.GetRow(row_idx)
         if not row.has_changes: return True
         if self.commit_on == 'grid':
-            if row not in self._modified:
+            # Created rows are saved by `SaveGrid` from `_created`.
+            if row not in self._modified and row not in self._created:
                 self._modified.append(row)
         else:
             if self.saver([row]):
@@ -154,8 +324,16 @@ class ListTable(PyGridTableBase, TableHelperMixin):
 
     def SaveGrid(self):
         # @todo save / delete in transaction
-        self.saver(self._modified)
+        created = [row for row in self._created if row.has_changes]
+        saved = self.saver(self._modified + created)
+        if saved:
+            self._modified = []
+            saved_ids = set(id(row) for row in created)
+            self._created = [row for row in self._created
+                             if id(row) not in saved_ids]
+            getattr(*self._trait).extend(created)
         self._delete_rows(self._deleted)
+        return saved
 
     def DeleteRows(self, rows):
         if self.commit_on == 'grid':
@@ -173,71 +351,1118 @@ class ListTable(PyGridTableBase, TableHelperMixin):
                 if obj in self._created:
                     self._created.remove(obj)
                 if obj in self._modified:
-                    self._created.remove(obj)
+                    self._modified.remove(obj)
 
     def DeleteCol(self, col_idx):
         raise NotImplementedError()
 
+    def _create(self):
+        """A new row from the creator, or None."""
+        return self.creator()
+
     def CreateRow(self):
-        row = self.creator()
+        row = self._create()
         if row:
             self._created.append(row)
             self._reindex()
             self.ResetView()
             return self._index.index(row)
 
+    def paste(self, row_idx, col_idx, rows):
+        """
+        Set `rows`, lists of values for the columns from `col_idx` onwards,
+        on the rows from `row_idx` onwards. Rows are created when pasting
+        past the last row. Values of read-only, dotted attributes are skipped.
+
+        Notifications are held back until all values are set; then the rows
+        are reindexed and the view is reset once. Unless changes are
+        committed by `SaveGrid`, the rows are saved in a single batch.
+        Returns whether saving succeeded.
+        """
+        attributes = [col.attribute for col in self.mapping[col_idx:]]
+        num_rows = self.GetNumberRows()
+        objects, created = [], []
+        self._batching = True
+        try:
+            for offset, values in enumerate(rows):
+                if row_idx + offset < num_rows:
+                    row = self.GetRow(row_idx + offset)
+                else:
+                    row = self._create()
+                    if not row:
+                        break
+                    created.append(row)
+                for attribute, value in zip(attributes, values):
+                    if '.' not in attribute:
+                        set_attribute(row, attribute, value)
+                objects.append(row)
+            self._add_created(created)
+            saved = self._save_pasted(objects)
+        finally:
+            self._batching = False
+        self._pasted()
+        return saved
+
+    def _add_created(self, rows):
+        self._created.extend(rows)
+
+    def _save_pasted(self, rows):
+        # Membership by identity, as thousands of rows may be pasted.
+        changed = [row for row in rows if row.has_changes]
+        if self.commit_on == 'grid':
+            # Created rows are saved by `SaveGrid` from `_created`.
+            known = set(id(row) for row in self._modified)
+            known.update(id(row) for row in self._created)
+            for row in changed:
+                if id(row) not in known:
+                    known.add(id(row))
+                    self._modified.append(row)
+            return True
+        if not changed:
+            return True
+        if not self.saver(changed):
+            return False
+        created = set(id(row) for row in self._created)
+        saved = [row for row in changed if id(row) in created]
+        saved_ids = set(id(row) for row in saved)
+        self._created = [row for row in self._created
+                         if id(row) not in saved_ids]
+        getattr(*self._trait).extend(saved)
+        return True
+
+    def _pasted(self):
+        if self.view is not None:
+            self.view.reset(getattr(*self._trait))
+        self.reindex()
+
+
+class ColumnarListTable(ListTable):
+    """
+    ListTable reading the displayed values from a `ColumnStore`.
+
+    The rows can be sorted, filtered and aggregated on the columns without
+    accessing the objects. Sorting and filtering only change the order of the
+    rows in the table, and are not re-applied when a row is edited; created
+    rows are always shown at the end. Edits are written to the objects and
+    the store. Objects added to or removed from the list are added to or
+    removed from the store, the values of the other objects are kept.
+    """
+    def _setup(self):
+        self._sort = None
+        self._filters = []
+        self._store = None
+        super(ColumnarListTable, self)._setup()
+
+    def _reindex(self):
+        super(ColumnarListTable, self)._reindex()
+        if self._store is not None and self._store_mapping is self.mapping:
+            self._store.sync(self._index)
+            self._apply()
+
+    def _columns(self):
+        """The store of the current rows and mapping, built when needed."""
+        if self._store is None or self._store_mapping is not self.mapping:
+            self._store_mapping = self.mapping
+            self._store = ColumnStore(self._index,
+                                      mapping_attributes(self.mapping),
+                                      get_attribute)
+            self._apply()
+        return self._store
+
+    def _apply(self):
+        # Rows of the store in the order of the list; objects added later are
+        # at the end of the store, but not necessarily of the list.
+        store_rows = self._store.rows
+        rows = [store_rows[id(obj)] for obj in self._index]
+        if rows == list(range(len(rows))):
+            rows = None
+        for col_idx, op, value in self._filters:
+            rows = self._store.where(col_idx, op, value, rows)
+        if self._sort is not None:
+            rows = self._store.sort(self._sort[0], self._sort[1], rows)
+        if self._created and (self._filters or self._sort is not None):
+            created = [store_rows[id(obj)] for obj in self._created]
+            shown = set(created)
+            rows = [idx for idx in rows if idx not in shown] + created
+        # None maps table rows directly to the store's rows
+        self._rows = rows
+
+    def _store_index(self, row_idx):
+        self._columns()
+        return row_idx if self._rows is None else self._rows[row_idx]
+
+    def _trait_listener(self, tl_instance, tl_trait, tl_value):
+        if tl_instance != self._trait[0] and self._store is not None:
+            self._store.update(tl_instance)
+        return super(ColumnarListTable, self)._trait_listener(
+            tl_instance, tl_trait, tl_value)
+
+    def _changed(self, row):
+        if self._store is not None:
+            self._store.update(row)
+        return super(ColumnarListTable, self)._changed(row)
+
+    def sort(self, col_idx, reverse=False):
+        """Order the rows by column `col_idx`, None for the list's order."""
+        self._sort = None if col_idx is None else (col_idx, reverse)
+        self._columns()
+        self._apply()
+        self.ResetView()
+
+    def filter(self, col_idx, op, value):
+        """Only show rows matching `ColumnStore.where(col_idx, op, value)`,
+        in addition to the current filters."""
+        self._filters.append((col_idx, op, value))
+        self._columns()
+        self._apply()
+        self.ResetView()
+
+    def clear_filters(self):
+        self._filters = []
+        self._columns()
+        self._apply()
+        self.ResetView()
+
+    def aggregate(self, col_idx, func):
+        """Aggregate of the column over the shown rows, see
+        `ColumnStore.aggregate`."""
+        return self._columns().aggregate(col_idx, func, self._rows)
+
+    def GetNumberRows(self):
+        self._columns()
+        return len(self._index if self._rows is None else self._rows)
+
+    def _get_value(self, row_idx, col_idx):
+        store_idx = self._store_index(row_idx)
+        row = self._store.objects[store_idx]
+        self._watch(row)
+        value = self._store.get(store_idx, col_idx)
+        disp_attr = 'get_%s_display' % \
+            self.mapping[col_idx].attribute.replace('.', '_')
+        if hasattr(row, disp_attr) and callable(getattr(row, disp_attr)):
+            value = getattr(row, disp_attr)(value)
+        if value is None:
+            return u''
+        return unicode(value)
+
+    def GetValueAsObject(self, row_idx, col_idx):
+        store_idx = self._store_index(row_idx)
+        self._watch(self._store.objects[store_idx])
+        return self._store.get(store_idx, col_idx)
+
+    def SetValueAsObject(self, row_idx, col_idx, value):
+        super(ColumnarListTable, self).SetValueAsObject(row_idx, col_idx,
+                                                        value)
+        row = self.GetRow(row_idx)
+        self._store.set(self._store_index(row_idx), col_idx,
+                        get_attribute(row, self.mapping[col_idx].attribute))
+
+    @timed
+    def GetRow(self, row_idx):
+        row = self._store.objects[self._store_index(row_idx)]
+        self._watch(row)
+        return row
+
+    def GetRowIndex(self, object):
+        # `object` may be the wrapped object, compared equal to the row
+        row = self._index[self._index.index(object)]
+        store_idx = self._columns().rows[id(row)]
+        return store_idx if self._rows is None else self._rows.index(store_idx)
+
+    def CreateRow(self):
+        row_idx = super(ColumnarListTable, self).CreateRow()
+        if row_idx is not None:
+            return self.GetRowIndex(self._index[row_idx])
+
 
 class QueryTable(ListTable):
+    """
+    Table showing the rows of a query, fetched a page at a time.
+
+    Rows are addressed by their offset in the query result. Rows created or
+    deleted in the grid are kept in an `EditOverlay` until they are saved,
+    which translates the rows of the grid to offsets, so the cached rows
+    stay valid.
+
+    Rows are wrapped in caching wrappers, whose changes are recorded in the
+    `journal` of the table until they are saved; `journal.undo` undoes the
+    last edits made in the table.
+    """
     class Cache(traits.HasTraits):
         rows = traits.Dict(traits.Int, traits.HasTraits)
 
+    # The page size adapts to the measured time per row, so that fetching a
+    # page takes about `fetch_time` seconds, but it covers at least the rows
+    # visible in the grid.
+    fetch_time = 0.05
+    min_page_size = 10
+    max_page_size = 1000
+
+    def __init__(self, trait, mapping=None, commit_on='grid', view=None,
+                 watermark=None):
+        """
+        `watermark` name of a column which increases whenever a row changes,
+            e.g. a version or modification time, to `refresh` only the rows
+            changed since the last query instead of reloading all rows.
+        """
+        self.watermark = watermark
+        self._refresh_timer = None
+        super(QueryTable, self).__init__(trait, mapping, commit_on, view)
+
     def _setup(self):
         self._cache = self.Cache()
         self._update_cache()
         self.page_size = 50
+        self._row_seconds = None
+        self._viewport_rows = 0
+        # Number of rows saved at once by `SaveGrid`, None for all.
+        self.batch_size = None
         self._trait[0].on_trait_change(self.reload, '%s_query' % self._trait[1])
         self._cache.on_trait_change(self.UpdateValues, 'rows.+')
-        self.wrapper = wrap
+        self.journal = ChangeJournal()
+        self.wrapper = self._wrap
+
+    def _wrap(self, obj):
+        return self.journal.track(wrap(obj, False))
+
+    def _create(self):
+        # Rewrapped, so created rows are saved like the cached rows.
+        row = self.creator()
+        return row and self.wrapper(unwrap(row))
 
     def _update_cache(self):
         self._query = getattr(self._trait[0], '%s_query' % self._trait[1])
         self._query.session = wx.GetApp().session
         self._cache.rows = {}
-        self._num_rows = self._query.count()
+        self._eager_attributes = None
+        self._aggregates = None
+        self._order = self._order_attributes()
+        self._order_keys = {}
+        start = stats.enabled and timeit.default_timer()
+        with tracer.scope(self._trait[0], '%s_table.count' % self._trait[1]):
+            self._num_rows = self._count()
+            self._overlay = EditOverlay(self._num_rows)
+            if self.watermark:
+                self._membership, self._watermark = self._markers()
+                # Rows at the watermark, which are queried again by `refresh`
+                self._watermarked = set() if self._watermark is None else \
+                    self._identities(self._query.order_by(None).filter(
+                        self._watermark_column() == self._watermark))
+        if stats.enabled:
+            stats.add('QueryTable.count', timeit.default_timer() - start)
+
+    def _count(self):
+        return self._query.count()
 
     def reload(self):
         self._update_cache()
         self.UpdateValues()
 
+    def _watermark_column(self):
+        return getattr(query_model(self._query), self.watermark)
+
+    def _markers(self):
+        """The `membership_columns` of the query, and its maximum
+        watermark."""
+        model = query_model(self._query)
+        values = self._query.order_by(None).with_entities(*(
+            membership_columns(model) +
+            [sa.func.max(self._watermark_column())])).one()
+        return list(values[:-1]), values[-1]
+
+    def _identities(self, query):
+        """Identities of the objects selected by `query`."""
+        primary_key = sa.inspect(query_model(query)).primary_key
+        return set(tuple(row) for row in query.with_entities(*primary_key))
+
+    def refresh(self):
+        """
+        Update the rows changed since the last query, according to the
+        `watermark` column; reloads all rows without one.
+
+        Changed rows are queried and updated in place. Cached rows whose
+        position may have changed with their ORDER BY values are dropped, to
+        be fetched again. Rows added or removed by others, including rows
+        entering or leaving the filter of the query, are detected by the
+        `membership_columns` of the query, in which case all cached rows are
+        dropped. The refresh is skipped while rows have unsaved changes, or
+        rows have been created or deleted in the grid. Returns the number of
+        changed rows.
+        """
+        if not self.watermark:
+            self.reload()
+            return self._num_rows
+        model = query_model(self._query)
+        session = self._query.session
+        if self._overlay.changed or \
+                self.journal.dirty(self._cached_rows()) or \
+                any(isinstance(obj, model) for obj in session.dirty):
+            return 0
+        column = self._watermark_column()
+        query = self._query.order_by(None)
+        # Rows changed in the same tick as the last changed row have the same
+        # watermark, so the rows at the watermark are queried again.
+        query = query.filter(column.isnot(None)) if self._watermark is None \
+            else query.filter(column >= self._watermark)
+        start = stats.enabled and timeit.default_timer()
+        with tracer.scope(self._trait[0], '%s_table.refresh' % self._trait[1]):
+            # Cached rows hold the same instances, which are updated in place.
+            fetched = query.populate_existing().all()
+            membership, watermark = self._markers()
+        if stats.enabled:
+            stats.add('QueryTable.refresh', timeit.default_timer() - start)
+        identities = [tuple(sa.inspect(obj).identity) for obj in fetched]
+        changed = [obj for obj, identity in zip(fetched, identities)
+                   if getattr(obj, self.watermark) != self._watermark or
+                   identity not in self._watermarked]
+        self._watermarked = set(
+            identity for obj, identity in zip(fetched, identities)
+            if getattr(obj, self.watermark) == watermark)
+        self._watermark = watermark
+        if changed:
+            self._aggregates = None
+        if membership != self._membership:
+            self._membership = membership
+            self._num_rows = membership[0]
+            self._overlay.clear(self._num_rows)
+            self._aggregates = None
+            self._forget_rows()
+            self.ResetView()
+        elif changed:
+            self._refresh_rows(changed)
+            self._reposition(changed)
+            self.UpdateValues()
+        return len(changed)
+
+    def _reposition(self, objects):
+        """Drop the cached rows whose position may have changed, as the
+        ORDER BY values of `objects` changed."""
+        ids = set(id(obj) for obj in objects)
+        rows = [row for row in self._cached_rows() if id(unwrap(row)) in ids]
+        if len(rows) < len(ids) and self._order != []:
+            # The previous position of rows which were not cached is unknown.
+            self._remap_rows(lambda row_idx: None)
+        else:
+            self._reorder_saved(rows)
+
+    def _cached_rows(self):
+        return self._cache.rows.values()
+
+    def _forget_rows(self):
+        self._cache.rows = {}
+
+    def _refresh_rows(self, objects):
+        """`objects` have been refreshed from the database."""
+
+    def start_refreshing(self, interval=5000):
+        """`refresh` every `interval` milliseconds."""
+        self.stop_refreshing()
+        self._refresh_timer = wx.PyTimer(self.refresh)
+        self._refresh_timer.Start(interval)
+
+    def stop_refreshing(self):
+        if self._refresh_timer is not None:
+            self._refresh_timer.Stop()
+            self._refresh_timer = None
+
+    def _is_cached(self, row_idx):
+        return row_idx in self._cache.rows
+
     def _assert_in_cache(self, row_idx):
-        if row_idx in self._cache.rows:
+        if self._is_cached(row_idx):
             return
 
-        start = max(row_idx-self.page_size, 0)
-        stop = min(row_idx+self.page_size, self._num_rows)
+        # Fetch the gap of uncached rows around `row_idx`, up to a page on
+        # either side.
+        first = max(row_idx-self.page_size, 0)
+        last = min(row_idx+self.page_size, self._num_rows)
+        start, stop = row_idx, row_idx+1
+        while start > first and not self._is_cached(start-1):
+            start -= 1
+        while stop < last and not self._is_cached(stop):
+            stop += 1
+        self._fetch(start, stop)
+
+    def _gaps(self, start, stop):
+        """(start, stop) of the runs of uncached rows in `start` up to
+        `stop`."""
+        gap = None
+        for idx in range(start, stop):
+            if not self._is_cached(idx):
+                if gap is None:
+                    gap = idx
+            elif gap is not None:
+                yield gap, idx
+                gap = None
+        if gap is not None:
+            yield gap, stop
 
-        for idx, row in enumerate(self._query[start:stop]):
+    def _fetch(self, start, stop):
+        """Query rows `start` up to `stop` and add them to the cache."""
+        started = timeit.default_timer()
+        with tracer.scope(self._trait[0], '%s_table.fetch' % self._trait[1]):
+            rows = list(self._page_query()[start:stop])
+            tracer.add_rows(len(rows))
+        seconds = timeit.default_timer() - started
+        if stats.enabled:
+            stats.add('QueryTable.fetch', seconds)
+            stats.add('QueryTable.fetch.rows', count=len(rows))
+        self._adapt_page_size(len(rows), seconds)
+        self._add_rows(start, rows)
+
+    def _adapt_page_size(self, num_rows, seconds):
+        """Update the page size with the time per row of a fetch."""
+        if num_rows < self.min_page_size:
+            # Dominated by the latency of the query itself.
+            return
+        row_seconds = seconds / num_rows
+        if self._row_seconds is not None:
+            row_seconds = (self._row_seconds + row_seconds) / 2
+        self._row_seconds = row_seconds
+        page_size = int(self.fetch_time / row_seconds) if row_seconds \
+            else self.max_page_size
+        self.page_size = max(min(page_size, self.max_page_size),
+                             self.min_page_size, self._viewport_rows)
+
+    def _add_rows(self, start, rows):
+        """Add the missing rows to the cache in a single update, so listeners
+        are notified only once."""
+        wrapped = {}
+        for idx, row in enumerate(rows):
             if start+idx not in self._cache.rows:
-                self._cache.rows[start+idx] = self.wrapper(row)
+                wrapped[start+idx] = self.wrapper(row)
+        for row in wrapped.values():
+            self._snapshot_order(row)
+            if self._aggregates is not None:
+                self._snapshot(row)
+        self._cache.rows.update(wrapped)
+
+    def _page_query(self):
+        """
+        The query with eager loading of the relationships that are displayed,
+        to prevent a lazy load per row when displaying a page.
+        """
+        attributes = mapping_attributes(self.mapping)
+        if attributes != self._eager_attributes:
+            self._eager_attributes = attributes
+            self._eager_query = self._query.options(
+                *eager_options(query_model(self._query), attributes))
+        return self._eager_query
+
+    def prefetch(self, start, stop):
+        """
+        Fetch the pages covering rows `start` up to `stop`.
+
+        The range is widened to whole pages and only the runs of uncached
+        rows are requested from the database. Runs separated by fewer than
+        `min_page_size` cached rows are fetched in one query, refetching
+        the rows in between, as the latency of a query outweighs loading a
+        few rows; usually that is a single query per scroll step. The number
+        of rows requested is taken as the height of the viewport, the
+        minimum page size.
+        """
+        if stop <= start:
+            return
+        self._viewport_rows = min(stop - start, self.max_page_size)
+        start = self._overlay.offset_at(start)
+        stop = self._overlay.offset_at(stop - 1) + 1
+        last = stop - 1
+        start = max(start - start % self.page_size, 0)
+        stop = min(last - last % self.page_size + self.page_size,
+                   self._num_rows)
+        spans = []
+        for gap_start, gap_stop in self._gaps(start, stop):
+            if spans and gap_start - spans[-1][1] < self.min_page_size:
+                spans[-1][1] = gap_stop
+            else:
+                spans.append([gap_start, gap_stop])
+        for span in spans:
+            self._fetch(*span)
+
+    def export(self, path, progress=None, done=None, chunk_size=1000):
+        """
+        Export all rows of the query to CSV or XLSX file `path` on a worker
+        thread, see `Export`.
+
+        Rows are streamed from the query in a session of the worker, loading
+        `chunk_size` rows at a time, and are not cached. Unsaved changes are
+        not exported. Many-to-one relationships in the mapping are joined,
+        collections cannot be streamed and are loaded per row.
+        """
+        model = query_model(self._query)
+        query = self._query.options(*eager_options(
+            model, mapping_attributes(self.mapping), collections=False))
+        bind = self._query.session.get_bind(mapper=model)
+
+        def rows():
+            session = orm.Session(bind=bind)
+            try:
+                for count, row in enumerate(
+                        query.with_session(session).yield_per(chunk_size), 1):
+                    yield row
+                    if count % chunk_size == 0:
+                        # Exported rows would pile up in the identity map.
+                        session.expunge_all()
+            finally:
+                session.close()
+        return Export(rows, self.mapping, path, total=self._num_rows,
+                      progress=progress, done=done,
+                      chunk_size=chunk_size).start()
+
+    def _aggregate_specs(self):
+        return [(col_idx, col.attribute, col.aggregate)
+                for col_idx, col in enumerate(self.mapping or [])
+                if getattr(col, 'aggregate', None)]
+
+    def _update_aggregates(self):
+        """
+        Select the aggregates of the mapping in a single query over all rows.
+
+        The result is cached until the table is reloaded, and updated with
+        the changes of the rows saved through the table. The values of the
+        aggregated attributes of cached rows are kept to determine those
+        changes.
+        """
+        specs = self._aggregate_specs()
+        if self._aggregates is not None and specs == self._aggregated_specs:
+            return
+        self._aggregated_specs = specs
+        self._aggregates = {}
+        self._snapshots = {}
+        if not specs:
+            return
+        start = stats.enabled and timeit.default_timer()
+        with tracer.scope(self._trait[0],
+                          '%s_table.aggregate' % self._trait[1]):
+            values = list(aggregate_query(
+                self._query, [spec[1:] for spec in specs]).one())
+        if stats.enabled:
+            stats.add('QueryTable.aggregate', timeit.default_timer() - start)
+        for col_idx, _, function in specs:
+            if function == 'avg':
+                self._aggregates[col_idx] = [values.pop(0), values.pop(0)]
+            else:
+                self._aggregates[col_idx] = values.pop(0)
+        for row in self._cache.rows.values():
+            self._snapshot(row)
+
+    def _snapshot(self, row):
+        self._snapshots[id(row)] = self._aggregated_values(row)
+
+    def _aggregated_values(self, row):
+        return tuple(get_attribute(row, attribute)
+                     for _, attribute, _ in self._aggregated_specs)
+
+    def _aggregate_saved(self, rows):
+        """Update the aggregates with the changes of saved `rows`, or drop
+        them to be selected again if that is not possible."""
+        if not self._aggregates:
+            return
+        for row in rows:
+            before = self._snapshots.get(id(row))
+            if before is None:
+                self._aggregates = None
+                return
+            after = self._aggregated_values(row)
+            for spec, old, new in zip(self._aggregated_specs, before, after):
+                if old != new and not self._update_aggregate(spec, old, new):
+                    self._aggregates = None
+                    return
+            self._snapshots[id(row)] = after
+        self.UpdateValues()
+
+    def _update_aggregate(self, spec, old, new):
+        """Replace `old` by `new` in the aggregate of `spec`, returns False
+        when that requires selecting the aggregate again."""
+        col_idx, _, function = spec
+        value = self._aggregates[col_idx]
+        count = (new is not None) - (old is not None)
+        if function == 'count':
+            self._aggregates[col_idx] = value + count
+        elif function in ('sum', 'avg'):
+            total = value[0] if function == 'avg' else value
+            if old is not None:
+                total -= old
+            if new is not None:
+                total = new if total is None else total + new
+            self._aggregates[col_idx] = [total, value[1] + count] \
+                if function == 'avg' else total
+        else:
+            better = operator.lt if function == 'min' else operator.gt
+            if new is not None and (value is None or better(new, value)):
+                self._aggregates[col_idx] = new
+            elif old is not None and old == value and new != value:
+                # The extreme value changed; the next one is unknown.
+                return False
+        return True
+
+    def GetAggregate(self, col_idx):
+        """Aggregate of column `col_idx` over all rows, as specified by the
+        `aggregate` of its column in the mapping, or None."""
+        self._update_aggregates()
+        value = self._aggregates.get(col_idx)
+        if isinstance(value, list):
+            total, count = value
+            return total / count if count else None
+        return value
 
     def GetNumberRows(self):
-        return self._num_rows
+        return len(self._overlay)
 
+    @timed
     def GetRow(self, row_idx):
-        self._assert_in_cache(row_idx)
-        return self._cache.rows[row_idx]
+        offset, row = self._overlay.source(row_idx)
+        if row is not None:
+            return row
+        self._assert_in_cache(offset)
+        return self._cache.rows[offset]
 
-    def GetRowIndex(self, object):
+    def row_offset(self, object):
+        """Offset of cached `object` in the query result."""
         for idx, row in self._cache.rows.iteritems():
             if row == object:
                 return idx
         raise IndexError('object was not in cache')
 
+    def GetRowIndex(self, object):
+        row_idx = self._overlay.index_of(object)
+        if row_idx is None:
+            row_idx = self._overlay.index(self.row_offset(object))
+        if row_idx is None:
+            raise IndexError('object was deleted')
+        return row_idx
+
+    def SaveRow(self, row_idx):
+        row = self.GetRow(row_idx)
+        if not row.has_changes or self.commit_on == 'grid':
+            # Changes are saved by `SaveGrid`, from the journal.
+            return True
+        if not self.saver([row]):
+            return False
+        created_idx = self._overlay.index_of(row)
+        if created_idx is None:
+            self._aggregate_saved([row])
+            self._reorder_saved([row])
+            return True
+        # The row is now part of the query result, at a position only the
+        # database knows, shifting the cached rows after it.
+        self._overlay.merge(created_idx)
+        self._num_rows += 1
+        self._aggregates = None
+        self._remap_rows(lambda row_idx: None)
+        self.ResetView()
+        return True
+
     def SaveGrid(self):
-        return self.saver(self._cache.rows.values())
+        """
+        Save the changed and created rows, and delete the deleted rows.
 
-    def DeleteRows(self, row_idx):
-        raise NotImplementedError()
+        The rows are deleted before the created rows are saved. The rows
+        below deleted rows move up in the cache as soon as they have been
+        deleted. Created rows are inserted into the query result at a
+        position only the database knows, so all rows are reloaded when rows
+        were created. After a failure, saving again only saves what has not
+        been saved yet.
+        """
+        deleted = self._overlay.deleted
+        created = self._overlay.inserted
+        deleted_ids = set(id(row) for row in deleted)
+        rows = [row for row in self.journal.dirty(self._cached_rows())
+                if id(row) not in deleted_ids]
+        saved = self.journal.save(self.saver, rows, self.batch_size)
+        if saved and deleted:
+            saved = self.deleter(deleted)
+            # The deleter may have forgotten the rows already, like
+            # `QueryList.objects_delete` does.
+            remaining = [offset for offset, row in zip(
+                self._overlay.deleted_offsets, self._overlay.deleted)
+                if id(row) in deleted_ids]
+            if saved and remaining:
+                self.forget_rows(remaining)
+        if saved and created:
+            saved = self.saver(created)
+            if saved:
+                self.reload()
+                self.ResetView()
+                return saved
+        if saved:
+            self._aggregate_saved(rows)
+        else:
+            # Some batches may have been saved.
+            self._aggregates = None
+            rows = [row for row in rows if not row.has_changes]
+        self._reorder_saved(rows)
+        return saved
 
-    def CreateRow(self):
-        raise NotImplementedError
+    def _order_attributes(self):
+        """
+        (attribute, descending) of the ORDER BY clauses of the query, or None
+        when they cannot be evaluated on the objects, e.g. when ordering by
+        an expression or a column of a related table.
+        """
+        query = self._query
+        clauses = getattr(query, '_order_by_clauses', None)
+        if clauses is None:  # SQLAlchemy < 1.4
+            clauses = query._order_by or ()
+        mapper = sa.inspect(query_model(query))
+        order = []
+        for clause in clauses:
+            modifier = getattr(clause, 'modifier', None)
+            descending = modifier is sa.sql.operators.desc_op
+            if modifier in (sa.sql.operators.asc_op,
+                            sa.sql.operators.desc_op):
+                clause = clause.element
+            try:
+                order.append((mapper.get_property_by_column(clause).key,
+                              descending))
+            except (KeyError, orm_exc.UnmappedColumnError):
+                return None
+        return order
+
+    def _snapshot_order(self, row):
+        if self._order:
+            self._order_keys[id(row)] = tuple(
+                getattr(row, attribute) for attribute, _ in self._order)
+
+    def _moved_down(self, old, new):
+        """Whether a row moves down when its ORDER BY values change from
+        `old` to `new`, None when that is unknown."""
+        for (_, descending), old_value, new_value in zip(self._order, old,
+                                                         new):
+            if old_value == new_value:
+                continue
+            if old_value is None or new_value is None:
+                # Where NULLs are placed depends on the database.
+                return None
+            return (new_value > old_value) != descending
+        return None
+
+    def _reorder_saved(self, rows):
+        """
+        Drop the cached rows whose position may have changed by saving
+        `rows`.
+
+        A row whose ORDER BY values increased moves down, shifting the rows
+        below it up to its unknown new position, so all rows from its old
+        position onwards are dropped. Likewise, a row moving up drops all
+        rows up to its old position. Other rows stay cached, unless the
+        direction is unknown.
+        """
+        if self._order == []:
+            return
+        first, last = None, None
+        for row in rows:
+            old = self._order_keys.get(id(row))
+            self._snapshot_order(row)
+            new = self._order_keys.get(id(row))
+            if old is not None and old == new:
+                continue
+            down = None if old is None else self._moved_down(old, new)
+            try:
+                row_idx = self.row_offset(row)
+            except IndexError:
+                down = None
+            if down is None:
+                self._remap_rows(lambda row_idx: None)
+                break
+            if down:
+                first = row_idx if first is None else min(first, row_idx)
+            else:
+                last = row_idx if last is None else max(last, row_idx)
+        else:
+            if first is None and last is None:
+                return
+            self._remap_rows(lambda row_idx: None if (
+                (first is not None and row_idx >= first) or
+                (last is not None and row_idx <= last)) else row_idx)
+        self.UpdateValues()
+
+    def _remap_rows(self, remap):
+        """Move the cached rows to `remap(row_idx)`, dropping those for which
+        it returns None."""
+        rows = {}
+        for row_idx, row in self._cache.rows.items():
+            new_idx = remap(row_idx)
+            if new_idx is not None:
+                rows[new_idx] = row
+        self._order_keys = dict((id(row), self._order_keys[id(row)])
+                                for row in rows.values()
+                                if id(row) in self._order_keys)
+        self._cache.rows = rows
+
+    def forget_rows(self, offsets):
+        """
+        Rows at `offsets` of the query result have been deleted. Cached rows
+        below them are moved up, instead of reloading all rows.
+        """
+        removed = sorted(set(offsets))
+        removed_set = set(removed)
+        self._remap_rows(lambda row_idx: None if row_idx in removed_set else
+                         row_idx - bisect_left(removed, row_idx))
+        self._overlay.remove_offsets(removed)
+        self._num_rows -= len(removed)
+        self._aggregates = None
+        self.ResetView()
+
+    def DeleteRows(self, rows):
+        if self.commit_on == 'grid':
+            # From the bottom up, so the indexes of the other rows stay put.
+            for row_idx in sorted(set(rows), reverse=True):
+                self._overlay.delete(row_idx, self.GetRow(row_idx))
+        else:
+            objects = [self.GetRow(row_idx) for row_idx in rows]
+            for obj in objects:
+                row_idx = self._overlay.index_of(obj)
+                if row_idx is not None:
+                    self._overlay.delete(row_idx)
+            persistent = [obj for obj in objects
+                          if sa.inspect(unwrap(obj)).has_identity]
+            if persistent:
+                self.deleter(persistent)
+        self.ResetView()
+
+    def reindex(self):
+        """Rows are not indexed; resets the view."""
+        self.ResetView()
+
+    def _add_created(self, rows):
+        for row in rows:
+            self._overlay.insert(len(self._overlay), row)
+
+    def _save_pasted(self, rows):
+        # Changes are in the journal, new rows in the overlay.
+        return True if self.commit_on == 'grid' else self.SaveGrid()
+
+    def CreateRow(self, row_idx=None):
+        """Create a row before row `row_idx`, or after the last row."""
+        row = self._create()
+        if row:
+            if row_idx is None:
+                row_idx = len(self._overlay)
+            self._overlay.insert(row_idx, row)
+            self.ResetView()
+            return row_idx
+
+
+class ProjectedQueryTable(QueryTable):
+    """
+    QueryTable selecting only the mapped attributes, for read-only lists.
+
+    Rows are kept as plain values in a `RowStore` instead of as wrapped model
+    instances. The model instance of a row is only loaded when it is
+    requested through `GetRow`, e.g. when it is opened in a Detail or edited.
+    Display methods of the model are called with a `RowView` as `self`, so
+    they can use the mapped attributes and the class attributes and methods
+    of the model, but not other attributes of the instance.
+    """
+    _unset = object()
+
+    def __init__(self, trait, mapping=None, commit_on='grid', view=None,
+                 watermark=None, snapshots=None):
+        """
+        `snapshots` optional `SnapshotCache`. The rows are then served from
+            a snapshot of the projected query, if there is one, which is
+            validated in the background; otherwise one is built.
+        """
+        self.snapshots = snapshots
+        self._snapshot = None
+        super(ProjectedQueryTable, self).__init__(trait, mapping, commit_on,
+                                                  view, watermark)
+
+    def _update_cache(self):
+        self._entities = {}
+        self._projected_mapping = self._unset
+        super(ProjectedQueryTable, self)._update_cache()
+
+    def _count(self):
+        self._projection()
+        if self._snapshot is not None:
+            return len(self._snapshot)
+        return super(ProjectedQueryTable, self)._count()
+
+    def _projection(self):
+        """Rebuild the projected query and store when the mapping changed."""
+        if self.mapping is self._projected_mapping:
+            return
+        self._projected_mapping = self.mapping
+        attributes = mapping_attributes(self.mapping)
+        model = self._model = query_model(self._query)
+        self._primary_key = list(sa.inspect(model).primary_key)
+        self._offset = len(self._primary_key)
+        query, columns = projected_columns(self._query, attributes)
+        self._projected_query = query.with_entities(
+            *(self._primary_key + columns))
+        self._store = RowStore(self._offset + len(columns))
+        self._names = dict((attribute, self._offset + col_idx)
+                           for col_idx, attribute in enumerate(attributes))
+        self._display = []
+        for attribute in attributes:
+            method = getattr(model, 'get_%s_display' %
+                             attribute.replace('.', '_'), None)
+            self._display.append(getattr(method, '__func__', method)
+                                 if callable(method) else None)
+        self._open_snapshot()
+
+    def _open_snapshot(self):
+        self._close_snapshot()
+        if self.snapshots is None:
+            return
+        self._snapshot = self.snapshots.load(
+            query_fingerprint(self._projected_query))
+        if self._snapshot is None:
+            self.snapshots.build(self._projected_query,
+                                 len(self._store.columns), self._query)
+        else:
+            self.snapshots.validate(self._snapshot, self._query,
+                                    self._snapshot_validated)
+
+    def _close_snapshot(self):
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+
+    def _drop_snapshot(self):
+        """The snapshot is outdated; rows are queried from now on."""
+        if self._snapshot is not None:
+            fingerprint = self._snapshot.fingerprint
+            self._close_snapshot()
+            self.snapshots.discard(fingerprint)
+
+    def _snapshot_validated(self, snapshot, valid):
+        if valid or snapshot is not self._snapshot:
+            return
+        self._drop_snapshot()
+        self.reload()
+        self.ResetView()
+
+    def _fetch(self, start, stop):
+        if self._snapshot is None:
+            return super(ProjectedQueryTable, self)._fetch(start, stop)
+        self._add_rows(start, self._snapshot.rows(start, stop))
+
+    def _page_query(self):
+        self._projection()
+        return self._projected_query
+
+    def _is_cached(self, row_idx):
+        self._projection()
+        return row_idx in self._store
+
+    def _add_rows(self, start, rows):
+        # Rows which are already cached may have been edited. The view is not
+        # notified: rows are fetched for the values it is drawing, or is
+        # about to draw after `prefetch`, and notifying it from within a
+        # paint would only make it draw again.
+        for idx, row in enumerate(rows):
+            if start+idx not in self._store:
+                self._store.add(start+idx, row)
+
+    def _cached_rows(self):
+        return self._entities.values()
+
+    def _forget_rows(self):
+        self._drop_snapshot()
+        self._entities = {}
+        self._projected_mapping = self._unset
+
+    def _refresh_rows(self, objects):
+        self._drop_snapshot()
+        self._projection()
+        attributes = mapping_attributes(self.mapping)
+        for obj in objects:
+            identity = sa.inspect(obj).identity
+            row_idx = self._store.find(identity)
+            if row_idx is not None:
+                self._store.add(row_idx, tuple(identity) + tuple(
+                    get_attribute(obj, attribute) for attribute in attributes))
+
+    def _get_value(self, row_idx, col_idx):
+        offset, row = self._overlay.source(row_idx)
+        if row is not None:
+            # Created rows are not in the store.
+            return ListTable._get_value(self, row_idx, col_idx)
+        self._assert_in_cache(offset)
+        value = self._store.get(offset, self._offset+col_idx)
+        display = self._display[col_idx]
+        if display is not None:
+            value = display(RowView(self._store, offset, self._names,
+                                    self._model), value)
+        if value is None:
+            return u''
+        return unicode(value)
+
+    def GetValueAsObject(self, row_idx, col_idx):
+        offset, row = self._overlay.source(row_idx)
+        if row is not None:
+            return ListTable.GetValueAsObject(self, row_idx, col_idx)
+        self._assert_in_cache(offset)
+        return self._store.get(offset, self._offset+col_idx)
+
+    def SetValueAsObject(self, row_idx, col_idx, value):
+        super(ProjectedQueryTable, self).SetValueAsObject(row_idx, col_idx,
+                                                          value)
+        offset, row = self._overlay.source(row_idx)
+        if row is None:
+            attribute = self.mapping[col_idx].attribute
+            self._store.set(offset, self._offset+col_idx,
+                            get_attribute(self.GetRow(row_idx), attribute))
+
+    @timed
+    def GetRow(self, row_idx):
+        offset, row = self._overlay.source(row_idx)
+        if row is not None:
+            return row
+        if offset not in self._entities:
+            self._assert_in_cache(offset)
+            key = self._store.row(offset)[:self._offset]
+            model = query_model(self._query)
+            entity = self._query.session.query(model).get(
+                key if len(key) > 1 else key[0])
+            self._entities[offset] = self.wrapper(entity)
+            self._snapshot_order(self._entities[offset])
+        return self._entities[offset]
+
+    def row_offset(self, object):
+        for idx, row in self._entities.iteritems():
+            if row == object:
+                return idx
+        idx = self._store.find(sa.inspect(unwrap(object)).identity)
+        if idx is None:
+            raise IndexError('object was not in cache')
+        return idx
+
+    def _save_pasted(self, rows):
+        saved = super(ProjectedQueryTable, self)._save_pasted(rows)
+        # Pasted values are set on the entities, not in the store.
+        self._refresh_rows([unwrap(row) for row in rows
+                            if sa.inspect(unwrap(row)).has_identity])
+        return saved
+
+    # Saved and deleted rows make the snapshot outdated.
+    def SaveRow(self, row_idx):
+        changed = self.GetRow(row_idx).has_changes
+        saved = super(ProjectedQueryTable, self).SaveRow(row_idx)
+        if saved and changed and self.commit_on != 'grid':
+            self._drop_snapshot()
+        return saved
+
+    def SaveGrid(self):
+        if self._overlay.changed or self.journal.dirty(self._cached_rows()):
+            self._drop_snapshot()
+        return super(ProjectedQueryTable, self).SaveGrid()
+
+    def forget_rows(self, offsets):
+        self._drop_snapshot()
+        super(ProjectedQueryTable, self).forget_rows(offsets)
+
+    def _remap_rows(self, remap):
+        self._store.remap(remap)
+        entities = {}
+        for row_idx, entity in self._entities.items():
+            new_idx = remap(row_idx)
+            if new_idx is not None:
+                entities[new_idx] = entity
+        self._entities = entities
+        self._order_keys = dict((id(row), self._order_keys[id(row)])
+                                for row in entities.values()
+                                if id(row) in self._order_keys)
@@ -0,0 +1,166 @@
+"""
+Attributes SQL statements to the ViewModel and table or binding issuing them.
+
+Code reaching into the database wraps its queries in `tracer.scope`, which
+tags all statements executed within. Per tag the number of statements, the
+time spent and the number of rows are aggregated. Statements repeatedly
+executed from within a per-row scope (e.g. lazy loads triggered by
+`ListTable.GetValue`) are reported as N+1 patterns.
+
+    >>> tracer.install(wx.GetApp().session)
+    >>> # ... use the application ...
+    >>> tracer.stats['SkaterList.objects_table.fetch']
+    {'count': 12, 'time': 0.034, 'rows': 1200}
+    >>> tracer.n_plus_one()
+    [('SkaterList.objects_table.GetValue', 'SELECT country.id ...', 100)]
+
+Tracing is disabled until `install` has been called; scopes then cost a
+single attribute lookup.
+"""
+import threading
+import timeit
+
+from mvvm.lazy import lazy_import
+
+event = lazy_import('sqlalchemy.event')
+
+
+class _NullScope(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+_null_scope = _NullScope()
+
+
+class _Scope(object):
+    def __init__(self, tracer, tag, per_row):
+        self.tracer, self.tag, self.per_row = tracer, tag, per_row
+
+    def __enter__(self):
+        self.tracer._stack().append(self)
+
+    def __exit__(self, *exc_info):
+        self.tracer._stack().pop()
+
+
+class QueryTracer(object):
+    def __init__(self, threshold=10):
+        """
+        `threshold` number of times the same statement should be executed
+            within per-row scopes of the same tag to be reported as N+1.
+        """
+        self.enabled = False
+        self.threshold = threshold
+        self._local = threading.local()
+        self._engines = set()
+        self.reset()
+
+    def reset(self):
+        self.stats = {}
+        self._per_row = {}
+
+    def install(self, session):
+        """
+        Trace statements of `session`, which can also be a `sessionmaker`.
+
+        The engine `session` is bound to is hooked right away, so a
+        transaction already in progress is traced as well. Other engines are
+        hooked as soon as the session starts a transaction on them, so
+        sessions bound to multiple engines are traced too.
+        """
+        kw = getattr(session, 'kw', None)
+        bind = kw.get('bind') if kw is not None else \
+            getattr(session, 'bind', None)
+        if bind is not None:
+            self._hook(bind.engine)
+        event.listen(session, 'after_begin', self._after_begin)
+        self.enabled = True
+
+    def scope(self, owner, component, per_row=False):
+        """
+        Tag statements executed within the returned context manager.
+
+        `owner` the ViewModel (or a name) issuing the statements.
+
+        `component` name of the table, binding or method within the owner.
+
+        `per_row` whether the scope is entered for every row; repeated
+            statements within are reported by `n_plus_one`.
+        """
+        if not self.enabled:
+            return _null_scope
+        if not isinstance(owner, basestring):
+            owner = type(owner).__name__
+        return _Scope(self, '%s.%s' % (owner, component), per_row)
+
+    def add_rows(self, count):
+        """Record `count` rows fetched within the current scope."""
+        if self.enabled:
+            self._get(self._tag())['rows'] += count
+
+    def n_plus_one(self):
+        """(tag, statement, count) of statements repeated per row."""
+        return sorted([(tag, statement, count)
+                       for (tag, statement), count in self._per_row.items()
+                       if count >= self.threshold],
+                      key=lambda item: -item[2])
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _tag(self):
+        stack = self._stack()
+        return stack[-1].tag if stack else 'untagged'
+
+    def _get(self, tag):
+        try:
+            return self.stats[tag]
+        except KeyError:
+            self.stats[tag] = {'count': 0, 'time': 0.0, 'rows': 0}
+            return self.stats[tag]
+
+    def _after_begin(self, session, transaction, connection):
+        self._hook(connection.engine)
+
+    def _hook(self, engine):
+        if id(engine) in self._engines:
+            return
+        self._engines.add(id(engine))
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context,
+                        executemany):
+        # Kept on the execution context, which is dropped along with it
+        # when the statement fails.
+        context._mvvm_tracing_start = timeit.default_timer()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        start = getattr(context, '_mvvm_tracing_start', None)
+        if start is None:
+            # Started before the engine was hooked
+            return
+        elapsed = timeit.default_timer() - start
+        stack = self._stack()
+        tag = stack[-1].tag if stack else 'untagged'
+        stats = self._get(tag)
+        stats['count'] += 1
+        stats['time'] += elapsed
+        # The number of selected rows is unknown at this point; those are
+        # recorded by `add_rows` instead.
+        if cursor.rowcount > 0:
+            stats['rows'] += cursor.rowcount
+        if stack and stack[-1].per_row:
+            key = (tag, statement)
+            self._per_row[key] = self._per_row.get(key, 0) + 1
+
+
+tracer = QueryTracer()
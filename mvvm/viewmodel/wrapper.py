@@ -1,8 +1,14 @@
+from collections import deque, OrderedDict
+import threading
 from weakref import ref
-from sqlalchemy.orm import Query
 from traits.api import HasTraits, Instance
 from traits.traits import Property
 
+from mvvm.instrumentation import stats
+from mvvm.lazy import lazy_import
+
+orm = lazy_import('sqlalchemy.orm')
+
 
 class Wrapped(HasTraits):
     def __init__(self, wrapped, **kwargs):
@@ -33,9 +39,108 @@ class Wrapped(HasTraits):
         )
 
 
+class ChangeJournal(object):
+    """
+    Keeps track of the caching wrappers having changes, and of the edits
+    made to them, to be undone.
+
+    A journal belongs to a table or ViewModel, which passes the wrappers it
+    creates to `track`. Changes are coalesced per attribute by the wrappers,
+    so saving writes only the last value of every attribute, and only of
+    dirty wrappers. Wrappers are referenced weakly, so wrappers which are no
+    longer used, and their objects, are not kept alive by the journal.
+    Wrappers whose changes have been cleared are dropped lazily.
+    """
+    def __init__(self, max_undo=1000):
+        """`max_undo` number of edits that can be undone."""
+        self._dirty = OrderedDict()
+        self._edits = deque(maxlen=max_undo)
+
+    def track(self, wrapper):
+        """Record the changes of caching `wrapper` in this journal, returns
+        the wrapper."""
+        wrapper._journal = self
+        return wrapper
+
+    def record(self, wrapper, name, value):
+        """`wrapper` is about to change attribute `name` to `value`."""
+        changes = wrapper.changes
+        self._edits.append((ref(wrapper), name, value, name in changes,
+                            changes.get(name)))
+        self.add(wrapper)
+
+    def add(self, wrapper):
+        if self._get(id(wrapper)) is not wrapper:
+            self._dirty[id(wrapper)] = ref(wrapper)
+
+    def discard(self, wrapper):
+        if self._get(id(wrapper)) is wrapper:
+            del self._dirty[id(wrapper)]
+
+    def _get(self, key):
+        wrapper_ref = self._dirty.get(key)
+        return wrapper_ref and wrapper_ref()
+
+    def dirty(self, objects=None):
+        """Wrappers having changes, in the order they were first changed,
+        limited to `objects` if given."""
+        dirty = []
+        for key, wrapper_ref in list(self._dirty.items()):
+            wrapper = wrapper_ref()
+            if wrapper is None or not wrapper.changes:
+                del self._dirty[key]
+            else:
+                dirty.append(wrapper)
+        if objects is None:
+            return dirty
+        ids = set(id(obj) for obj in objects)
+        return [wrapper for wrapper in dirty if id(wrapper) in ids]
+
+    def save(self, saver, objects=None, batch_size=None):
+        """
+        Save the dirty wrappers (among `objects`) by calling `saver` with at
+        most `batch_size` wrappers at once. Stops at the first batch which
+        fails to save, returns whether all were saved.
+        """
+        dirty = self.dirty(objects)
+        batch_size = batch_size or len(dirty) or 1
+        for start in range(0, len(dirty), batch_size):
+            if not saver(dirty[start:start+batch_size]):
+                return False
+        return True
+
+    def undo(self, count=1):
+        """
+        Undo the last `count` edits which have not been saved yet, returns
+        the number of edits undone.
+        """
+        undone = 0
+        while self._edits and undone < count:
+            wrapper_ref, name, value, existed, previous = self._edits.pop()
+            wrapper = wrapper_ref()
+            if wrapper is None or name not in wrapper.changes or \
+                    wrapper.changes[name] is not value:
+                # Gone, saved or superseded by a change outside of the
+                # journal.
+                continue
+            if existed:
+                wrapper.changes[name] = previous
+            else:
+                del wrapper.changes[name]
+            wrapper.trait_property_changed(name, getattr(wrapper, name))
+            undone += 1
+        return undone
+
+    def clear(self):
+        self._dirty.clear()
+        self._edits.clear()
+
+
 class CachingWrapped(Wrapped):
     def __init__(self, wrapped, **kwargs):
         self.changes = kwargs
+        # `ChangeJournal` recording the changes, see `ChangeJournal.track`
+        self._journal = None
         super(CachingWrapped, self).__init__(wrapped, **kwargs)
 
     def flush(self):
@@ -51,6 +156,8 @@ cached_classes = {
     True: {},
     False: {},
 }
+# Wrapper classes may be created by `wrap_all` on a background thread.
+_cached_classes_lock = threading.RLock()
 
 def getter(name, transparent):
     if transparent:
@@ -70,6 +177,8 @@ def setter(name, transparent):
             self.trait_property_changed(name, value)
     else:
         def _set(self, value):
+            if self._journal is not None:
+                self._journal.record(self, name, value)
             self.changes[name] = value
             self.trait_property_changed(name, value)
     return _set
@@ -79,11 +188,17 @@ def wrap_cls(cls, transparent=True):
     Wraps a class as either Wrapped or CachingWrapped.
     :rtype: type
     """
-    if not cls in cached_classes[transparent]:
+    try:
+        return cached_classes[transparent][cls]
+    except KeyError:
+        pass
+    with _cached_classes_lock:
+        if cls in cached_classes[transparent]:
+            return cached_classes[transparent][cls]
         # This 'magically' adds the `competitions` class variable to `Event`.
         # @todo inspect where sqlalchemy inserts this class variable to make
         # it less magical.
-        Query(cls)
+        orm.Query(cls)
 
         cls_name = '%sWrapped%s' % ('Transparent' if transparent else 'Caching',
                                     cls.__name__)
@@ -95,7 +210,40 @@ def wrap_cls(cls, transparent=True):
             cls_dict[name] = Property(getter(name, transparent),
                                       setter(name, transparent))
         cached_classes[transparent][cls] = type(cls_name, cls_bases, cls_dict)
-    return cached_classes[transparent][cls]
+        if stats.enabled:
+            stats.add('wrap_cls')
+        return cached_classes[transparent][cls]
+
+def mapped_classes(base):
+    """Classes mapped by the declarative `base`."""
+    registry = getattr(base, 'registry', None)
+    if registry is not None and hasattr(registry, 'mappers'):
+        # SQLAlchemy >= 1.4
+        return [mapper.class_ for mapper in registry.mappers]
+    return [cls for cls in base._decl_class_registry.values()
+            if isinstance(cls, type)]
+
+def wrap_all(base, background=False):
+    """
+    Create the wrapper classes of all classes mapped by the declarative
+    `base` in one pass, so wrapping the first objects of a class costs the
+    same as wrapping later ones.
+
+    With `background` the classes are created on a daemon thread, which is
+    returned; objects wrapped in the meantime simply create their class
+    first.
+    """
+    def run():
+        orm.configure_mappers()
+        for cls in mapped_classes(base):
+            for transparent in (True, False):
+                wrap_cls(cls, transparent)
+    if not background:
+        return run()
+    thread = threading.Thread(target=run, name='wrap_all')
+    thread.daemon = True
+    thread.start()
+    return thread
 
 def wrap(obj, transparent=True):
     """
@@ -105,6 +253,8 @@ def wrap(obj, transparent=True):
     """
     if obj is None:
         raise TypeError('Cannot wrap None')
+    if stats.enabled:
+        stats.add('wrap')
     return wrap_cls(obj.__class__, transparent)(obj)
 
 def unwrap(obj):
@@ -112,6 +262,21 @@ def unwrap(obj):
         obj = obj._wrapped
     return obj
 
+def notify_wrappers(obj, names):
+    """
+    Notify the wrappers of `obj` of new values of attributes `names`, which
+    have been committed. Pending changes of caching wrappers to those
+    attributes are discarded.
+    """
+    for wrapper in getattr(obj, '_wrappers', ()):
+        wrapper = wrapper()
+        if not wrapper:
+            continue
+        for name in names:
+            if isinstance(wrapper, CachingWrapped):
+                wrapper.changes.pop(name, None)
+            wrapper.trait_property_changed(name, getattr(obj, name))
+
 def session_flush(session, unit_of_work):
     for mapper in unit_of_work.mappers.values():
         for object in mapper:
@@ -139,3 +304,6 @@ def session_flush(session, unit_of_work):
                                                    getattr(object._strong_obj, name))
                     notified.add(name)
                     changes = set(object.committed_state) - notified
+                if isinstance(wrapper, CachingWrapped) and \
+                        wrapper._journal is not None and not wrapper.changes:
+                    wrapper._journal.discard(wrapper)
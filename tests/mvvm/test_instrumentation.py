@@ -0,0 +1,48 @@
+from __future__ import absolute_import
+import unittest
+
+from mvvm.instrumentation import Stats, stats, timed
+
+
+class TestTimed(unittest.TestCase):
+    class Binding(object):
+        @timed
+        def update_view(self, new, extra=None):
+            return new, extra
+
+    def setUp(self):
+        stats.reset()
+
+    def tearDown(self):
+        stats.enabled = False
+        stats.reset()
+
+    def test_signature(self):
+        # traits inspects the number of arguments of handlers
+        code = self.Binding.__dict__['update_view'].__code__
+        self.assertEqual(('self', 'new', 'extra'),
+                         code.co_varnames[:code.co_argcount])
+        self.assertEqual((1, None), self.Binding().update_view(new=1))
+
+    def test_disabled(self):
+        self.Binding().update_view(1)
+        self.assertEqual({}, stats.snapshot())
+
+    def test_enabled(self):
+        stats.enabled = True
+        self.Binding().update_view(1)
+        self.Binding().update_view(2, 3)
+        self.assertEqual(2, stats.get('Binding.update_view')['count'])
+
+
+class TestStats(unittest.TestCase):
+    def test_add(self):
+        subject = Stats()
+        subject.add('fetch', 0.5, count=10)
+        subject.add('fetch', 0.25)
+        self.assertEqual({'fetch': {'count': 11, 'time': 0.75}},
+                         subject.snapshot())
+        self.assertIn('fetch', subject.report())
+
+if __name__ == '__main__':
+    unittest.main()
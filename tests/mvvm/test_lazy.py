@@ -0,0 +1,41 @@
+from __future__ import absolute_import
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+
+import mvvm.lazy as subject
+
+
+class TestLazyModule(unittest.TestCase):
+    name = 'mvvm_lazy_test_module'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, self.name + '.py'), 'w') as f:
+            f.write('def double(value):\n    return 2 * value\n')
+        sys.path.insert(0, self.directory)
+
+    def tearDown(self):
+        sys.path.remove(self.directory)
+        sys.modules.pop(self.name, None)
+        shutil.rmtree(self.directory)
+
+    def test_import(self):
+        module = subject.lazy_import(self.name)
+        self.assertNotIn(self.name, sys.modules)
+        self.assertEqual(4, module.double(2))
+        self.assertIn(self.name, sys.modules)
+
+    def test_patch(self):
+        sys.modules[self.name] = types.ModuleType(self.name)
+        module = subject.lazy_import(self.name)
+        module.ONE_THIRD = 0.5
+        self.assertEqual(0.5, sys.modules[self.name].ONE_THIRD)
+        del module.ONE_THIRD
+        self.assertRaises(AttributeError, getattr, module, 'ONE_THIRD')
+
+if __name__ == '__main__':
+    unittest.main()
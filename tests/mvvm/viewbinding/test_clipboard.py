@@ -0,0 +1,21 @@
+from __future__ import absolute_import
+import unittest
+
+import mvvm.viewbinding.clipboard as subject
+
+
+class TestClipboard(unittest.TestCase):
+    def test_parse_tsv(self):
+        self.assertEqual([[u'Sven', u'37.10'], [u'Ireen', u'']],
+                         subject.parse_tsv(u'Sven\t37.10\r\nIreen\t\r\n'))
+        self.assertEqual([[u'W\xfcst\nIreen', u'a\tb'], [u'']],
+                         subject.parse_tsv(u'"W\xfcst\nIreen"\t"a\tb"\n\n'))
+        self.assertEqual([], subject.parse_tsv(u''))
+
+    def test_text_to_bool(self):
+        self.assertTrue(subject.text_to_bool(u' Yes'))
+        self.assertFalse(subject.text_to_bool(u''))
+        self.assertRaises(ValueError, subject.text_to_bool, u'maybe')
+
+if __name__ == '__main__':
+    unittest.main()
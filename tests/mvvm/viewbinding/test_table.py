@@ -1,15 +1,56 @@
 from __future__ import absolute_import
+import os
+import shutil
+import tempfile
 import unittest
 import mock
 import wx
 
 import traits.api as traits
 from traits.trait_notifiers import set_ui_handler
+from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import orm
 
+from mvvm.viewmodel.filtering import FilteredSortedView
+from mvvm.viewmodel.generic import QueryList
 import mvvm.viewmodel.table as subject
+from mvvm.viewmodel.wrapper import unwrap
 
 set_ui_handler( wx.CallAfter )
 
+Base = declarative_base()
+
+
+class Skater(Base):
+    __tablename__ = 'skater'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50))
+    laps = Column(Integer)
+    version = Column(Integer)
+
+
+class SkaterList(QueryList):
+    Model = Skater
+
+    def create_query(self):
+        return orm.Query(Skater).order_by(Skater.id)
+
+
+class LapsList(SkaterList):
+    def create_query(self):
+        return orm.Query(Skater).order_by(Skater.laps)
+
+
+class WatermarkList(LapsList):
+    watermark = 'version'
+
+
+class ProjectedSkaterList(SkaterList):
+    projection = True
+    mapping = [mock.Mock(attribute='name'), mock.Mock(attribute='laps')]
+
+
 class TestListTable(unittest.TestCase):
     class TItem(traits.HasTraits):
         value = traits.Str()
@@ -58,5 +99,413 @@ class TestListTable(unittest.TestCase):
         row.value = 'Row 1 - changed'
         self.assert_(table.ResetView.called or table.UpdateValues.called)
 
+    def test_columnar_items(self):
+        trait = self.TList(objects=[self.TItem(value='Row 1')])
+        table = subject.ColumnarListTable(
+            (trait, 'objects'), mapping=[mock.Mock(attribute='value')])
+        table.UpdateValues = mock.MagicMock()
+        table.ResetView = mock.MagicMock()
+        self.assertEqual(u'Row 1', table.GetValue(0, 0))
+        store = table._store
+
+        trait.objects.append(self.TItem(value='Row 2'))
+        trait.objects.pop(0)
+        # Updated, not rebuilt
+        self.assertIs(store, table._store)
+        self.assertEqual(1, table.GetNumberRows())
+        self.assertEqual(u'Row 2', table.GetValue(0, 0))
+
+    def test_export(self):
+        trait = self.TList(objects=[self.TItem(value='Row %d' % idx)
+                                    for idx in range(5)])
+        table = subject.ListTable(
+            (trait, 'objects'),
+            mapping=[mock.Mock(attribute='value', label='Value')])
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'rows.csv')
+        # Values are read on the UI thread, a chunk per event.
+        with mock.patch('wx.CallAfter',
+                        side_effect=lambda func, *args: func(*args)):
+            export = table.export(path, chunk_size=2)
+            export.wait()
+        self.assertIsNone(export.error)
+        self.assertEqual(5, export.count)
+        with open(path) as f:
+            self.assertEqual(['Value'] + ['Row %d' % idx for idx in range(5)],
+                             f.read().splitlines())
+
+    def test_paste(self):
+        class TItem(self.TItem):
+            has_changes = True
+
+        class TList(self.TList):
+            def objects_create(self):
+                return TItem()
+
+        trait = TList(objects=[TItem(value='Row 1')])
+        table = subject.ListTable((trait, 'objects'),
+                                  mapping=[mock.Mock(attribute='value')])
+        table.UpdateValues = mock.MagicMock()
+        table.ResetView = mock.MagicMock()
+
+        self.assert_(table.paste(0, 0, [['Row A'], ['Row B'], ['Row C']]))
+        self.assertEqual(['Row A', 'Row B', 'Row C'],
+                         [table.GetRow(idx).value for idx in range(3)])
+        self.assertEqual(1, table.ResetView.call_count)
+
+        table.saver = mock.MagicMock(return_value=True)
+        table.deleter = mock.MagicMock(return_value=True)
+        self.assert_(table.SaveGrid())
+        saved, = table.saver.call_args[0]
+        self.assertEqual(['Row A', 'Row B', 'Row C'],
+                         sorted(row.value for row in saved))
+        self.assertEqual(['Row A', 'Row B', 'Row C'],
+                         [row.value for row in trait.objects])
+        self.assertEqual(3, table.GetNumberRows())
+
+    def test_paste_dotted(self):
+        class TItem(self.TItem):
+            has_changes = True
+
+        trait = self.TList(objects=[TItem(value='Row 1')])
+        table = subject.ListTable((trait, 'objects'), mapping=[
+            mock.Mock(attribute='value'), mock.Mock(attribute='owner.value')])
+        table.UpdateValues = mock.MagicMock()
+        table.ResetView = mock.MagicMock()
+        table.saver = mock.MagicMock(return_value=True)
+
+        # Related objects are read-only, their values are skipped.
+        self.assert_(table.paste(0, 0, [['Row A', 'Owner']]))
+        self.assertEqual('Row A', table.GetRow(0).value)
+        self.assertRaises(ValueError, table.SetValueAsObject, 0, 1, 'Owner')
+
+
+class TestViewportListTable(unittest.TestCase):
+    class TItem(traits.HasTraits):
+        value = traits.Str()
+
+    class TList(traits.HasTraits):
+        objects = traits.List(traits.HasTraits)
+
+    def create(self, values, view=None):
+        trait = self.TList(objects=[self.TItem(value=value)
+                                    for value in values])
+        table = subject.ListTable((trait, 'objects'),
+                                  mapping=[mock.Mock(attribute='value')],
+                                  view=view, listen='viewport')
+        table.UpdateValues = mock.MagicMock()
+        table.ResetView = mock.MagicMock()
+        return trait, table
+
+    def test_get_row(self):
+        trait, table = self.create(['Row 1', 'Row 2'])
+        row = trait.objects[0]
+        row.value = 'Row 1 - unseen'
+        self.assertFalse(table.UpdateValues.called)
+
+        self.assertIs(row, table.GetRow(0))
+        row.value = 'Row 1 - changed'
+        self.assert_(table.UpdateValues.called)
+        table.UpdateValues.reset_mock()
+        trait.objects[1].value = 'Row 2 - unseen'
+        self.assertFalse(table.UpdateValues.called)
+
+    def test_max_listened(self):
+        trait, table = self.create(['Row 1', 'Row 2', 'Row 3'])
+        table.max_listened = 2
+        for row_idx in range(3):
+            table.GetRow(row_idx)
+        self.assertEqual([id(row) for row in trait.objects[1:]],
+                         list(table._listened))
+        trait.objects[0].value = 'Row 1 - unseen'
+        self.assertFalse(table.UpdateValues.called)
+        trait.objects[2].value = 'Row 3 - changed'
+        self.assert_(table.UpdateValues.called)
+
+    def test_removed(self):
+        trait, table = self.create(['Row 1', 'Row 2'])
+        row = table.GetRow(0)
+        trait.objects.remove(row)
+        self.assertNotIn(id(row), table._listened)
+        table.UpdateValues.reset_mock()
+        table.ResetView.reset_mock()
+        row.value = 'Row 1 - unseen'
+        self.assertFalse(table.UpdateValues.called)
+        self.assertFalse(table.ResetView.called)
+
+    def test_validate(self):
+        view = FilteredSortedView(predicate=lambda obj: 'hidden' not in
+                                  obj.value)
+        trait, table = self.create(['Row 1', 'Row 2'], view)
+        trait.objects[0].value = 'Row 1 - hidden'
+        with mock.patch('wx.CallAfter') as call_after:
+            table.GetRow(0)
+        call_after.assert_called_once_with(table.reindex)
+        table.reindex()
+        self.assertEqual(['Row 2'], [table.GetRow(0).value])
+
+    def test_revalidate(self):
+        view = FilteredSortedView(predicate=lambda obj: 'hidden' not in
+                                  obj.value)
+        trait, table = self.create(['Row 1', 'Row 2 - hidden'], view)
+        self.assertEqual(1, table.GetNumberRows())
+        # Hidden rows are never requested, but are checked when the list
+        # changes.
+        trait.objects[1].value = 'Row 2'
+        trait.objects.append(self.TItem(value='Row 3'))
+        self.assertEqual(['Row 1', 'Row 2', 'Row 3'],
+                         [table.GetRow(idx).value for idx in range(3)])
+
+
+class TestQueryTable(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = orm.sessionmaker(bind=engine)()
+        self.session.add_all([Skater(id=idx, name='Skater %02d' % idx,
+                                     laps=idx, version=1)
+                              for idx in range(30)])
+        self.session.commit()
+        patcher = mock.patch('wx.GetApp')
+        patcher.start().return_value.session = self.session
+        self.addCleanup(patcher.stop)
+
+    def create_table(self, cls=SkaterList):
+        view_model = cls()
+        table = view_model.objects_table
+        table.grid = mock.MagicMock()
+        table.grid.GetNumberRows.return_value = 0
+        table.grid.GetNumberCols.return_value = 0
+        return view_model, table
+
+    def update(self, skater_id, **values):
+        """Change a skater like another user would, bypassing the table."""
+        self.session.execute(Skater.__table__.update().where(
+            Skater.__table__.c.id == skater_id).values(**values))
+        self.session.commit()
+
+    def ids(self, table, start=0, stop=None):
+        stop = table.GetNumberRows() if stop is None else stop
+        return [table.GetRow(row_idx).id for row_idx in range(start, stop)]
+
+    def test_save_deleted(self):
+        view_model, table = self.create_table()
+        rows = [table.GetRow(row_idx) for row_idx in range(10)]
+        table.DeleteRows([2, 3])
+        self.assertEqual(28, table.GetNumberRows())
+        # `QueryList.objects_delete` forgets the deleted rows itself.
+        self.assert_(table.SaveGrid())
+        self.assertEqual(28, table.GetNumberRows())
+        self.assertEqual(28, self.session.query(Skater).count())
+        self.assertIs(rows[4], table.GetRow(2))
+        self.assertEqual([0, 1] + list(range(4, 30)), self.ids(table))
+
+        # A deleter which only deletes.
+        table.deleter = view_model._objects_do_delete
+        table.DeleteRows([0])
+        self.assert_(table.SaveGrid())
+        self.assertEqual(27, table.GetNumberRows())
+        self.assertIs(rows[4], table.GetRow(1))
+        self.assertEqual([1] + list(range(4, 30)), self.ids(table))
+
+    def test_forget_rows(self):
+        view_model, table = self.create_table()
+        rows = [table.GetRow(row_idx) for row_idx in range(30)]
+        self.session.query(Skater).filter(Skater.id.in_([3, 10])).delete(
+            synchronize_session=False)
+        self.session.commit()
+        table.forget_rows([10, 3, 3])
+        self.assertEqual(28, table.GetNumberRows())
+        # Rows below the deleted rows moved up, without being fetched.
+        self.assertEqual(list(range(28)), sorted(table._cache.rows))
+        self.assertIs(rows[2], table.GetRow(2))
+        self.assertIs(rows[4], table.GetRow(3))
+        self.assertIs(rows[11], table.GetRow(9))
+        self.assertIs(rows[29], table.GetRow(27))
+
+    def test_remap_rows(self):
+        view_model, table = self.create_table(LapsList)
+        rows = [table.GetRow(row_idx) for row_idx in range(30)]
+        table._remap_rows(lambda row_idx: row_idx + 1 if row_idx < 5
+                          else None)
+        self.assertEqual([1, 2, 3, 4, 5], sorted(table._cache.rows))
+        self.assertIs(rows[0], table._cache.rows[1])
+        # The ORDER BY values of dropped rows are forgotten as well.
+        self.assertEqual(set(id(row) for row in rows[:5]),
+                         set(table._order_keys))
+
+    def test_reorder_saved(self):
+        view_model, table = self.create_table(LapsList)
+        rows = [table.GetRow(row_idx) for row_idx in range(30)]
+
+        # Not ordered by the name
+        rows[5].name = 'Renamed'
+        self.assert_(table.SaveGrid())
+        self.assertEqual(list(range(30)), sorted(table._cache.rows))
+
+        # Moving down drops the rows from its old position onwards.
+        rows[5].laps = 100
+        self.assert_(table.SaveGrid())
+        self.assertEqual(list(range(5)), sorted(table._cache.rows))
+        self.assertEqual(list(range(5)) + list(range(6, 30)) + [5],
+                         self.ids(table))
+
+        # Moving up drops the rows up to its old position.
+        rows = [table.GetRow(row_idx) for row_idx in range(30)]
+        rows[20].laps = -1
+        self.assert_(table.SaveGrid())
+        self.assertEqual(list(range(21, 30)), sorted(table._cache.rows))
+        self.assertIs(rows[21], table.GetRow(21))
+        self.assertEqual([21] + list(range(5)) + list(range(6, 21)) +
+                         list(range(22, 30)) + [5], self.ids(table))
+
+        # Where NULLs are placed is unknown, all rows are dropped.
+        rows = [table.GetRow(row_idx) for row_idx in range(30)]
+        rows[0].laps = None
+        self.assert_(table.SaveGrid())
+        self.assertEqual({}, table._cache.rows)
+
+    def test_assert_in_cache(self):
+        view_model, table = self.create_table()
+        table.page_size = 5
+        # Not adapted by fetching fewer rows
+        table.min_page_size = 100
+        fetch = table._fetch = mock.Mock(wraps=table._fetch)
+        self.assertEqual(10, table.GetRow(10).id)
+        self.assertEqual(16, table.GetRow(16).id)
+        # Only the gaps between cached rows are fetched, up to a page on
+        # either side.
+        self.assertEqual(3, table.GetRow(3).id)
+        self.assertEqual(24, table.GetRow(24).id)
+        self.assertEqual(4, table.GetRow(4).id)
+        self.assertEqual([mock.call(5, 15), mock.call(15, 21),
+                          mock.call(0, 5), mock.call(21, 29)],
+                         fetch.call_args_list)
+
+    def test_gaps(self):
+        view_model, table = self.create_table()
+        table._fetch(2, 4)
+        table._fetch(6, 7)
+        self.assertEqual([(0, 2), (4, 6), (7, 10)], list(table._gaps(0, 10)))
+        self.assertEqual([(4, 6)], list(table._gaps(3, 7)))
+        self.assertEqual([], list(table._gaps(2, 4)))
+
+    def test_adapt_page_size(self):
+        view_model, table = self.create_table()
+        table.fetch_time = 0.5
+        # Dominated by the latency of the query
+        table._adapt_page_size(5, 1.0)
+        self.assertEqual(50, table.page_size)
+        table._adapt_page_size(100, 1.0)
+        self.assertEqual(50, table.page_size)
+        # Averaged with the previous fetches
+        table._adapt_page_size(100, 3.0)
+        self.assertEqual(25, table.page_size)
+
+        table._row_seconds = None
+        table._adapt_page_size(100, 100.0)
+        self.assertEqual(table.min_page_size, table.page_size)
+        table._viewport_rows = 40
+        table._adapt_page_size(100, 100.0)
+        self.assertEqual(40, table.page_size)
+        table._row_seconds = None
+        table._adapt_page_size(100000, 0.001)
+        self.assertEqual(table.max_page_size, table.page_size)
+
+    def test_prefetch(self):
+        view_model, table = self.create_table()
+        table.page_size = 10
+        table.min_page_size = 5
+        table._adapt_page_size = mock.Mock()
+        fetch = table._fetch = mock.Mock(wraps=table._fetch)
+
+        # Gaps close together are fetched at once, refetching the rows in
+        # between, the range is widened to whole pages.
+        table._fetch(12, 14)
+        fetch.reset_mock()
+        table.prefetch(11, 15)
+        self.assertEqual([mock.call(10, 20)], fetch.call_args_list)
+        self.assertEqual(4, table._viewport_rows)
+
+        table.reload()
+        table._fetch(3, 10)
+        fetch.reset_mock()
+        table.prefetch(0, 20)
+        self.assertEqual([mock.call(0, 3), mock.call(10, 20)],
+                         fetch.call_args_list)
+        self.assertEqual(20, table._viewport_rows)
+
+        fetch.reset_mock()
+        table.prefetch(5, 5)
+        table.prefetch(0, 20)
+        self.assertFalse(fetch.called)
+        self.assertEqual(list(range(20)), self.ids(table, 0, 20))
+
+    def test_refresh(self):
+        view_model, table = self.create_table(WatermarkList)
+        rows = [table.GetRow(row_idx) for row_idx in range(30)]
+        self.assertEqual(0, table.refresh())
+
+        # Updated in place
+        self.update(7, name='Changed', version=2)
+        self.assertEqual(1, table.refresh())
+        self.assertEqual(list(range(30)), sorted(table._cache.rows))
+        self.assertIs(rows[7], table.GetRow(7))
+        self.assertEqual('Changed', table.GetRow(7).name)
+        # Rows at the watermark are queried again, but did not change.
+        self.assertEqual(0, table.refresh())
+
+        # Moved down by its new ORDER BY value
+        self.update(3, laps=100, version=3)
+        self.assertEqual(1, table.refresh())
+        self.assertEqual([0, 1, 2], sorted(table._cache.rows))
+        self.assertEqual([0, 1, 2] + list(range(4, 30)) + [3],
+                         self.ids(table))
+
+        # Added by another user
+        self.session.execute(Skater.__table__.insert().values(
+            id=30, name='Skater 30', laps=30, version=4))
+        self.session.commit()
+        self.assertEqual(1, table.refresh())
+        self.assertEqual({}, table._cache.rows)
+        self.assertEqual(31, table.GetNumberRows())
+
+        # Skipped while rows have unsaved changes
+        table.GetRow(0).name = 'Unsaved'
+        self.update(5, laps=50, version=5)
+        self.assertEqual(0, table.refresh())
+
+    def test_refresh_reload(self):
+        view_model, table = self.create_table()
+        table.GetRow(0)
+        self.update(0, name='Changed')
+        # Without a watermark all rows are reloaded.
+        self.assertEqual(30, table.refresh())
+        self.assertEqual({}, table._cache.rows)
+        self.assertEqual('Changed', table.GetRow(0).name)
+
+    def test_reposition(self):
+        view_model, table = self.create_table(LapsList)
+        rows = [table.GetRow(row_idx) for row_idx in range(30)]
+        unwrap(rows[5]).laps = 100
+        table._reposition([unwrap(rows[5])])
+        self.assertEqual(list(range(5)), sorted(table._cache.rows))
+
+        # The previous position of a row which was not cached is unknown.
+        unwrap(rows[10]).laps = 0
+        table._reposition([unwrap(rows[10])])
+        self.assertEqual({}, table._cache.rows)
+
+    def test_projected_fetch(self):
+        view_model, table = self.create_table(ProjectedSkaterList)
+        table.UpdateValues = mock.MagicMock()
+        table.page_size = 5
+        # Fetching while the grid draws does not make it draw again.
+        self.assertEqual(u'Skater 03', table.GetValue(3, 0))
+        self.assertEqual(u'29', table.GetValue(29, 1))
+        self.assertEqual(14, len(table._store))
+        self.assertFalse(table.UpdateValues.called)
+
 if __name__ == '__main__':
     unittest.main()
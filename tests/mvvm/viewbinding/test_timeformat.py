@@ -0,0 +1,32 @@
+from __future__ import absolute_import
+from decimal import Decimal
+import unittest
+
+import mvvm.viewbinding.timeformat as subject
+
+
+class TestTimeFormat(unittest.TestCase):
+    def test_text_to_time(self):
+        self.assertEqual(Decimal('83.456'), subject.text_to_time('1:23.456'))
+        self.assertEqual(Decimal('83.456'), subject.text_to_time('0123456'))
+        self.assertEqual(Decimal('83.4'), subject.text_to_time('01 23 4'))
+        self.assertEqual(Decimal('23.45'), subject.text_to_time('23.45'))
+        self.assertEqual('23.45', str(subject.text_to_time('23.45')))
+        self.assertIsNone(subject.text_to_time(''))
+        self.assertIsNone(subject.text_to_time('1:2'))
+        self.assertIsNone(subject.text_to_time('abc'))
+
+    def test_time_to_text(self):
+        self.assertEqual('01:23.456', subject.time_to_text(Decimal('83.456')))
+        self.assertEqual('', subject.time_to_text(None))
+        value = Decimal('83.456')
+        self.assertEqual(value, subject.text_to_time(subject.time_to_text(value)))
+
+    def test_is_partial_time(self):
+        for text in ('', '1', '01:', '01:2', '01:23.', '01:23.45', '0123456'):
+            self.assert_(subject.is_partial_time(text), text)
+        for text in ('a', '01::', '01:23.4567', '01234567', '1:23.4x'):
+            self.assertFalse(subject.is_partial_time(text), text)
+
+if __name__ == '__main__':
+    unittest.main()
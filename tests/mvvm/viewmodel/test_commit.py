@@ -0,0 +1,129 @@
+from __future__ import absolute_import
+import os
+import tempfile
+import threading
+import unittest
+
+import mock
+from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+import mvvm.viewmodel.commit as subject
+
+Base = declarative_base()
+
+
+class Skater(Base):
+    __tablename__ = 'skater'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), nullable=False)
+    laps = Column(Integer)
+
+
+class TestCommitPipeline(unittest.TestCase):
+    def setUp(self):
+        # A file, so the writer thread has a connection of its own.
+        fd, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        engine = create_engine('sqlite:///%s' % path)
+        self.addCleanup(engine.dispose)
+        Base.metadata.create_all(engine)
+        self.Session = sessionmaker(bind=engine)
+        self.session = self.Session()
+        self.session.add_all([Skater(id=1, name='Arie', laps=10),
+                              Skater(id=2, name='Bouke', laps=20)])
+        self.session.commit()
+        self.arie, self.bouke = \
+            self.session.query(Skater).order_by(Skater.id).all()
+
+        # The writer waits for `started`, so submits can be queued first.
+        self.started = threading.Event()
+
+        def session_factory():
+            self.started.wait()
+            return self.Session()
+        self.pipeline = subject.CommitPipeline(session_factory)
+        self.addCleanup(self.pipeline.stop)
+        self.addCleanup(self.started.set)
+
+        # Calls to the UI thread are made by `run_ui`.
+        self.calls = []
+        for name, side_effect in [
+                ('wx.CallAfter', lambda *args: self.calls.append(args)),
+                ('wx.GetApp', None)]:
+            patcher = mock.patch(name, side_effect=side_effect)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(subject.pub, 'sendMessage')
+        self.send_message = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_ui(self):
+        calls, self.calls = self.calls, []
+        for call in calls:
+            call[0](*call[1:])
+
+    def committed(self, identity):
+        session = self.Session()
+        try:
+            obj = session.query(Skater).get(identity)
+            return obj.name, obj.laps
+        finally:
+            session.close()
+
+    def test_coalesce(self):
+        write = self.pipeline._write = mock.Mock(wraps=self.pipeline._write)
+        self.arie.name = 'Ard'
+        self.assert_(self.pipeline.submit(self.arie))
+        self.arie.laps = 11
+        self.assert_(self.pipeline.submit(self.arie))
+        self.started.set()
+        self.pipeline.wait()
+        self.assertEqual(1, write.call_count)
+        self.assertEqual(('Ard', 11), self.committed(1))
+        # Applied as committed, so the UI session has nothing to write.
+        self.assertFalse(self.session.is_modified(self.arie))
+
+    def test_failure(self):
+        self.arie.name = None
+        self.arie.laps = 12
+        self.assert_(self.pipeline.submit(self.arie))
+        self.assertEqual(None, self.arie.name)
+        self.started.set()
+        self.pipeline.wait()
+        self.assertEqual(('Arie', 10), self.committed(1))
+        self.assertFalse(self.send_message.called)
+
+        self.run_ui()
+        self.assertEqual(('Arie', 10), (self.arie.name, self.arie.laps))
+        self.assertEqual('error.database', self.send_message.call_args[0][0])
+
+    def test_stop(self):
+        self.arie.laps = 13
+        self.bouke.laps = 23
+        self.assert_(self.pipeline.submit(self.arie))
+        self.assert_(self.pipeline.submit(self.bouke))
+        self.started.set()
+        self.pipeline.stop()
+        self.assertIsNone(self.pipeline._thread)
+        self.assertEqual(('Arie', 13), self.committed(1))
+        self.assertEqual(('Bouke', 23), self.committed(2))
+
+        # Started again by the next submit.
+        self.arie.laps = 14
+        self.assert_(self.pipeline.submit(self.arie))
+        self.pipeline.wait()
+        self.assertEqual(('Arie', 14), self.committed(1))
+
+    def test_atexit(self):
+        with mock.patch('atexit.register') as register:
+            pipeline = subject.CommitPipeline(self.Session)
+        register.assert_called_once_with(pipeline.stop)
+
+    def test_new(self):
+        self.assertFalse(self.pipeline.submit(Skater(name='Corry')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import mvvm.viewmodel.export as subject
+
+
+class Column(object):
+    def __init__(self, attribute, label):
+        self.attribute = attribute
+        self.label = label
+
+
+class Skater(object):
+    def __init__(self, name, time):
+        self.name = name
+        self.time = time
+
+    def get_time_display(self, value):
+        return None if value is None else u'%.2f' % value
+
+
+class TestExport(unittest.TestCase):
+    mapping = [Column('name', u'Name'), Column('time', u'Time')]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'skaters.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_csv(self):
+        skaters = [Skater(u'Sven', 37.1), Skater(u'W\xfcst, Ireen', None)]
+        export = subject.Export(lambda: iter(skaters), self.mapping,
+                                self.path).start()
+        export.wait()
+        self.assertIsNone(export.error)
+        self.assertEqual(2, export.count)
+        with io.open(self.path, encoding='utf-8', newline='') as f:
+            self.assertEqual(u'Name,Time\r\nSven,37.10\r\n'
+                             u'"W\xfcst, Ireen",\r\n', f.read())
+
+    def test_formatted(self):
+        export = subject.Export(lambda: iter([[u'Sven', u'37.10']]),
+                                self.mapping, self.path,
+                                formatted=True).start()
+        export.wait()
+        self.assertIsNone(export.error)
+        with io.open(self.path, encoding='utf-8', newline='') as f:
+            self.assertEqual(u'Name,Time\r\nSven,37.10\r\n', f.read())
+
+    def test_error(self):
+        def rows():
+            yield Skater(u'Sven', 37.1)
+            raise ValueError('connection lost')
+        export = subject.Export(rows, self.mapping, self.path).start()
+        export.wait()
+        self.assertIsInstance(export.error, ValueError)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_format(self):
+        self.assertRaises(ValueError, subject.Export, list, self.mapping,
+                          'skaters.pdf')
+
+if __name__ == '__main__':
+    unittest.main()
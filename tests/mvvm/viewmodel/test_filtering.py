@@ -0,0 +1,100 @@
+from __future__ import absolute_import
+import unittest
+
+import mvvm.viewmodel.filtering as subject
+
+
+class Skater(object):
+    def __init__(self, name, time=None):
+        self.name = name
+        self.time = time
+
+    def __repr__(self):
+        return self.name
+
+
+class TestFilteredSortedView(unittest.TestCase):
+    def setUp(self):
+        self.a = Skater('Arie', 38.5)
+        self.b = Skater('Bouke', 36.0)
+        self.c = Skater('Corry', None)
+        self.source = [self.a, self.b, self.c]
+
+    def test_unsorted(self):
+        view = subject.FilteredSortedView(self.source)
+        self.assertEqual(self.source, view.rows)
+
+        view.set_filter(lambda obj: 'r' in obj.name)
+        self.assertEqual([self.a, self.c], view.rows)
+
+        d = Skater('Dries')
+        self.source.insert(0, d)
+        view.added([d])
+        self.assertEqual([d, self.a, self.c], view.rows)
+
+        self.source.remove(self.a)
+        view.removed([self.a])
+        self.assertEqual([d, self.c], list(view))
+
+        self.c.name = 'Cor'
+        self.assertFalse(view.changed(self.c))
+        self.c.name = 'Cees'
+        self.assertTrue(view.changed(self.c))
+        self.assertEqual([d], view.rows)
+        self.assertNotIn(self.c, view)
+
+    def test_sorted(self):
+        view = subject.FilteredSortedView(
+            self.source, key=subject.attribute_key('time'))
+        self.assertEqual([self.c, self.b, self.a], view.rows)
+
+        d = Skater('Dries', 37.0)
+        self.source.append(d)
+        view.added([d])
+        self.assertEqual([self.c, self.b, d, self.a], view.rows)
+
+        self.b.time = 39.0
+        self.assertTrue(view.changed(self.b))
+        self.assertEqual([self.c, d, self.a, self.b], view.rows)
+        self.b.name = 'Bauke'
+        self.assertFalse(view.changed(self.b))
+
+        view.set_sort(subject.attribute_key('name'), reverse=True)
+        self.assertEqual([d, self.c, self.b, self.a], view.rows)
+
+    def test_narrowing(self):
+        calls = []
+
+        def contains(text):
+            def predicate(obj):
+                calls.append(obj)
+                return text in obj.name.lower()
+            return predicate
+
+        view = subject.FilteredSortedView(self.source)
+        view.set_filter(contains('r'))
+        self.assertEqual(3, len(calls))
+        del calls[:]
+        view.set_filter(contains('ri'), narrowing=True)
+        self.assertEqual([self.a], view.rows)
+        self.assertEqual(2, len(calls))
+        view.set_filter(None)
+        self.assertEqual(3, len(view))
+
+    def test_narrowing_sorted(self):
+        view = subject.FilteredSortedView(
+            self.source, key=subject.attribute_key('time'))
+        view.set_filter(lambda obj: 'r' in obj.name.lower())
+        view.set_filter(lambda obj: 'ri' in obj.name.lower(), narrowing=True)
+        self.assertEqual([self.a], view.rows)
+        # The sorted objects stay consistent for incremental updates.
+        d = Skater('Dries', 37.0)
+        self.source.append(d)
+        view.added([d])
+        self.assertEqual([d, self.a], view.rows)
+        self.a.time = 36.0
+        self.assertTrue(view.changed(self.a))
+        self.assertEqual([self.a, d], view.rows)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+from __future__ import absolute_import
+import random
+import unittest
+
+import mvvm.viewmodel.overlay as subject
+
+
+class TestEditOverlay(unittest.TestCase):
+    def assertRows(self, expected, overlay):
+        self.assertEqual(len(expected), len(overlay))
+        for row_idx, row in enumerate(expected):
+            if isinstance(row, int):
+                self.assertEqual((row, None), overlay.source(row_idx))
+                self.assertEqual(row_idx, overlay.index(row))
+            else:
+                self.assertEqual((None, row), overlay.source(row_idx))
+                self.assertEqual(row_idx, overlay.index_of(row))
+
+    def test_edits(self):
+        overlay = subject.EditOverlay(5)
+        self.assertFalse(overlay.changed)
+        overlay.insert(2, 'a')
+        overlay.insert(2, 'b')
+        overlay.insert(7, 'c')
+        self.assertEqual('d', overlay.delete(4, 'd'))
+        self.assertRows([0, 1, 'b', 'a', 3, 4, 'c'], overlay)
+        self.assertIsNone(overlay.index(2))
+        self.assertEqual(['b', 'a', 'c'], overlay.inserted)
+        self.assertEqual(['d'], overlay.deleted)
+        self.assertEqual(3, overlay.offset_at(2))
+
+        self.assertEqual('a', overlay.delete(3))
+        overlay.remove_offsets([0, 2])
+        self.assertRows([0, 'b', 1, 2, 'c'], overlay)
+        self.assertEqual([], overlay.deleted)
+
+        overlay.clear(2)
+        self.assertRows([0, 1], overlay)
+
+    def test_merge(self):
+        overlay = subject.EditOverlay(3)
+        overlay.insert(1, 'a')
+        overlay.insert(4, 'b')
+        overlay.delete(0, 'c')
+        self.assertEqual('a', overlay.merge(0))
+        self.assertRows([1, 2, 3, 'b'], overlay)
+        self.assertEqual(['b'], overlay.inserted)
+        self.assertEqual(['c'], overlay.deleted)
+        self.assertEqual(4, overlay.num_rows)
+        self.assertEqual('b', overlay.merge(3))
+        self.assertRows([1, 2, 3, 4], overlay)
+        self.assertRaises(IndexError, overlay.merge, 0)
+
+    def test_random(self):
+        rand = random.Random(0)
+        overlay = subject.EditOverlay(50)
+        expected = list(range(50))
+        for step in range(200):
+            row_idx = rand.randrange(len(expected) + 1)
+            if rand.random() < 0.5 or row_idx == len(expected):
+                row = 'new %d' % step
+                overlay.insert(row_idx, row)
+                expected.insert(row_idx, row)
+            else:
+                overlay.delete(row_idx, expected[row_idx])
+                del expected[row_idx]
+        self.assertRows(expected, overlay)
+
+if __name__ == '__main__':
+    unittest.main()
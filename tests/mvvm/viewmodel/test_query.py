@@ -0,0 +1,87 @@
+from __future__ import absolute_import
+import unittest
+
+from sqlalchemy import create_engine, Column, ForeignKey, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship, sessionmaker
+
+import mvvm.viewmodel.query as subject
+
+Base = declarative_base()
+
+
+class Country(Base):
+    __tablename__ = 'country'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50))
+
+
+class Skater(Base):
+    __tablename__ = 'skater'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50))
+    laps = Column(Integer)
+    country_id = Column(Integer, ForeignKey('country.id'))
+    country = relationship(Country, backref='skaters')
+
+
+class TestAggregateQuery(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        ned = Country(name='Netherlands')
+        self.session.add_all([
+            Skater(name='Arie', laps=10, country=ned),
+            Skater(name='Bouke', laps=30, country=ned),
+            Skater(name='Corry', laps=None),
+        ])
+        self.session.commit()
+
+    def test_aggregates(self):
+        query = self.session.query(Skater).order_by(Skater.name)
+        row = subject.aggregate_query(query, [
+            ('laps', 'sum'), ('id', 'count'), ('laps', 'avg'),
+            ('laps', 'min'), ('country.name', 'max')]).one()
+        self.assertEqual((40, 3, 40, 2, 10, 'Netherlands'), tuple(row))
+
+    def test_unknown(self):
+        query = self.session.query(Skater)
+        self.assertRaises(ValueError, subject.aggregate_query, query,
+                          [('laps', 'median')])
+
+    def test_membership(self):
+        query = self.session.query(Skater).filter(Skater.laps > 5)
+        marker = lambda: tuple(query.with_entities(
+            *subject.membership_columns(Skater)).one())
+        before = marker()
+        self.assertEqual(2, before[0])
+        arie, bouke, corry = self.session.query(Skater).order_by(Skater.id)
+        # One row leaves the result and another enters it
+        arie.laps, corry.laps = 1, 20
+        self.session.commit()
+        after = marker()
+        self.assertEqual(2, after[0])
+        self.assertNotEqual(before, after)
+
+    def test_eager_options(self):
+        self.assertEqual(1, len(subject.eager_options(
+            Skater, ['country', 'country.name', 'name'])))
+        options = subject.eager_options(Country, ['skaters.country.name'],
+                                        collections=False)
+        self.assertEqual(1, len(options))
+        countries = self.session.query(Country).options(*options)
+        self.assertEqual([2], [len(country.skaters)
+                               for country in countries.yield_per(1)])
+
+    def test_set_attribute(self):
+        arie = self.session.query(Skater).filter_by(name='Arie').one()
+        subject.set_attribute(arie, 'laps', 11)
+        self.assertEqual(11, arie.laps)
+        self.assertRaises(ValueError, subject.set_attribute, arie,
+                          'country.name', 'Norway')
+        self.assertEqual('Netherlands', arie.country.name)
+        self.assertFalse(self.session.is_modified(arie.country))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+from __future__ import absolute_import
+from decimal import Decimal
+import unittest
+
+import mvvm.viewmodel.rowstore as subject
+
+
+class TestRowStore(unittest.TestCase):
+    def test_store(self):
+        store = subject.RowStore(3)
+        store.add(100, (1, 'Bouke', 'NED'))
+        store.add(5, (2, 'Arie', 'NED'))
+        self.assertEqual(2, len(store))
+        self.assertIn(100, store)
+        self.assertNotIn(0, store)
+        self.assertEqual('Arie', store.get(5, 1))
+        self.assertEqual((1, 'Bouke', 'NED'), store.row(100))
+
+        store.set(100, 1, 'Botje')
+        self.assertEqual((1, 'Botje', 'NED'), store.row(100))
+        store.add(5, (2, 'Frida', 'NED'))
+        self.assertEqual('Frida', store.get(5, 1))
+        self.assertEqual(2, len(store.columns[0]))
+
+        self.assertEqual(5, store.find((2,)))
+        self.assertIsNone(store.find((3,)))
+
+        store.clear()
+        self.assertEqual(0, len(store))
+
+    def test_remap(self):
+        store = subject.RowStore(2)
+        for row_idx in range(5):
+            store.add(row_idx, (row_idx, 'Row %d' % row_idx))
+        store.remap(lambda row_idx: None if row_idx in (1, 3) else
+                    row_idx - (row_idx > 1) - (row_idx > 3))
+        self.assertEqual(3, len(store))
+        self.assertEqual(3, len(store.columns[0]))
+        self.assertEqual([(0, 'Row 0'), (2, 'Row 2'), (4, 'Row 4')],
+                         [store.row(row_idx) for row_idx in range(3)])
+        self.assertNotIsInstance(store.columns[0], list)
+        store.add(3, (5, 'Row 5'))
+        self.assertEqual((5, 'Row 5'), store.row(3))
+
+    def test_typed_columns(self):
+        store = subject.RowStore(3)
+        store.add(0, (1, 40.5, 'Bouke'))
+        store.add(1, (2, 38.25, 'Arie'))
+        self.assertNotIsInstance(store.columns[0], list)
+        self.assertNotIsInstance(store.columns[1], list)
+        self.assertIsInstance(store.columns[2], list)
+
+        store.set(0, 1, None)
+        self.assertIsInstance(store.columns[1], list)
+        self.assertEqual((1, None, 'Bouke'), store.row(0))
+        store.add(2, (True, 1.0, 'Frida'))
+        self.assertIs(True, store.get(2, 0))
+        store.add(3, (2**70, 1.0, 'Sven'))
+        self.assertEqual(2**70, store.get(3, 0))
+        self.assertEqual(2, store.get(1, 0))
+
+        store.clear()
+        store.add(0, ('x', 1, 1))
+        self.assertEqual(('x', 1, 1), store.row(0))
+
+    def test_view(self):
+        class Skater(object):
+            GENDERS = {'M': 'Male'}
+
+            def get_gender_display(self, value):
+                return self.GENDERS.get(value, value)
+
+            @property
+            def initial(self):
+                return self.first_name[0]
+
+            @classmethod
+            def genders(cls):
+                return sorted(cls.GENDERS)
+
+        store = subject.RowStore(3)
+        store.add(0, (1, 'M', 'Bouke'))
+        view = subject.RowView(store, 0, {'gender': 1}, Skater)
+        self.assertEqual('M', view.gender)
+        self.assertRaises(AttributeError, getattr, view, 'first_name')
+        self.assertEqual('Male', view.get_gender_display(view.gender))
+        self.assertEqual(['M'], view.genders())
+        self.assertRaises(AttributeError, getattr, view, 'initial')
+        view = subject.RowView(store, 0, {'first_name': 2}, Skater)
+        self.assertEqual('B', view.initial)
+
+class TestColumnStore(unittest.TestCase):
+    class Item(object):
+        def __init__(self, name, time):
+            self.name, self.time = name, time
+
+    def setUp(self):
+        self.items = [self.Item('Bouke', 40.5), self.Item('Arie', 38.25),
+                      self.Item('Frida', None), self.Item('Sven', 37.0)]
+        self.store = subject.ColumnStore(self.items, ['name', 'time'])
+
+    def test_get_set(self):
+        self.assertEqual('Arie', self.store.get(1, 0))
+        self.assertEqual(38.25, self.store.get(1, 1))
+        self.store.set(1, 0, 'Ard')
+        self.assertEqual('Ard', self.store.get(1, 0))
+
+        self.items[3].time = 36.5
+        self.assert_(self.store.update(self.items[3]))
+        self.assertEqual(36.5, self.store.get(3, 1))
+        self.assertFalse(self.store.update(self.Item('Jan', 1.0)))
+
+    def test_typed_column(self):
+        store = subject.ColumnStore(self.items, ['name', 'time'])
+        store.columns[1] = store._column([40.5, 38.25])
+        self.assertNotIsInstance(store.columns[1], list)
+        store.set(0, 1, None)
+        self.assertIsInstance(store.columns[1], list)
+        self.assertEqual([None, 38.25], store.columns[1])
+
+    def test_overflow(self):
+        items = [self.Item('Bouke', 2**70), self.Item('Arie', 1)]
+        store = subject.ColumnStore(items, ['time'])
+        self.assertEqual([2**70, 1], store.columns[0])
+        store = subject.ColumnStore(items[1:], ['time'])
+        store.append(items[:1])
+        self.assertEqual([1, 2**70], store.columns[0])
+
+        # Scaled Decimals too large for an integer column stay Decimals.
+        items = [self.Item('Bouke', Decimal('1.00') * 10**20)]
+        store = subject.ColumnStore(items, ['time'])
+        self.assertIsNone(store.exponents[0])
+        self.assertEqual(Decimal('1.00') * 10**20, store.get(0, 0))
+
+    def test_sync(self):
+        store = subject.ColumnStore(self.items[:2], ['name', 'time'])
+        store.set(0, 1, 41.0)
+        items = [self.Item('Jan', 39.5), self.items[0]]
+        store.sync(items)
+        self.assertEqual([self.items[0], items[0]], store.objects)
+        # Kept values are not read again
+        self.assertEqual(41.0, store.get(0, 1))
+        self.assertEqual(39.5, store.get(1, 1))
+        self.assertEqual(1, store.rows[id(items[0])])
+        self.assertNotIsInstance(store.columns[1], list)
+
+        store.append([self.items[2]])
+        self.assertIsInstance(store.columns[1], list)
+        self.assertEqual([41.0, 39.5, None], store.columns[1])
+        store.sync([])
+        self.assertEqual(0, len(store))
+
+    def test_decimal_column(self):
+        items = [self.Item('Bouke', Decimal('40.50')),
+                 self.Item('Arie', Decimal('38.25')),
+                 self.Item('Sven', Decimal('-37.00'))]
+        store = subject.ColumnStore(items, ['name', 'time'])
+        self.assertNotIsInstance(store.columns[1], list)
+        self.assertEqual(-2, store.exponents[1])
+        self.assertEqual('40.50', str(store.get(0, 1)))
+        self.assertEqual([2, 1, 0], store.sort(1))
+        self.assertEqual([1, 2], store.where(1, '<', Decimal('40.5')))
+        self.assertEqual([1, 2], store.where(1, '<=', Decimal('40.499')))
+        self.assertEqual([0], store.where(1, '>', 38.3))
+        self.assertEqual([], store.where(1, '==', Decimal('38.251')))
+        self.assertEqual([0, 1, 2], store.where(1, '!=', Decimal('38.251')))
+        self.assertEqual([1], store.where(1, '==', Decimal('38.25')))
+        self.assertEqual([0], store.where(
+            1, lambda time: str(time).endswith('.50'), None))
+        self.assertEqual(Decimal('41.75'), store.aggregate(1, 'sum'))
+        self.assertEqual(Decimal('-37.00'), store.aggregate(1, 'min'))
+        self.assertEqual(Decimal('39.375'),
+                         store.aggregate(1, 'mean', rows=[0, 1]))
+
+        store.set(2, 1, Decimal('37.10'))
+        self.assertNotIsInstance(store.columns[1], list)
+        self.assertEqual(Decimal('37.10'), store.get(2, 1))
+        store.set(2, 1, Decimal('37.1'))
+        self.assertIsInstance(store.columns[1], list)
+        self.assertEqual([Decimal('40.50'), Decimal('38.25'),
+                          Decimal('37.1')], store.columns[1])
+
+        store = subject.ColumnStore(items[:1], ['time'])
+        store.append([self.Item('Frida', Decimal('39.5'))])
+        self.assertEqual(['40.50', '39.5'], [str(store.get(idx, 0))
+                                             for idx in range(2)])
+
+    def test_sort(self):
+        self.assertEqual([2, 3, 1, 0], self.store.sort(1))
+        self.assertEqual([0, 1, 3, 2], self.store.sort(1, reverse=True))
+        self.assertEqual([1, 0, 2, 3], self.store.sort(0))
+        self.assertEqual([3, 1], self.store.sort(1, rows=[1, 3]))
+
+    def test_where(self):
+        self.assertEqual([1, 3], self.store.where(1, '<', 39))
+        self.assertEqual([0, 1, 3], self.store.where(
+            0, lambda name: 'e' in name.lower(), None))
+        self.assertEqual([3], self.store.where(1, '<', 38, rows=[0, 3]))
+
+    def test_aggregate(self):
+        self.assertEqual(3, self.store.aggregate(1, 'count'))
+        self.assertEqual(115.75, self.store.aggregate(1, 'sum'))
+        self.assertEqual(37.0, self.store.aggregate(1, 'min'))
+        self.assertEqual(39.375, self.store.aggregate(1, 'mean', rows=[0, 1]))
+        self.assertIsNone(self.store.aggregate(1, 'max', rows=[]))
+
+if __name__ == '__main__':
+    unittest.main()
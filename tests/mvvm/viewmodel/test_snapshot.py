@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import datetime
+import decimal
+import os
+import shutil
+import tempfile
+import unittest
+
+import mvvm.viewmodel.snapshot as subject
+
+
+class TestSnapshotCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = subject.SnapshotCache(self.directory, schema_version=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_roundtrip(self):
+        rows = [(1, u'Sven', 1.5, True, datetime.date(1986, 4, 2)),
+                (2, None, None, False, None),
+                (3, u'Ireen W\xfcst', -2.0, None, datetime.date(1986, 4, 1))]
+        self.cache.save('abc', rows, 5, (3, 3))
+        snapshot = self.cache.load('abc')
+        try:
+            self.assertEqual(3, len(snapshot))
+            self.assertEqual([3, 3], snapshot.marker)
+            self.assertEqual(rows, snapshot.rows(0, 10))
+            self.assertEqual(u'Ireen W\xfcst', snapshot.get(2, 1))
+            self.assertRaises(IndexError, snapshot.get, 3, 0)
+        finally:
+            snapshot.close()
+
+    def test_values(self):
+        D = decimal.Decimal
+        rows = [(datetime.datetime(2014, 3, 1, 12, 30, 5, 17),
+                 datetime.time(23, 59, 59, 999999), D('-12.50')),
+                (datetime.datetime(1, 1, 1), datetime.time(), None),
+                (None, None, D('0.00'))]
+        self.cache.save('abc', rows, 3, (3, 3))
+        snapshot = self.cache.load('abc')
+        try:
+            self.assertEqual(rows, snapshot.rows(0, 3))
+            self.assertEqual('-12.50', str(snapshot.get(0, 2)))
+        finally:
+            snapshot.close()
+
+        self.assertRaises(ValueError, self.cache.save, 'def',
+                          [(D('1.5'),), (D('1.25'),)], 1, (2, 2))
+        self.assertRaises(ValueError, self.cache.save, 'def',
+                          [(1,), (u'one',)], 1, (2, 2))
+        self.assertRaises(ValueError, self.cache.save, 'def',
+                          [(2**63,)], 1, (1, 1))
+        self.assertIsNone(self.cache.load('def'))
+
+    def test_mismatch(self):
+        self.cache.save('abc', [], 2, (0, None))
+        self.assertIsNone(self.cache.load('def'))
+        other = subject.SnapshotCache(self.directory, schema_version=3)
+        self.assertIsNone(other.load('abc'))
+
+        with open(self.cache.path('bad'), 'wb') as f:
+            f.write(b'garbage')
+        self.assertIsNone(self.cache.load('bad'))
+
+        self.cache.discard('abc')
+        self.assertFalse(os.path.exists(self.cache.path('abc')))
+        self.assertIsNone(self.cache.load('abc'))
+
+if __name__ == '__main__':
+    unittest.main()
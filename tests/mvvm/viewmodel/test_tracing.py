@@ -0,0 +1,76 @@
+from __future__ import absolute_import
+import unittest
+
+from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import text
+
+import mvvm.viewmodel.tracing as subject
+
+Base = declarative_base()
+
+
+class Skater(Base):
+    __tablename__ = 'skater'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50))
+
+
+class TestQueryTracer(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.Session = sessionmaker(bind=engine)
+        self.session = self.Session()
+        self.session.add_all([Skater(name='Arie'), Skater(name='Bouke')])
+        self.session.commit()
+        self.tracer = subject.QueryTracer(threshold=2)
+
+    def test_disabled(self):
+        self.assertIs(subject._null_scope, self.tracer.scope('SkaterList',
+                                                             'objects'))
+
+    def test_scope(self):
+        self.tracer.install(self.Session)
+        session = self.Session()
+        with self.tracer.scope('SkaterList', 'objects'):
+            skaters = session.query(Skater).all()
+            self.tracer.add_rows(len(skaters))
+        session.query(Skater).all()
+        stats = self.tracer.stats['SkaterList.objects']
+        self.assertEqual((1, 2), (stats['count'], stats['rows']))
+        self.assertEqual(1, self.tracer.stats['untagged']['count'])
+
+    def test_in_progress(self):
+        # The session of the UI thread usually is in a transaction already.
+        self.session.query(Skater).all()
+        self.tracer.install(self.session)
+        with self.tracer.scope('SkaterList', 'objects'):
+            self.session.query(Skater).all()
+        self.assertEqual(1, self.tracer.stats['SkaterList.objects']['count'])
+
+    def test_error(self):
+        self.tracer.install(self.session)
+        with self.tracer.scope('SkaterList', 'objects'):
+            self.assertRaises(OperationalError, self.session.execute,
+                              text('SELECT * FROM missing'))
+        self.session.rollback()
+        with self.tracer.scope('SkaterList', 'objects'):
+            self.session.query(Skater).all()
+        stats = self.tracer.stats['SkaterList.objects']
+        self.assertEqual(1, stats['count'])
+        self.assert_(0 <= stats['time'] < 1)
+
+    def test_n_plus_one(self):
+        self.tracer.install(self.session)
+        for skater_id in (1, 2):
+            with self.tracer.scope('SkaterList', 'GetValue', per_row=True):
+                self.session.query(Skater).get(skater_id)
+                self.session.expire_all()
+        (tag, _, count), = self.tracer.n_plus_one()
+        self.assertEqual(('SkaterList.GetValue', 2), (tag, count))
+
+if __name__ == '__main__':
+    unittest.main()
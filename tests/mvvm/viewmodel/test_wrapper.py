@@ -1,5 +1,7 @@
 from __future__ import absolute_import
+import gc
 import unittest
+import weakref
 
 import mock
 from sqlalchemy import event
@@ -80,5 +82,64 @@ class TestWrap(unittest.TestCase):
         self.assert_(checker.called)
         checker.reset_mock()
 
+
+class TestWrapAll(unittest.TestCase):
+    def test(self):
+        from sqlalchemy import Column, Integer
+        from sqlalchemy.ext.declarative import declarative_base
+
+        Base = declarative_base()
+
+        class Team(Base):
+            __tablename__ = 'team'
+            id = Column(Integer, primary_key=True)
+
+        self.assertEqual([Team], wrapper.mapped_classes(Base))
+        wrapper.wrap_all(Base, background=True).join()
+        self.assertIn(Team, wrapper.cached_classes[True])
+        self.assertIn(Team, wrapper.cached_classes[False])
+        self.assertIs(wrapper.cached_classes[False][Team],
+                      wrap_cls(Team, False))
+
+
+class TestChangeJournal(unittest.TestCase):
+    def test(self):
+        journal = wrapper.ChangeJournal()
+        bouke = journal.track(wrap(Skater(first_name='Bouke'), False))
+        arie = journal.track(wrap(Skater(first_name='Arie'), False))
+        frida = journal.track(wrap(Skater(first_name='Frida'), False))
+        untracked = wrap(Skater(first_name='Sven'), False)
+        arie.first_name = 'Aart'
+        bouke.first_name = 'Botje'
+        bouke.first_name = 'Boukje'
+        untracked.first_name = 'Ard'
+        self.assertEqual([arie, bouke], journal.dirty())
+        self.assertEqual([bouke], journal.dirty([bouke, frida]))
+        self.assertEqual({'first_name': 'Boukje'}, bouke.changes)
+
+        saver = mock.MagicMock(return_value=True)
+        self.assert_(journal.save(saver, batch_size=1))
+        self.assertEqual([mock.call([arie]), mock.call([bouke])],
+                         saver.call_args_list)
+
+        self.assertEqual(1, journal.undo())
+        self.assertEqual('Botje', bouke.first_name)
+        arie.changes.clear()
+        self.assertEqual(1, journal.undo(2))
+        self.assertEqual('Bouke', bouke.first_name)
+        self.assertEqual([], journal.dirty())
+        self.assertEqual(0, journal.undo())
+
+    def test_weak(self):
+        journal = wrapper.ChangeJournal()
+        bouke = journal.track(wrap(Skater(first_name='Bouke'), False))
+        bouke.first_name = 'Botje'
+        bouke_ref = weakref.ref(bouke)
+        del bouke
+        gc.collect()
+        self.assertIsNone(bouke_ref())
+        self.assertEqual([], journal.dirty())
+        self.assertEqual(0, journal.undo())
+
 if __name__ == '__main__':
     unittest.main()